@@ -0,0 +1,88 @@
+import numpy as np
+import pandas as pd
+
+import instrumentation
+
+# Join policies offered by align_frames
+POLICIES = ('inner', 'ffill', 'asof')
+
+
+# Function to normalize a frame's timestamps vectorially: DatetimeIndex, tz-naive, sorted and unique
+# to_day: drop the time of day (daily data); keep it for intraday indexes
+# When several rows fall on the same timestamp the last one is kept
+def normalize_index(df, to_day=True):
+    if 'Date' in df.columns:
+        df = df.set_index('Date')
+    index = pd.DatetimeIndex(df.index)
+    if index.tz is not None:
+        index = index.tz_localize(None)
+    if to_day:
+        index = index.normalize()
+    df = df.set_axis(index.rename('Date'), axis=0)
+    if not index.is_monotonic_increasing:
+        df = df.sort_index(kind='stable')
+    if not df.index.is_unique:
+        df = df[~df.index.duplicated(keep='last')]
+    return df
+
+
+# Function to align two frames (e.g. Yahoo prices and the FRED sp500 series) on a sorted DatetimeIndex
+# how='inner': keep only the dates present in both frames
+# how='ffill': keep the union of both calendars and forward fill the gaps of each side
+#              (at most `limit` rows); leading rows before either side starts are dropped
+# how='asof':  keep the left calendar and take the latest right row at or before each left date,
+#              no older than `tolerance` (e.g. '3D'); left dates with no match are dropped
+# Returns (aligned frame indexed by Date, report) where report counts the rows dropped from each
+# side and the cells filled in by the policy
+@instrumentation.timed
+def align_frames(left, right, how='inner', to_day=True, limit=None, tolerance=None):
+    if how not in POLICIES:
+        raise ValueError(f"Unknown alignment policy '{how}', expected one of {POLICIES}")
+    left = normalize_index(left, to_day)
+    right = normalize_index(right, to_day)
+    overlap = set(left.columns) & set(right.columns)
+    if overlap:
+        raise ValueError(f"Columns {sorted(overlap)} exist in both frames")
+
+    filled = 0
+    if how == 'inner':
+        aligned = left.join(right, how='inner')
+    elif how == 'ffill':
+        index = left.index.union(right.index)
+        raw = pd.concat([left.reindex(index), right.reindex(index)], axis=1)
+        first_valid = max(left.index[0], right.index[0]) if len(left) and len(right) else None
+        raw = raw.loc[first_valid:] if first_valid is not None else raw.iloc[:0]
+        aligned = raw.ffill(limit=limit)
+        filled = int((raw.isna() & aligned.notna()).to_numpy().sum())
+    else:
+        # Position of the latest right row at or before every left date, found with one binary search
+        position = right.index.searchsorted(left.index, side='right') - 1
+        matched = position >= 0
+        if tolerance is not None and len(right):
+            lag = left.index.to_numpy() - right.index.to_numpy()[np.maximum(position, 0)]
+            matched &= lag <= pd.Timedelta(tolerance).to_timedelta64()
+        left_matched = left[matched]
+        right_values = right.iloc[position[matched]].set_axis(left_matched.index, axis=0)
+        filled = int((left_matched.index.to_numpy() != right.index.to_numpy()[position[matched]]).sum())
+        aligned = pd.concat([left_matched, right_values], axis=1)
+
+    report = {
+        'policy': how,
+        'left_rows': len(left),
+        'right_rows': len(right),
+        'rows': len(aligned),
+        'dropped_left': int((~left.index.isin(aligned.index)).sum()),
+        'dropped_right': int((~right.index.isin(aligned.index)).sum()),
+        'filled': filled,
+    }
+    return aligned, report
+
+
+# Function to describe an alignment report in one sentence for the pages
+def describe(report):
+    text = (f"{report['policy']} alignment kept {report['rows']} rows, dropped {report['dropped_left']} "
+            f"of {report['left_rows']} price rows and {report['dropped_right']} of {report['right_rows']} "
+            f"benchmark rows")
+    if report['policy'] != 'inner':
+        text += f", filled {report['filled']} values"
+    return text
@@ -0,0 +1,169 @@
+import argparse
+import gc
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import capm_functions  # noqa: E402
+import result_cache  # noqa: E402
+
+# Usage (from the app directory):
+#   python benchmarks/bench_capm_functions.py                  compare with benchmarks/baselines.json
+#   python benchmarks/bench_capm_functions.py --update         record new baselines
+#   python benchmarks/bench_capm_functions.py --output out.json --tolerance 0.2 --filter daily_returns
+# Every case runs on a synthetic panel with a cold result cache, so memoization never hides a slowdown.
+# The exit code is 1 when a case is slower, or uses more peak memory, than its baseline by more than
+# the tolerance.
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baselines.json')
+# Fraction a measurement may exceed its baseline before it counts as a regression
+TOLERANCE = 0.5
+# Time spent repeating a case to get a stable best-of timing
+TIME_BUDGET = 1.0
+
+# (rows, tickers) panels per function; plotting stops at a size a chart is still drawn for
+SIZES = {
+    'interactive_plot': [(250, 1), (2500, 10), (25000, 10), (1_000_000, 1)],
+    'normalize': [(250, 1), (2500, 10), (2500, 100), (2500, 2000), (1_000_000, 10)],
+    'daily_returns': [(250, 1), (2500, 10), (2500, 100), (2500, 2000), (1_000_000, 10)],
+    'calculate_beta': [(250, 1), (2500, 10), (2500, 100), (2500, 2000), (1_000_000, 10)],
+}
+
+
+# Function to build a synthetic price panel in the page layout ('Date' column, one column per ticker
+# and an 'sp500' benchmark column), a random walk the same every run
+def price_panel(rows, tickers, seed=0):
+    rng = np.random.default_rng(seed)
+    market = rng.normal(0.0003, 0.01, rows)
+    stocks = market[:, None] * rng.uniform(0.5, 1.5, tickers) + rng.normal(0, 0.015, (rows, tickers))
+    prices = 100 * np.exp(np.cumsum(np.column_stack([stocks, market]), axis=0))
+    df = pd.DataFrame(prices, columns=[f'T{i}' for i in range(tickers)] + ['sp500'])
+    df.insert(0, 'Date', pd.bdate_range('1990-01-01', periods=rows))
+    return df
+
+
+# Function to get the call of one case: (function, arguments) on its prepared input
+def make_case(name, rows, tickers):
+    prices = price_panel(rows, tickers)
+    if name == 'interactive_plot':
+        return capm_functions.interactive_plot, (prices,)
+    if name == 'normalize':
+        return capm_functions.normalize, (prices,)
+    if name == 'daily_returns':
+        return capm_functions.daily_returns, (prices,)
+    if name == 'calculate_beta':
+        return capm_functions.calculate_beta, (capm_functions.daily_returns(prices), 'T0', 'sp500')
+    raise ValueError(f"Unknown benchmark '{name}'")
+
+
+# Function to measure one case: best-of wall time and peak traced memory (one extra traced run)
+def measure(func, args, time_budget=TIME_BUDGET, min_repeats=3):
+    # Untimed warm-up, the first call pays for lazy imports (plotly) and allocator growth
+    result_cache.shared_cache.clear()
+    func(*args)
+    timings = []
+    started = time.perf_counter()
+    while len(timings) < min_repeats or time.perf_counter() - started < time_budget:
+        result_cache.shared_cache.clear()
+        gc.collect()
+        t0 = time.perf_counter()
+        func(*args)
+        timings.append(time.perf_counter() - t0)
+        if len(timings) >= min_repeats and timings[-1] > time_budget:
+            break
+
+    result_cache.shared_cache.clear()
+    gc.collect()
+    tracemalloc.start()
+    func(*args)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return {'seconds': min(timings), 'median_seconds': float(np.median(timings)), 'repeats': len(timings),
+            'peak_mb': peak / 2 ** 20}
+
+
+# Function to run every case whose id contains the filter, e.g. 'daily_returns/2500x100'
+def run(case_filter=None, time_budget=TIME_BUDGET):
+    results = {}
+    for name, sizes in SIZES.items():
+        for rows, tickers in sizes:
+            case_id = f'{name}/{rows}x{tickers}'
+            if case_filter and case_filter not in case_id:
+                continue
+            func, args = make_case(name, rows, tickers)
+            results[case_id] = measure(func, args, time_budget)
+            del args
+            print(f"{case_id:32s} {results[case_id]['seconds'] * 1000:10.2f} ms {results[case_id]['peak_mb']:10.1f} MB",
+                  file=sys.stderr)
+    return results
+
+
+# Function to compare results with the baselines, returns the list of regressions (as messages)
+# Cases faster than a few milliseconds are compared with a 5 ms floor so timer noise is not a regression
+def compare(results, baselines, tolerance=TOLERANCE):
+    regressions = []
+    for case_id, result in results.items():
+        baseline = baselines.get(case_id)
+        if baseline is None:
+            continue
+        allowed_seconds = max(baseline['seconds'], 0.005) * (1 + tolerance)
+        if result['seconds'] > allowed_seconds:
+            regressions.append(f"{case_id}: {result['seconds'] * 1000:.2f} ms > "
+                               f"{allowed_seconds * 1000:.2f} ms allowed (baseline {baseline['seconds'] * 1000:.2f} ms)")
+        allowed_mb = max(baseline['peak_mb'], 1.0) * (1 + tolerance)
+        if result['peak_mb'] > allowed_mb:
+            regressions.append(f"{case_id}: {result['peak_mb']:.1f} MB > {allowed_mb:.1f} MB allowed "
+                               f"(baseline {baseline['peak_mb']:.1f} MB)")
+    return regressions
+
+
+def environment():
+    return {'python': platform.python_version(), 'numpy': np.__version__, 'pandas': pd.__version__,
+            'machine': platform.machine(), 'processor': platform.processor(), 'cpus': os.cpu_count(),
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S')}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the capm_functions hot paths.")
+    parser.add_argument('--filter', default=None, help="only run cases whose id contains this text")
+    parser.add_argument('--tolerance', type=float, default=TOLERANCE,
+                        help=f"allowed slowdown / memory growth as a fraction (default {TOLERANCE})")
+    parser.add_argument('--time-budget', type=float, default=TIME_BUDGET, help="seconds spent repeating each case")
+    parser.add_argument('--baseline', default=BASELINE_PATH, help="baseline JSON file")
+    parser.add_argument('--update', action='store_true', help="write the results as the new baselines")
+    parser.add_argument('--output', default=None, help="write the results (and regressions) to this JSON file")
+    args = parser.parse_args(argv)
+
+    results = run(args.filter, args.time_budget)
+    baselines = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baselines = json.load(f).get('cases', {})
+    regressions = [] if args.update else compare(results, baselines, args.tolerance)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'environment': environment(), 'tolerance': args.tolerance, 'cases': results,
+                       'regressions': regressions}, f, indent=1)
+    if args.update:
+        # Keep the baselines of the cases that were filtered out
+        baselines.update(results)
+        with open(args.baseline, 'w') as f:
+            json.dump({'environment': environment(), 'cases': dict(sorted(baselines.items()))}, f, indent=1)
+        print(f"Updated {len(results)} baselines in {args.baseline}", file=sys.stderr)
+
+    for message in regressions:
+        print(f"REGRESSION {message}", file=sys.stderr)
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
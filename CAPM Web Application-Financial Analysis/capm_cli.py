@@ -0,0 +1,154 @@
+import argparse
+import datetime
+import hashlib
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import pandas as pd
+
+import capm_functions
+import data_providers
+import market_data
+import price_cache
+import risk_metrics
+import screener
+
+# Usage (from this directory):
+#   python capm_cli.py --tickers sp500.csv --start 2019-01-01 --rf 0.04 --output capm.parquet --workers 4
+# Every finished batch is written to the checkpoint directory; running the same command again after a
+# failure only computes the batches that are missing.
+
+# Risk metric columns added to the screener metrics
+RISK_COLUMNS = ['VaR 95%', 'CVaR 95%']
+
+
+# Function to parse the command line
+def parse_args(argv=None):
+    today = datetime.date.today()
+    parser = argparse.ArgumentParser(description="Compute CAPM and risk metrics for a list of tickers.")
+    parser.add_argument('--tickers', required=True,
+                        help="ticker file: CSV with a 'Symbol' column, or one ticker per line")
+    parser.add_argument('--start', type=datetime.date.fromisoformat,
+                        default=datetime.date(today.year - 5, today.month, today.day), help="YYYY-MM-DD (default: 5 years ago)")
+    parser.add_argument('--end', type=datetime.date.fromisoformat, default=today, help="YYYY-MM-DD (default: today)")
+    parser.add_argument('--benchmark', default='^GSPC', help="benchmark ticker (default: ^GSPC)")
+    parser.add_argument('--rf', type=float, default=0.0, help="annual risk-free rate as a decimal, e.g. 0.04")
+    parser.add_argument('--output', required=True, help="output file, .csv or .parquet")
+    parser.add_argument('--batch-size', type=int, default=screener.BATCH_SIZE, help="tickers per batch")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help="worker processes")
+    parser.add_argument('--provider', choices=sorted(data_providers.PROVIDERS), default=None,
+                        help="market data provider (default: CAPM_DATA_PROVIDER or live)")
+    parser.add_argument('--checkpoint-dir', default=None, help="where finished batches are kept (default: OUTPUT.parts)")
+    parser.add_argument('--fresh', action='store_true', help="ignore existing checkpoints and start over")
+    args = parser.parse_args(argv)
+    if not args.output.endswith(('.csv', '.parquet')):
+        parser.error("--output must end with .csv or .parquet")
+    if args.output.endswith('.parquet') and price_cache.FILE_FORMAT != 'parquet':
+        parser.error("Parquet output needs pyarrow or fastparquet, install one or write .csv")
+    if args.start >= args.end:
+        parser.error("--start must be before --end")
+    args.checkpoint_dir = args.checkpoint_dir or args.output + '.parts'
+    return args
+
+
+# Function to select the data provider inside every worker process
+def _init_worker(provider_name):
+    if provider_name:
+        data_providers.set_provider(data_providers.PROVIDERS[provider_name]())
+
+
+# Function run in a worker process: fetch one batch and compute its CAPM and risk metrics
+# The benchmark comes from the local price cache filled by the parent process. Workers share that cache
+# directory, its manifest is locked and merged on every write so no process loses another's entries.
+def run_batch(tickers, start, end, benchmark, rf):
+    market_prices = market_data.load_price_panel([benchmark], start, end, fields=['Close'])['Close']
+    market = capm_functions.compute_returns(market_prices, kind='simple')[benchmark]
+    # One download of the batch serves both the regression and the risk metrics
+    prices = market_data.load_price_panel(tickers, start, end, fields=['Close'])['Close']
+    table = screener.screen_batch(tickers, market, start, end, rf, prices=prices)
+
+    returns = capm_functions.compute_returns(prices, kind='simple')
+    risk = risk_metrics.value_at_risk(returns, confidence=(0.95,), horizons=(1,), methods=('historical',))
+    risk = risk.set_index('Stock')[['VaR', 'CVaR']].set_axis(RISK_COLUMNS, axis=1)
+    return table.join(risk, on='Stock')
+
+
+# Function to fingerprint the run, so checkpoints of a different run are never mixed in
+def run_id(tickers, args):
+    settings = [tickers, args.start.isoformat(), args.end.isoformat(), args.benchmark, args.rf, args.batch_size]
+    return hashlib.sha1(json.dumps(settings).encode()).hexdigest()[:16]
+
+
+# Function to prepare the checkpoint directory and list the batches already finished
+def load_checkpoints(directory, identifier, fresh=False):
+    os.makedirs(directory, exist_ok=True)
+    state_path = os.path.join(directory, 'run.json')
+    if not fresh and os.path.exists(state_path):
+        with open(state_path) as f:
+            if json.load(f).get('run_id') == identifier:
+                return {int(name[6:11]) for name in os.listdir(directory)
+                        if name.startswith('batch-') and name.endswith('.csv')}
+    # A new run: drop the batches of any previous one
+    for name in os.listdir(directory):
+        if name.startswith('batch-'):
+            os.remove(os.path.join(directory, name))
+    with open(state_path, 'w') as f:
+        json.dump({'run_id': identifier}, f)
+    return set()
+
+
+def _batch_path(directory, index):
+    return os.path.join(directory, f'batch-{index:05d}.csv')
+
+
+# Function to write one finished batch; the rename makes a half-written batch impossible
+def save_checkpoint(directory, index, table):
+    path = _batch_path(directory, index)
+    table.to_csv(path + '.tmp', index=False)
+    os.replace(path + '.tmp', path)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    _init_worker(args.provider)
+    tickers = [t for t in screener.read_universe(args.tickers) if t != args.benchmark]
+    batches = [tickers[i:i + args.batch_size] for i in range(0, len(tickers), args.batch_size)]
+    finished = load_checkpoints(args.checkpoint_dir, run_id(tickers, args), args.fresh)
+    todo = [i for i in range(len(batches)) if i not in finished]
+    print(f"{len(tickers)} tickers in {len(batches)} batches, {len(batches) - len(todo)} already done", file=sys.stderr)
+
+    # Fetch the benchmark once so the workers read it from the local cache
+    market_data.load_price_panel([args.benchmark], args.start, args.end, fields=['Close'])
+
+    failed = []
+    with ProcessPoolExecutor(max_workers=max(args.workers, 1), initializer=_init_worker,
+                             initargs=(args.provider,)) as executor:
+        futures = {executor.submit(run_batch, batches[i], args.start, args.end, args.benchmark, args.rf): i
+                   for i in todo}
+        for done, future in enumerate(as_completed(futures), 1):
+            index = futures[future]
+            try:
+                save_checkpoint(args.checkpoint_dir, index, future.result())
+                print(f"[{done}/{len(todo)}] batch {index} done", file=sys.stderr)
+            except Exception as e:
+                failed.append(index)
+                print(f"[{done}/{len(todo)}] batch {index} failed: {e}", file=sys.stderr)
+
+    if failed:
+        print(f"{len(failed)} batches failed, run the same command again to retry them", file=sys.stderr)
+        return 1
+
+    tables = [pd.read_csv(_batch_path(args.checkpoint_dir, i)) for i in range(len(batches))]
+    results = pd.concat(tables, ignore_index=True) if tables else pd.DataFrame(columns=screener.COLUMNS + RISK_COLUMNS)
+    if args.output.endswith('.parquet'):
+        results.to_parquet(args.output, index=False)
+    else:
+        results.to_csv(args.output, index=False)
+    print(f"Wrote {len(results)} rows to {args.output}", file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
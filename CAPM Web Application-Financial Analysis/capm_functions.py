@@ -1,53 +1,280 @@
 import numpy as np
-import plotly.express as px
+import pandas as pd
+import plotly.graph_objects as go
+
+import instrumentation
+import result_cache
+
+# Chart resolution: each trace is reduced to about two points (bucket minimum and maximum) per pixel
+PLOT_PIXELS = 1000
+# Charts with more points than this in total are drawn with WebGL traces instead of SVG
+WEBGL_THRESHOLD = 5000
+
+
+# Function to pick the rows kept when a long series is drawn in a few buckets (min/max bucketing)
+# The first and last row, and the minimum and maximum of every bucket, are kept in their original order,
+# so peaks and crashes survive the downsampling. values: 1-D float array, returns sorted row indices
+def minmax_downsample(values, buckets=PLOT_PIXELS):
+    n = len(values)
+    if n <= 2 * buckets:
+        return np.arange(n)
+    size = -(-n // buckets)
+    count = -(-n // size)
+    padded = np.full(count * size, np.nan)
+    padded[:n] = values
+    padded = padded.reshape(count, size)
+    missing = np.isnan(padded)
+    offsets = np.arange(count) * size
+    lows = np.where(missing, np.inf, padded).argmin(axis=1) + offsets
+    highs = np.where(missing, -np.inf, padded).argmax(axis=1) + offsets
+    # All-NaN buckets keep their first row, so gaps in the series stay gaps in the chart
+    keep = np.concatenate([[0, n - 1], np.minimum(lows, n - 1), np.minimum(highs, n - 1)])
+    return np.unique(keep)
+
 
 # function to plot interactive plotly chart
-def interactive_plot(df):
-    fig = px.line(title = 'Stock Prices')
-    for i in df.columns[1:]:
-        fig.add_scatter(x = df['Date'], y = df[i], name = i)
-    fig.update_layout(width= 450, margin=dict(l=20, r=20, t=50, b=20), legend=dict(orientation = 'h', yanchor='bottom', y=1.02, xanchor= 'right', x=1))
-    return fig
+# date_range: (start, end) to draw only that window, at full detail again once it is short enough
+# pixels: downsampling target per trace (None draws every point)
+# webgl: force WebGL (True) or SVG (False) traces, by default WebGL above WEBGL_THRESHOLD points
+@instrumentation.timed
+def interactive_plot(df, date_range=None, pixels=PLOT_PIXELS, webgl=None):
+    dates, columns, values = _panel_values(df)
+    dates = pd.DatetimeIndex(dates)
+    if date_range is not None:
+        window = (dates >= pd.Timestamp(date_range[0])) & (dates <= pd.Timestamp(date_range[1]))
+        dates, values = dates[window], values[window]
+    rows = [minmax_downsample(values[:, i], pixels) if pixels else np.arange(len(values))
+            for i in range(len(columns))]
+    if webgl is None:
+        webgl = sum(len(r) for r in rows) > WEBGL_THRESHOLD
+    trace = go.Scattergl if webgl else go.Scatter
+    traces = [trace(x=dates[r], y=values[r, i], name=column, mode='lines')
+              for i, (column, r) in enumerate(zip(columns, rows))]
+    return go.Figure(data=traces, layout=dict(
+        title='Stock Prices', width=450, margin=dict(l=20, r=20, t=50, b=20),
+        legend=dict(orientation='h', yanchor='bottom', y=1.02, xanchor='right', x=1)))
 
 # Function to normalize the prices based on the initial price
+# Not memoized: one division of the panel by its first row is cheaper than hashing the panel for a key
+@instrumentation.timed
 def normalize(df_2):
-    df = df_2.copy()
-    for i in df.columns[1:]:
-        df[i] = df[i]/df[i][0]
-    return df
+    prices = df_2.iloc[:, 1:]
+    return df_2.iloc[:, :1].join(prices / prices.iloc[0])
+
+# Function to split a price panel into (dates, price columns, float matrix)
+# Works for both the 'Date' column layout used by the pages and a DatetimeIndex panel
+def _panel_values(df):
+    if 'Date' in df.columns:
+        dates = df['Date']
+        columns = [c for c in df.columns if c != 'Date']
+    else:
+        dates = df.index
+        columns = list(df.columns)
+    values = df[columns].to_numpy(dtype=float)
+    return dates, columns, values
+
+
+# Function to get the row index of the last valid (non NaN) price at or before every row
+def _last_valid_index(values):
+    rows = np.arange(len(values)).reshape(-1, 1)
+    last_valid = np.where(np.isnan(values), -1, rows)
+    np.maximum.accumulate(last_valid, axis=0, out=last_valid)
+    return last_valid
+
+
+# Function to calculate returns for the whole price panel in one NumPy pass
+# kind: 'simple', 'log' or 'excess' (simple return minus the per period risk free rate)
+# rf: annual risk free rate as a decimal, either a scalar or one value per row (only used for 'excess')
+# percent: scale the returns by 100 like the original daily_returns output
+# fill_first: value written in the first row, where no previous price exists
+# output: 'frame' returns a new DataFrame, 'array' returns (dates, columns, returns) and skips the DataFrame copy
+# NaN gaps are handled by measuring each return against the last valid price, rows with a missing price stay NaN
+@result_cache.memoize
+@instrumentation.timed
+def compute_returns(df, kind='simple', rf=0.0, periods_per_year=252, percent=False, fill_first=np.nan, output='frame'):
+    if kind not in ('simple', 'log', 'excess'):
+        raise ValueError(f"Unknown return kind '{kind}', expected 'simple', 'log' or 'excess'")
+    if output not in ('frame', 'array'):
+        raise ValueError(f"Unknown output mode '{output}', expected 'frame' or 'array'")
+
+    dates, columns, prices = _panel_values(df)
+    returns = np.full(prices.shape, np.nan)
+
+    if len(prices) > 1:
+        previous_index = _last_valid_index(prices)[:-1]
+        previous = np.take_along_axis(prices, np.maximum(previous_index, 0), axis=0)
+        previous[previous_index < 0] = np.nan
+        with np.errstate(divide='ignore', invalid='ignore'):
+            ratio = prices[1:] / previous
+        if kind == 'log':
+            with np.errstate(divide='ignore', invalid='ignore'):
+                returns[1:] = np.log(ratio)
+        else:
+            returns[1:] = ratio - 1
+
+    if kind == 'excess':
+        rf_per_period = np.asarray(rf, dtype=float) / periods_per_year
+        if rf_per_period.ndim == 1:
+            rf_per_period = rf_per_period.reshape(-1, 1)
+        returns -= rf_per_period
+
+    if percent:
+        returns *= 100
+    if len(returns):
+        returns[0] = fill_first
+
+    if output == 'array':
+        return dates, columns, returns
+
+    returns_df = pd.DataFrame(returns, columns=columns, index=df.index)
+    if 'Date' in df.columns:
+        returns_df.insert(0, 'Date', dates)
+    return returns_df
+
 
-# Function to calculate daily returns
+# Function to calculate daily returns (in percent, first row set to 0)
+@result_cache.memoize
+@instrumentation.timed
 def daily_returns(df):
-    df_daily_return = df.copy()
-    for i in df.columns[1:]:
-        for j in range(1, len(df)):
-            df_daily_return[i][j] = ((df[i][j] - df[i][j-1])/df[i][j-1])*100
-        df_daily_return[i][0] = 0
-    return df_daily_return
-
-
-# function to calculate beta
-def calculate_beta(stocks_daily_return, stock):
-    rm = stocks_daily_return['sp500'].mean()*252
-    b, a = np.polyfit(stocks_daily_return['sp500'], stocks_daily_return[stock], 1)
-    return b,a
-
-
-
-def calculate_beta(stocks_daily_return, stock):
-    # Assume SP500 column is present in the DataFrame and named 'sp500' or dynamically fetched
-    market_returns = stocks_daily_return['sp500']  # or use a more dynamic method if needed
-    stock_returns = stocks_daily_return[stock]
-    # Calculate covariance of stock with the market
-    covariance = np.cov(stock_returns, market_returns)[0, 1]
-    
-    # Calculate variance of market (SP500)
-    market_variance = np.var(market_returns)
-    
-    # Calculate beta
-    beta = covariance / market_variance
-    
-    # Alpha is not needed here, but you can calculate it if required
-    alpha = stock_returns.mean() - beta * market_returns.mean()
-    
-    return beta, alpha
+    return compute_returns.__wrapped__(df, kind='simple', percent=True, fill_first=0.0)
+
+
+# Function to narrow the returns panel of a regression call to the columns it reads, so the result
+# cache key of one stock against the market hashes two columns rather than the whole panel
+def _regression_key(arguments):
+    returns, stocks = arguments['returns'], arguments['stocks']
+    if stocks is not None:
+        benchmarks = arguments['benchmarks'] if 'benchmarks' in arguments else arguments['market']
+        used = ['Date'] + ([benchmarks] if isinstance(benchmarks, str) else list(benchmarks))
+        used += [stocks] if isinstance(stocks, str) else list(stocks)
+        arguments['returns'] = returns[[c for c in dict.fromkeys(used) if c in returns.columns]]
+    return arguments
+
+
+# Function to regress every stock on every benchmark with one matrix product
+# benchmarks: one benchmark column name or a list of them (FRED 'sp500', '^GSPC' / 'SP500', sector ETFs...)
+# stocks: columns to regress, by default every column that is not a benchmark
+# Pairs are fitted on the rows where both the stock and the benchmark are present, so a short
+# history in one ticker does not shorten the sample of the others
+# Returns one row per (stock, benchmark) pair with beta, alpha (per period), R2, residual volatility
+# (per period) and the standard errors of beta and alpha
+@result_cache.memoize(key=_regression_key)
+@instrumentation.timed
+def regress_panel(returns, benchmarks, stocks=None):
+    if isinstance(benchmarks, str):
+        benchmarks = [benchmarks]
+    benchmarks = list(benchmarks)
+    dates, columns, values = _panel_values(returns)
+    missing = [b for b in benchmarks if b not in columns]
+    if missing:
+        raise KeyError(f"Benchmark column(s) {missing} not found in returns")
+    if stocks is None:
+        stocks = [c for c in columns if c not in benchmarks]
+    elif isinstance(stocks, str):
+        stocks = [stocks]
+    stocks = list(stocks)
+
+    x = values[:, [columns.index(b) for b in benchmarks]]
+    y = values[:, [columns.index(s) for s in stocks]]
+    x_valid = ~np.isnan(x)
+    y_valid = ~np.isnan(y)
+    x = np.where(x_valid, x, 0.0)
+    y = np.where(y_valid, y, 0.0)
+    x_valid = x_valid.astype(float)
+    y_valid = y_valid.astype(float)
+
+    # One (3k x rows) @ (rows x 3s) product gives every pairwise sum the regressions need
+    k, m = len(benchmarks), len(stocks)
+    left = np.hstack([x_valid, x, x * x])
+    right = np.hstack([y_valid, y, y * y])
+    sums = left.T @ right
+    n = sums[:k, :m]
+    sum_y = sums[:k, m:2 * m]
+    sum_y2 = sums[:k, 2 * m:]
+    sum_x = sums[k:2 * k, :m]
+    sum_xy = sums[k:2 * k, m:2 * m]
+    sum_x2 = sums[2 * k:, :m]
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        sxx = sum_x2 - sum_x ** 2 / n
+        syy = sum_y2 - sum_y ** 2 / n
+        sxy = sum_xy - sum_x * sum_y / n
+        beta = sxy / sxx
+        alpha = (sum_y - beta * sum_x) / n
+        ssr = np.maximum(syy - beta * sxy, 0.0)
+        r2 = 1 - ssr / syy
+        residual_var = ssr / (n - 2)
+        beta_se = np.sqrt(residual_var / sxx)
+        alpha_se = np.sqrt(residual_var * (1 / n + (sum_x / n) ** 2 / sxx))
+
+    return pd.DataFrame({
+        'Stock': np.tile(stocks, k),
+        'Benchmark': np.repeat(benchmarks, m),
+        'Beta': beta.ravel(),
+        'Alpha': alpha.ravel(),
+        'R2': r2.ravel(),
+        'Residual Volatility': np.sqrt(residual_var).ravel(),
+        'Beta Std Error': beta_se.ravel(),
+        'Alpha Std Error': alpha_se.ravel(),
+        'Observations': n.ravel().astype(int),
+    })
+
+
+# function to calculate beta and alpha of one stock against the market column
+def calculate_beta(stocks_daily_return, stock, market='sp500'):
+    result = regress_panel(stocks_daily_return, market, [stock]).iloc[0]
+    return result['Beta'], result['Alpha']
+
+
+# Function to calculate rolling beta, alpha, volatility and market correlation for every stock at once
+# Window sums of x, y, xy, x^2 and y^2 come from differenced running (cumulative) sums, so the cost
+# is linear in the history length whatever the window size
+# window: number of rows in each window (e.g. 21, 63 or 252 trading days)
+# min_periods: minimum number of valid observations in a window, defaults to the full window
+# Returns a dict of DataFrames ('Beta', 'Alpha', 'Volatility', 'Correlation') indexed by date, with alpha
+# per period and volatility annualized with periods_per_year
+@result_cache.memoize(key=_regression_key)
+@instrumentation.timed
+def rolling_regression(returns, market='sp500', window=63, stocks=None, min_periods=None, periods_per_year=252):
+    dates, columns, values = _panel_values(returns)
+    if market not in columns:
+        raise KeyError(f"Market column '{market}' not found in returns")
+    if stocks is None:
+        stocks = [c for c in columns if c != market]
+    elif isinstance(stocks, str):
+        stocks = [stocks]
+    stocks = list(stocks)
+    if min_periods is None:
+        min_periods = window
+
+    x = values[:, [columns.index(market)]]
+    y = values[:, [columns.index(s) for s in stocks]]
+    valid = ~np.isnan(x) & ~np.isnan(y)
+    x = np.where(valid, x, 0.0)
+    y = np.where(valid, y, 0.0)
+
+    # Running sums with a leading zero row, the window sum ending at row t is sums[t + 1] - sums[t + 1 - window]
+    stacked = np.stack([valid.astype(float), x, y, x * y, x * x, y * y])
+    sums = np.zeros((stacked.shape[0], len(values) + 1, len(stocks)))
+    np.cumsum(stacked, axis=1, out=sums[:, 1:])
+    windowed = np.full(stacked.shape, np.nan)
+    if len(values) >= window:
+        windowed[:, window - 1:] = sums[:, window:] - sums[:, :-window]
+    n, sum_x, sum_y, sum_xy, sum_x2, sum_y2 = windowed
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        sxx = sum_x2 - sum_x ** 2 / n
+        syy = sum_y2 - sum_y ** 2 / n
+        sxy = sum_xy - sum_x * sum_y / n
+        beta = sxy / sxx
+        alpha = (sum_y - beta * sum_x) / n
+        volatility = np.sqrt(np.maximum(syy, 0.0) / (n - 1)) * np.sqrt(periods_per_year)
+        correlation = sxy / np.sqrt(sxx * syy)
+
+    too_short = ~(n >= min_periods)
+    index = pd.DatetimeIndex(dates, name='Date') if 'Date' in returns.columns else returns.index
+    result = {}
+    for name, metric in (('Beta', beta), ('Alpha', alpha), ('Volatility', volatility), ('Correlation', correlation)):
+        metric[too_short] = np.nan
+        result[name] = pd.DataFrame(metric, index=index, columns=stocks)
+    return result
@@ -0,0 +1,286 @@
+import argparse
+import asyncio
+import datetime
+import json
+import math
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from urllib.parse import parse_qs, urlsplit
+
+import numpy as np
+import pandas as pd
+
+import capm_functions
+import data_providers
+import market_data
+import risk_metrics
+
+# Usage (from this directory):
+#   python capm_service.py --port 8000 --provider replay --workers 4
+#   curl 'http://127.0.0.1:8000/beta?tickers=AAPL,MSFT&start=2020-01-01'
+# Endpoints (GET, JSON): /returns, /beta, /capm, /var, /sharpe and /health. Common query parameters:
+# tickers (comma-separated, required), start / end (YYYY-MM-DD, default the last 5 years),
+# benchmark (default ^GSPC) and rf (annual risk-free rate as a decimal).
+
+# Largest request head accepted, anything bigger is not a request this service makes sense of
+MAX_HEAD_BYTES = 16 * 1024
+STATUS_TEXT = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed',
+               500: 'Internal Server Error'}
+
+
+# Error answered with a 4xx status and a JSON message
+class RequestError(Exception):
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+    # Raised in a worker process, so it must keep its status through pickling
+    def __reduce__(self):
+        return type(self), (str(self), self.status)
+
+
+# Function to read the common query parameters of a request
+def _request_inputs(query):
+    tickers = [t.strip().upper() for t in query.get('tickers', '').split(',') if t.strip()]
+    if not tickers:
+        raise RequestError("Query parameter 'tickers' is required, e.g. tickers=AAPL,MSFT")
+    try:
+        end = datetime.date.fromisoformat(query['end']) if 'end' in query else datetime.date.today()
+        start = (datetime.date.fromisoformat(query['start']) if 'start' in query
+                 else datetime.date(end.year - 5, end.month, end.day))
+        rf = float(query.get('rf', 0.0))
+    except ValueError as e:
+        raise RequestError(str(e))
+    if start >= end:
+        raise RequestError("'start' must be before 'end'")
+    return tickers, start, end, query.get('benchmark', '^GSPC').upper(), rf
+
+
+# Function to parse a comma-separated list of numbers from the query
+def _numbers(query, name, default, kind=float):
+    try:
+        return tuple(kind(v) for v in query[name].split(',')) if name in query else default
+    except ValueError:
+        raise RequestError(f"'{name}' must be a comma-separated list of numbers")
+
+
+# Function to get the decimal daily returns of the tickers (and the benchmark) as a DatetimeIndex panel
+def _returns(tickers, start, end, benchmark=None):
+    symbols = tickers + [benchmark] if benchmark and benchmark not in tickers else tickers
+    prices = market_data.load_price_panel(symbols, start, end, fields=['Close'])['Close']
+    return capm_functions.compute_returns(prices, kind='simple')
+
+
+# Function to turn a DataFrame into JSON-ready records, NaN becomes null
+def _records(df):
+    return df.astype(object).where(df.notna(), None).to_dict('records')
+
+
+def returns_endpoint(query):
+    tickers, start, end, _, _ = _request_inputs(query)
+    kind = query.get('kind', 'simple')
+    if kind not in ('simple', 'log'):
+        raise RequestError("'kind' must be 'simple' or 'log'")
+    prices = market_data.load_price_panel(tickers, start, end, fields=['Close'])['Close']
+    returns = capm_functions.compute_returns(prices, kind=kind)
+    return {
+        'dates': [d.date().isoformat() for d in returns.index],
+        'returns': {t: returns[t].astype(object).where(returns[t].notna(), None).tolist() for t in tickers},
+    }
+
+
+def beta_endpoint(query):
+    tickers, start, end, benchmark, _ = _request_inputs(query)
+    regression = capm_functions.regress_panel(_returns(tickers, start, end, benchmark), benchmark, tickers)
+    return {'benchmark': benchmark, 'results': _records(regression)}
+
+
+def capm_endpoint(query):
+    tickers, start, end, benchmark, rf = _request_inputs(query)
+    returns = _returns(tickers, start, end, benchmark)
+    regression = capm_functions.regress_panel(returns, benchmark, tickers)
+    market_return = returns[benchmark].mean() * 252
+    table = pd.DataFrame({
+        'Stock': regression['Stock'],
+        'Beta': regression['Beta'],
+        'Expected Return': rf + regression['Beta'] * (market_return - rf),
+    })
+    market_return = float(market_return) if np.isfinite(market_return) else None
+    return {'benchmark': benchmark, 'rf': rf, 'market_return': market_return, 'results': _records(table)}
+
+
+def var_endpoint(query):
+    tickers, start, end, _, _ = _request_inputs(query)
+    methods = tuple(query['methods'].split(',')) if 'methods' in query else risk_metrics.METHODS
+    if any(m not in risk_metrics.METHODS for m in methods):
+        raise RequestError(f"'methods' must be any of {', '.join(risk_metrics.METHODS)}")
+    confidence = _numbers(query, 'confidence', (0.95, 0.99))
+    if not all(0 < c < 1 for c in confidence):
+        raise RequestError("'confidence' values must be between 0 and 1, e.g. 0.95,0.99")
+    horizons = _numbers(query, 'horizons', (1, 10), int)
+    if not all(h > 0 for h in horizons):
+        raise RequestError("'horizons' must be positive numbers of days, e.g. 1,10")
+    table = risk_metrics.value_at_risk(_returns(tickers, start, end), confidence=confidence, horizons=horizons,
+                                       methods=methods)
+    return {'results': _records(table)}
+
+
+def sharpe_endpoint(query):
+    tickers, start, end, _, rf = _request_inputs(query)
+    returns = _returns(tickers, start, end)[tickers]
+    annual_return = returns.mean() * 252
+    volatility = returns.std() * np.sqrt(252)
+    table = pd.DataFrame({'Stock': tickers, 'Annual Return': annual_return.to_numpy(),
+                          'Volatility': volatility.to_numpy(),
+                          'Sharpe Ratio': ((annual_return - rf) / volatility).to_numpy()})
+    return {'rf': rf, 'results': _records(table)}
+
+
+ENDPOINTS = {
+    '/returns': returns_endpoint,
+    '/beta': beta_endpoint,
+    '/capm': capm_endpoint,
+    '/var': var_endpoint,
+    '/sharpe': sharpe_endpoint,
+}
+
+
+# Function to make numpy scalars and non-finite floats JSON serializable
+def _json_default(value):
+    if isinstance(value, np.generic):
+        value = value.item()
+        return None if isinstance(value, float) and not math.isfinite(value) else value
+    if isinstance(value, (datetime.date, pd.Timestamp)):
+        return value.isoformat()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+# Function to select the data provider inside every worker process
+def _init_worker(provider_name):
+    if provider_name:
+        data_providers.set_provider(data_providers.PROVIDERS[provider_name]())
+
+
+# HTTP/1.1 server answering the endpoints as JSON
+# The computations run in worker processes: the pandas glue, JSON encoding and most of the NumPy work on
+# small panels hold the GIL, so threads would run one request at a time. The event loop keeps accepting
+# connections, and requests for the same path and query that arrive while one is being computed wait
+# for its result instead of computing it again. Every worker keeps its own result cache; downloaded
+# prices are shared through the local price cache. Workers are spawned rather than forked, a fork of
+# the running server can inherit locks held by its other threads and hang.
+class CapmService:
+    def __init__(self, executor=None, workers=None, provider_name=None):
+        self.executor = executor or ProcessPoolExecutor(max_workers=workers or os.cpu_count() or 1,
+                                                        mp_context=multiprocessing.get_context('spawn'),
+                                                        initializer=_init_worker, initargs=(provider_name,))
+        self._in_flight = {}
+        self.stats = {'requests': 0, 'computed': 0, 'coalesced': 0}
+
+    # Function to compute (or join the in-flight computation of) one endpoint call
+    async def call(self, path, query):
+        key = (path, tuple(sorted(query.items())))
+        future = self._in_flight.get(key)
+        if future is not None:
+            self.stats['coalesced'] += 1
+            return await asyncio.shield(future)
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(self.executor, self._compute, ENDPOINTS[path], query)
+        self._in_flight[key] = future
+        self.stats['computed'] += 1
+        try:
+            return await asyncio.shield(future)
+        finally:
+            self._in_flight.pop(key, None)
+
+    # Function run in a worker process: compute the endpoint and encode the JSON body there as well,
+    # so only bytes travel back to the event loop
+    @staticmethod
+    def _compute(endpoint, query):
+        return json.dumps(endpoint(query), default=_json_default, allow_nan=False).encode()
+
+    # Function to answer one request, returns (status, body)
+    async def respond(self, method, target):
+        self.stats['requests'] += 1
+        if method not in ('GET', 'HEAD'):
+            return 405, {'error': f"Method {method} not allowed"}
+        url = urlsplit(target)
+        if url.path == '/health':
+            return 200, {'status': 'ok', **self.stats}
+        if url.path not in ENDPOINTS:
+            return 404, {'error': f"Unknown endpoint {url.path}", 'endpoints': sorted(ENDPOINTS)}
+        query = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        try:
+            return 200, await self.call(url.path, query)
+        except RequestError as e:
+            return e.status, {'error': str(e)}
+        except (KeyError, FileNotFoundError) as e:
+            return 404, {'error': f"No data: {e}"}
+        except Exception as e:
+            return 500, {'error': str(e)}
+
+    # Function serving one connection, several requests when the client keeps it alive
+    async def handle(self, reader, writer):
+        try:
+            while True:
+                try:
+                    head = await reader.readuntil(b'\r\n\r\n')
+                except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError,
+                        asyncio.CancelledError):
+                    # Client went away, sent too much, or the server is shutting down while it was idle
+                    break
+                lines = head.decode('latin-1').split('\r\n')
+                parts = lines[0].split()
+                if len(parts) != 3:
+                    status, body = 400, {'error': 'Malformed request line'}
+                    method, version = 'GET', 'HTTP/1.0'
+                else:
+                    method, target, version = parts
+                    status, body = await self.respond(method, target)
+                headers = {}
+                for line in lines[1:]:
+                    if ':' in line:
+                        name, value = line.split(':', 1)
+                        headers[name.strip().lower()] = value.strip().lower()
+                keep_alive = (headers.get('connection') != 'close' if version == 'HTTP/1.1'
+                              else headers.get('connection') == 'keep-alive')
+
+                if not isinstance(body, bytes):
+                    body = json.dumps(body, default=_json_default).encode()
+                writer.write(
+                    f"HTTP/1.1 {status} {STATUS_TEXT.get(status, '')}\r\n"
+                    f"Content-Type: application/json\r\nContent-Length: {len(body)}\r\n"
+                    f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode()
+                    + (b'' if method == 'HEAD' else body))
+                await writer.drain()
+                if not keep_alive:
+                    break
+        finally:
+            writer.close()
+
+    # Function to start listening, returns the asyncio server
+    async def start(self, host='127.0.0.1', port=8000):
+        return await asyncio.start_server(self.handle, host, port, limit=MAX_HEAD_BYTES)
+
+
+# Function to run the service until interrupted
+async def serve(host='127.0.0.1', port=8000, workers=None, provider_name=None):
+    service = CapmService(workers=workers, provider_name=provider_name)
+    server = await service.start(host, port)
+    print(f"CAPM service listening on http://{host}:{port}")
+    async with server:
+        await server.serve_forever()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="HTTP/JSON service for CAPM and risk metrics.")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--workers', type=int, default=None, help="worker processes running the computations (default: one per CPU)")
+    parser.add_argument('--provider', choices=sorted(data_providers.PROVIDERS), default=None,
+                        help="market data provider, e.g. replay to serve recorded fixtures")
+    args = parser.parse_args()
+    try:
+        asyncio.run(serve(args.host, args.port, args.workers, args.provider))
+    except KeyboardInterrupt:
+        pass
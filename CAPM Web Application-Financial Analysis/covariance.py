@@ -0,0 +1,167 @@
+import numpy as np
+import pandas as pd
+
+import instrumentation
+
+# Covariance estimators
+METHODS = ('sample', 'ewma', 'ledoit-wolf')
+# RiskMetrics decay for daily returns
+EWMA_DECAY = 0.94
+
+
+# Function to split a returns panel into (column names, matrix of the requested dtype)
+def _returns_matrix(returns, dtype=np.float64):
+    if 'Date' in returns.columns:
+        returns = returns.drop(columns='Date')
+    return list(returns.columns), returns.to_numpy(dtype=dtype)
+
+
+# Running covariance of a returns panel that is fed one block of days at a time
+# Keeps the cross products, the pairwise sums and the pairwise day counts of the columns, so missing
+# days (late listings, halts) give pairwise-complete estimates without keeping the history.
+# decay: None for the equally weighted sample covariance, or a factor in (0, 1) for an EWMA
+# covariance where every new day multiplies the weight of all older days by decay.
+# dtype: np.float32 halves the memory of the data and the cross products
+class CovarianceAccumulator:
+    def __init__(self, columns=None, decay=None, dtype=np.float64):
+        self.columns = list(columns) if columns is not None else None
+        self.decay = decay
+        self.dtype = np.dtype(dtype)
+        self.days = 0
+        self._cross = None
+        self._sums = None
+        self._counts = None
+
+    # Function to add a block of new days (DataFrame with the same columns, or an array)
+    def update(self, returns):
+        if isinstance(returns, pd.DataFrame):
+            columns, values = _returns_matrix(returns, self.dtype)
+            if self.columns is None:
+                self.columns = columns
+            elif columns != self.columns:
+                values = _returns_matrix(returns[self.columns], self.dtype)[1]
+        else:
+            values = np.asarray(returns, dtype=self.dtype)
+        if values.ndim == 1:
+            values = values.reshape(1, -1)
+        if self.columns is None:
+            self.columns = list(range(values.shape[1]))
+        n_rows, n_cols = values.shape
+        if self._cross is None:
+            self._cross = np.zeros((n_cols, n_cols), dtype=self.dtype)
+            self._sums = np.zeros((n_cols, n_cols))
+            self._counts = np.zeros((n_cols, n_cols))
+
+        observed = ~np.isnan(values)
+        filled = np.where(observed, values, 0).astype(self.dtype, copy=False)
+        if self.decay is None:
+            weights = None
+            weighted = filled
+        else:
+            # Older days of the block weigh less, and so does everything accumulated before it
+            weights = self.decay ** np.arange(n_rows - 1, -1, -1, dtype=float)
+            # Weights this small change nothing but make float32 arithmetic crawl through subnormals
+            negligible = np.finfo(self.dtype).eps ** 2
+            weights[weights < negligible] = 0.0
+            weighted = filled * weights.astype(self.dtype).reshape(-1, 1)
+            scale = self.decay ** n_rows
+            if scale < negligible:
+                scale = 0.0
+            self._cross *= scale
+            self._sums *= scale
+            self._counts *= scale
+
+        # The one large matrix product; the sums and counts below only need another when days are missing
+        self._cross += weighted.T @ filled
+        if observed.all():
+            self._sums += weighted.sum(axis=0, dtype=float).reshape(-1, 1)
+            self._counts += n_rows if weights is None else weights.sum()
+        else:
+            mask = observed.astype(self.dtype)
+            self._sums += weighted.T @ mask
+            self._counts += (mask if weights is None else mask * weights.astype(self.dtype).reshape(-1, 1)).T @ mask
+        self.days += n_rows
+        return self
+
+    # Function to get the covariance matrix of the days seen so far
+    # Pair (i, j) uses the days where both columns have a return: with sums[i, j] the sum of column i
+    # over those days, cov = (cross - sums * sums.T / n) / (n - ddof)
+    def covariance(self, ddof=None):
+        if self._cross is None:
+            raise ValueError("No returns have been added yet")
+        if ddof is None:
+            ddof = 1 if self.decay is None else 0
+        with np.errstate(divide='ignore', invalid='ignore'):
+            cross = self._cross.astype(float)
+            values = (cross - self._sums * self._sums.T / self._counts) / (self._counts - ddof)
+        values[self._counts <= ddof] = np.nan
+        return pd.DataFrame(values.astype(self.dtype), index=self.columns, columns=self.columns)
+
+
+# Function to get the sample covariance matrix of a returns panel (pairwise-complete)
+def sample_covariance(returns, dtype=np.float64):
+    return CovarianceAccumulator(dtype=dtype).update(returns).covariance()
+
+
+# Function to get the EWMA covariance matrix of a returns panel, the last day weighing most
+# decay: weight factor per day, or halflife: number of days after which a day weighs half as much
+def ewma_covariance(returns, decay=EWMA_DECAY, halflife=None, dtype=np.float64):
+    if halflife is not None:
+        decay = 0.5 ** (1 / halflife)
+    return CovarianceAccumulator(decay=decay, dtype=dtype).update(returns).covariance()
+
+
+# Function to get the Ledoit-Wolf shrinkage covariance of a returns panel
+# Shrinks the sample covariance S towards mu * I (mu the average variance) with the intensity that
+# minimizes the expected squared error (Ledoit & Wolf, 2004). Everything comes from the centered
+# data X and S = X'X / n, the single large matrix product. Missing days count as the column mean.
+# Returns (covariance DataFrame, shrinkage intensity in [0, 1])
+def ledoit_wolf(returns, dtype=np.float64):
+    columns, values = _returns_matrix(returns, dtype)
+    observed = ~np.isnan(values)
+    values = values[observed.any(axis=1)]
+    observed = observed[observed.any(axis=1)]
+    n_rows, n_cols = values.shape
+    if n_rows < 2:
+        raise ValueError("At least two days of returns are needed for the Ledoit-Wolf covariance")
+    mean = np.where(observed, values, 0).sum(axis=0, dtype=float) / np.maximum(observed.sum(axis=0), 1)
+    centered = np.where(observed, values - mean.astype(dtype), 0).astype(dtype, copy=False)
+
+    sample = (centered.T @ centered).astype(float) / n_rows
+    mu = np.trace(sample) / n_cols
+    # Squared distance of S to the target and the estimated error of S, both scaled by 1 / p
+    target_distance = ((sample ** 2).sum() - 2 * mu * np.trace(sample) + mu * mu * n_cols) / n_cols
+    row_norms = np.einsum('ij,ij->i', centered, centered, dtype=float)
+    sample_error = ((row_norms ** 2).sum() / n_rows - (sample ** 2).sum()) / n_rows / n_cols
+    shrinkage = 0.0 if target_distance <= 0 else float(np.clip(sample_error / target_distance, 0.0, 1.0))
+
+    shrunk = (1 - shrinkage) * sample
+    shrunk[np.diag_indices(n_cols)] += shrinkage * mu
+    return pd.DataFrame(shrunk.astype(dtype), index=columns, columns=columns), shrinkage
+
+
+# Function to get a covariance matrix of a returns panel with any of the estimators
+@instrumentation.timed
+def covariance_matrix(returns, method='sample', dtype=np.float64, **kwargs):
+    if method == 'sample':
+        return sample_covariance(returns, dtype=dtype)
+    if method == 'ewma':
+        return ewma_covariance(returns, dtype=dtype, **kwargs)
+    if method == 'ledoit-wolf':
+        return ledoit_wolf(returns, dtype=dtype)[0]
+    raise ValueError(f"Unknown covariance method '{method}', expected one of {METHODS}")
+
+
+# Function to turn a covariance matrix into a correlation matrix
+def to_correlation(cov):
+    values = cov.to_numpy()
+    std = np.sqrt(np.diag(values))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        corr = values / np.outer(std, std)
+    np.fill_diagonal(corr, 1.0)
+    return pd.DataFrame(np.clip(corr, -1.0, 1.0), index=cov.index, columns=cov.columns)
+
+
+# Function to get a correlation matrix of a returns panel with any of the covariance estimators
+def correlation_matrix(returns, method='sample', dtype=np.float64, **kwargs):
+    return to_correlation(covariance_matrix(returns, method, dtype, **kwargs))
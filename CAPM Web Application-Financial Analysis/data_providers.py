@@ -0,0 +1,220 @@
+import json
+import os
+import threading
+
+import pandas as pd
+
+import instrumentation
+import price_cache
+
+# Provider selection, e.g. CAPM_DATA_PROVIDER=replay CAPM_FIXTURE_DIR=./fixtures streamlit run CAPM_Return.py
+# live:   download from Yahoo Finance and FRED
+# record: download like live and also save every response under CAPM_FIXTURE_DIR
+# replay: serve the saved responses from CAPM_FIXTURE_DIR without any network access
+PROVIDER = os.environ.get('CAPM_DATA_PROVIDER', 'live')
+FIXTURE_DIR = os.environ.get('CAPM_FIXTURE_DIR',
+                             os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures'))
+
+# Fields returned for every ticker by prices()
+PRICE_FIELDS = ['Close', 'Adj Close', 'Volume', 'Dividends']
+
+
+# Live backend: Yahoo Finance for prices and fundamentals, FRED through pandas_datareader
+class LiveProvider:
+    name = 'live'
+    # Live responses are worth keeping in the local price cache
+    cacheable = True
+
+    # Function to download several tickers in one batched, threaded request
+    # Returns a dict of ticker -> DataFrame indexed by Date (end inclusive)
+    @instrumentation.timed(name='yfinance download')
+    def prices(self, tickers, start, end):
+        import yfinance as yf
+        tickers = list(tickers)
+        data = yf.download(tickers, start=start, end=price_cache.to_day(end) + price_cache.ONE_DAY,
+                           auto_adjust=False, actions=True, group_by='column', threads=True, progress=False)
+        frames = {}
+        for ticker in tickers:
+            if isinstance(data.columns, pd.MultiIndex):
+                if ticker not in data.columns.get_level_values(1):
+                    frames[ticker] = pd.DataFrame(columns=PRICE_FIELDS, dtype=float,
+                                                  index=pd.DatetimeIndex([], name='Date'))
+                    continue
+                frame = data.xs(ticker, axis=1, level=1)
+            else:
+                frame = data
+            frames[ticker] = price_cache.clean_index(frame.dropna(how='all'))
+        return frames
+
+    @instrumentation.timed(name='yfinance dividends')
+    def dividends(self, ticker):
+        import yfinance as yf
+        dividends = yf.Ticker(ticker).dividends
+        return price_cache.clean_index(dividends.to_frame('Dividends'))['Dividends']
+
+    @instrumentation.timed(name='yfinance info')
+    def info(self, ticker):
+        import yfinance as yf
+        return yf.Ticker(ticker).info
+
+    @instrumentation.timed(name='yfinance financials')
+    def financials(self, ticker):
+        import yfinance as yf
+        return yf.Ticker(ticker).financials
+
+    @instrumentation.timed(name='yfinance balance sheet')
+    def balance_sheet(self, ticker):
+        import yfinance as yf
+        return yf.Ticker(ticker).balance_sheet
+
+    # Function to download one FRED series, returned as a one column DataFrame indexed by Date
+    @instrumentation.timed(name='FRED DataReader')
+    def fred(self, series, start, end):
+        import pandas_datareader.data as web
+        return price_cache.clean_index(web.DataReader(series, 'fred', start, end))
+
+
+# Helper for the fixture file layout: <root>/<kind>/<symbol>.<ext>
+class _FixtureStore:
+    def __init__(self, root):
+        self.root = root
+
+    def path(self, kind, symbol, extension=None):
+        extension = extension or ('parquet' if price_cache.FILE_FORMAT == 'parquet' else 'pkl')
+        name = price_cache.safe_file_name(symbol)
+        return os.path.join(self.root, kind, f'{name}.{extension}')
+
+    def read_frame(self, kind, symbol):
+        path = self.path(kind, symbol)
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"No recorded {kind} fixture for '{symbol}' in {self.root}")
+        return price_cache.read_frame(path)
+
+    def write_frame(self, kind, symbol, frame):
+        path = self.path(kind, symbol)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        price_cache.write_frame(frame, path)
+
+    def read_json(self, kind, symbol):
+        path = self.path(kind, symbol, 'json')
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"No recorded {kind} fixture for '{symbol}' in {self.root}")
+        with open(path) as f:
+            return json.load(f)
+
+    def write_json(self, kind, symbol, data):
+        path = self.path(kind, symbol, 'json')
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w') as f:
+            json.dump(data, f, indent=1, default=str)
+
+
+# Record backend: answers from the live backend and saves each response as a fixture.
+# Price and FRED fixtures are merged with earlier recordings so one fixture can serve many date ranges.
+class RecordingProvider:
+    name = 'record'
+    cacheable = False
+
+    def __init__(self, root=FIXTURE_DIR, live=None):
+        self.live = live or LiveProvider()
+        self.store = _FixtureStore(root)
+        self._lock = threading.Lock()
+
+    def _merge_frame(self, kind, symbol, frame):
+        with self._lock:
+            try:
+                stored = self.store.read_frame(kind, symbol)
+                frame = pd.concat([stored, frame])
+                frame = frame[~frame.index.duplicated(keep='last')].sort_index()
+            except FileNotFoundError:
+                pass
+            self.store.write_frame(kind, symbol, frame)
+
+    def prices(self, tickers, start, end):
+        frames = self.live.prices(tickers, start, end)
+        for ticker, frame in frames.items():
+            self._merge_frame('prices', ticker, frame)
+        return frames
+
+    def dividends(self, ticker):
+        dividends = self.live.dividends(ticker)
+        self.store.write_frame('dividends', ticker, dividends.to_frame('Dividends'))
+        return dividends
+
+    def info(self, ticker):
+        info = self.live.info(ticker)
+        self.store.write_json('info', ticker, info)
+        return info
+
+    def financials(self, ticker):
+        financials = self.live.financials(ticker)
+        self.store.write_frame('financials', ticker, financials)
+        return financials
+
+    def balance_sheet(self, ticker):
+        balance_sheet = self.live.balance_sheet(ticker)
+        self.store.write_frame('balance_sheet', ticker, balance_sheet)
+        return balance_sheet
+
+    def fred(self, series, start, end):
+        frame = self.live.fred(series, start, end)
+        self._merge_frame('fred', series, frame)
+        return frame
+
+
+# Replay backend: serves recorded fixtures from local files, never touches the network
+class ReplayProvider:
+    name = 'replay'
+    cacheable = False
+
+    def __init__(self, root=FIXTURE_DIR):
+        self.store = _FixtureStore(root)
+
+    def _slice(self, frame, start, end):
+        return frame.loc[price_cache.to_day(start):price_cache.to_day(end)]
+
+    def prices(self, tickers, start, end):
+        return {ticker: self._slice(self.store.read_frame('prices', ticker), start, end) for ticker in tickers}
+
+    def dividends(self, ticker):
+        return self.store.read_frame('dividends', ticker)['Dividends']
+
+    def info(self, ticker):
+        return self.store.read_json('info', ticker)
+
+    def financials(self, ticker):
+        return self.store.read_frame('financials', ticker)
+
+    def balance_sheet(self, ticker):
+        return self.store.read_frame('balance_sheet', ticker)
+
+    def fred(self, series, start, end):
+        return self._slice(self.store.read_frame('fred', series), start, end)
+
+
+PROVIDERS = {
+    'live': LiveProvider,
+    'record': RecordingProvider,
+    'replay': ReplayProvider,
+}
+
+_provider = None
+_provider_lock = threading.Lock()
+
+
+# Function to get the configured provider (shared by every page of the app)
+def get_provider():
+    global _provider
+    with _provider_lock:
+        if _provider is None:
+            if PROVIDER not in PROVIDERS:
+                raise ValueError(f"Unknown data provider '{PROVIDER}', expected one of {sorted(PROVIDERS)}")
+            _provider = PROVIDERS[PROVIDER]()
+        return _provider
+
+
+# Function to switch provider from code, e.g. a replay provider in benchmarks
+def set_provider(provider):
+    global _provider
+    with _provider_lock:
+        _provider = provider
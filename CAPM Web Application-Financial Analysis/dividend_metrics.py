@@ -0,0 +1,110 @@
+import numpy as np
+import pandas as pd
+
+import instrumentation
+import market_data
+
+# Payments per year a payout schedule is snapped to, with its name
+FREQUENCIES = {12: 'Monthly', 4: 'Quarterly', 2: 'Semi-annual', 1: 'Annual'}
+# Columns of the dividend table, in display order
+COLUMNS = ['Stock', 'Price', 'Latest Dividend', 'Last Ex-Date', 'TTM Dividends', 'TTM Yield', 'Frequency',
+           'Payments per Year', 'Dividend CAGR', 'Growth Streak', 'Paying Streak', 'Years']
+
+
+# Function to load the dividends and closing prices of every ticker in one batched price download
+# Returns (dividends, close), both indexed by Date with one column per ticker; days without a payment are 0
+def load_dividends(tickers, start, end):
+    panel = market_data.load_price_panel(tickers, start, end, fields=['Close', 'Dividends'])
+    return panel['Dividends'], panel['Close']
+
+
+# Function to get the dividends paid in every complete calendar year of the history, one column per ticker
+# A year counts when the price history covers it from its first to its last trading week
+def annual_dividends(dividends, close):
+    annual = dividends.resample('YE').sum()
+    if close.empty:
+        return annual.iloc[:0]
+    first, last = close.index[0], close.index[-1]
+    starts = annual.index - pd.offsets.YearBegin(1)
+    complete = (starts >= first - pd.Timedelta(days=7)) & (annual.index <= last + pd.Timedelta(days=7))
+    return annual[complete]
+
+
+# Function to count the trailing run of True values of every column (e.g. consecutive growth years)
+def _trailing_run(flags):
+    if len(flags) == 0:
+        return np.zeros(flags.shape[1], dtype=int)
+    return np.cumprod(flags[::-1], axis=0).sum(axis=0)
+
+
+# Function to compute the dividend table of every ticker from the dividend and price panels at once
+# TTM: dividends paid over the 365 days up to the last price date; TTM Yield is a decimal
+# Frequency: payments over the trailing two years, snapped to monthly / quarterly / semi-annual / annual
+# Dividend CAGR: growth of the annual dividend from the first complete paying year to the last complete year
+# Growth Streak / Paying Streak: consecutive complete years, up to the last one, with a higher / any dividend
+@instrumentation.timed
+def dividend_table(dividends, close):
+    tickers = list(dividends.columns)
+    values = dividends.reindex(columns=tickers).fillna(0.0).to_numpy()
+    dates = dividends.index
+    last_date = close.index[-1] if len(close) else pd.Timestamp.today().normalize()
+
+    price = (close.reindex(columns=tickers).ffill().iloc[-1].to_numpy() if len(close)
+             else np.full(len(tickers), np.nan))
+    paid = values > 0
+    # Row of the last payment of every ticker (-1 when it never paid in the window)
+    last_row = np.where(paid.any(axis=0), len(values) - 1 - np.argmax(paid[::-1], axis=0), -1)
+    latest = np.where(last_row >= 0, values[np.maximum(last_row, 0), np.arange(len(tickers))], np.nan)
+    last_ex = pd.DatetimeIndex(np.where(last_row >= 0, dates.to_numpy()[np.maximum(last_row, 0)],
+                                        np.datetime64('NaT')))
+
+    ttm = values[dates > last_date - pd.Timedelta(days=365)].sum(axis=0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ttm_yield = np.where(price > 0, ttm / price, np.nan)
+
+    # Snap the trailing two year payment rate to the nearest schedule (on a log scale)
+    payments = paid[dates > last_date - pd.Timedelta(days=730)].sum(axis=0) / 2
+    schedules = np.array(list(FREQUENCIES))
+    with np.errstate(divide='ignore'):
+        nearest = np.abs(np.log(np.maximum(payments, 1e-9))[:, None] - np.log(schedules)[None, :]).argmin(axis=1)
+    per_year = np.where(payments > 0, schedules[nearest], 0)
+    frequency = [FREQUENCIES.get(p, 'None') for p in per_year]
+
+    annual = annual_dividends(dividends.reindex(columns=tickers).fillna(0.0), close).to_numpy()
+    years = len(annual)
+    positive = annual > 0
+    has_first = positive.any(axis=0)
+    first_row = np.argmax(positive, axis=0)
+    columns = np.arange(len(tickers))
+    cagr = np.full(len(tickers), np.nan)
+    if years:
+        first_value = annual[first_row, columns]
+        last_value = annual[-1]
+        periods = years - 1 - first_row
+        with np.errstate(divide='ignore', invalid='ignore'):
+            growth = (last_value / first_value) ** (1 / np.where(periods > 0, periods, np.nan)) - 1
+        cagr = np.where(has_first & (periods > 0) & (last_value > 0), growth, np.nan)
+    growth_streak = _trailing_run(np.diff(annual, axis=0) > 0) if years > 1 else np.zeros(len(tickers), dtype=int)
+    paying_streak = _trailing_run(positive)
+
+    return pd.DataFrame({
+        'Stock': tickers,
+        'Price': price,
+        'Latest Dividend': latest,
+        'Last Ex-Date': last_ex,
+        'TTM Dividends': ttm,
+        'TTM Yield': ttm_yield,
+        'Frequency': frequency,
+        'Payments per Year': per_year,
+        'Dividend CAGR': cagr,
+        'Growth Streak': growth_streak,
+        'Paying Streak': paying_streak,
+        'Years': years,
+    }, columns=COLUMNS)
+
+
+# Function to list every payment as (Date, Stock, Dividend) rows, newest first
+def dividend_history(dividends):
+    history = dividends.where(dividends > 0).stack().dropna().rename('Dividend')
+    history.index.names = ['Date', 'Stock']
+    return history.reset_index().sort_values('Date', ascending=False, kind='stable', ignore_index=True)
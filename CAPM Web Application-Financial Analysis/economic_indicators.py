@@ -0,0 +1,100 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+import alignment
+import capm_functions
+import instrumentation
+import market_data
+
+# Indicators offered by the pages: FRED series, display name, native frequency and how the series is
+# aggregated when a period of the panel holds several observations
+INDICATORS = {
+    'GDP': {'series': 'GDP', 'name': 'Gross Domestic Product', 'frequency': 'QS', 'how': 'mean'},
+    'CPI': {'series': 'CPIAUCNS', 'name': 'Consumer Price Index', 'frequency': 'MS', 'how': 'last'},
+    'Unemployment Rate': {'series': 'UNRATE', 'name': 'Unemployment Rate', 'frequency': 'MS', 'how': 'mean'},
+    'Interest Rates': {'series': 'FEDFUNDS', 'name': 'Federal Funds Rate', 'frequency': 'MS', 'how': 'mean'},
+    'PPI': {'series': 'PPIACO', 'name': 'Producer Price Index', 'frequency': 'MS', 'how': 'last'},
+}
+# Panel frequencies (label -> pandas rule, periods labelled by their first day like FRED)
+FREQUENCIES = {'Monthly': 'MS', 'Quarterly': 'QS', 'Annual': 'YS'}
+# FRED series downloaded at the same time
+FETCH_WORKERS = 8
+
+
+# Function to fetch several FRED series concurrently through the cached load_fred
+# Returns series id -> Series indexed by Date, in the order requested
+def fetch_series(series_ids, start, end, workers=FETCH_WORKERS):
+    series_ids = list(dict.fromkeys(series_ids))
+    if not series_ids:
+        return {}
+    with instrumentation.stage('fetch FRED series', rows=len(series_ids)):
+        with ThreadPoolExecutor(max_workers=min(workers, len(series_ids))) as executor:
+            frames = list(executor.map(lambda s: market_data.load_fred(s, start, end), series_ids))
+    return {s: frame.iloc[:, 0].rename(s) for s, frame in zip(series_ids, frames)}
+
+
+# Function to resample one series to the panel frequency
+# Finer series are aggregated with `how`; coarser ones (quarterly GDP in a monthly panel) are held
+# until their next observation is due, never past the period of the last one
+def _resample(values, rule, native, how):
+    values = values.dropna()
+    if values.empty:
+        return values
+    resampled = getattr(values.resample(rule), how)()
+    valid_until = values.index[-1] + pd.tseries.frequencies.to_offset(native)
+    held = resampled.ffill()
+    return held[held.index < valid_until]
+
+
+# Function to build a compact indicator panel: one column per indicator (display names), one row per period
+# labels: keys of INDICATORS; frequency: key of FREQUENCIES
+# rules: optional label -> aggregation overriding the 'how' of INDICATORS ('mean', 'last', 'sum', ...)
+@instrumentation.timed
+def indicator_panel(labels, start, end, frequency='Monthly', rules=None):
+    unknown = [label for label in labels if label not in INDICATORS]
+    if unknown:
+        raise ValueError(f"Unknown indicator(s) {unknown}, expected any of {list(INDICATORS)}")
+    rules = rules or {}
+    fetched = fetch_series([INDICATORS[label]['series'] for label in labels], start, end)
+    columns = {}
+    for label in labels:
+        spec = INDICATORS[label]
+        columns[spec['name']] = _resample(fetched[spec['series']], FREQUENCIES[frequency], spec['frequency'],
+                                          rules.get(label, spec['how']))
+    panel = pd.DataFrame(columns)
+    panel.index.name = 'Date'
+    return panel.dropna(how='all')
+
+
+# Function to attach to every row of a daily returns frame the indicator values known on that date
+# An indicator value is labelled with the first day of its period but only published after it, so it is
+# taken as known `lag_periods` periods later (0 uses the period start and looks ahead)
+# Returns (joined frame indexed by Date, alignment report)
+def asof_join(returns, panel, frequency='Monthly', lag_periods=1):
+    known = panel.copy()
+    if lag_periods:
+        known.index = known.index + lag_periods * pd.tseries.frequencies.to_offset(FREQUENCIES[frequency])
+    return alignment.align_frames(returns, known, how='asof')
+
+
+# Function to get the relative change of each indicator on the days a new value becomes known,
+# NaN on every other day (so regressions only use release days)
+def indicator_changes(joined, columns):
+    levels = joined[columns]
+    previous = levels.shift(1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        changes = levels / previous - 1
+    return changes.where(levels.ne(previous) & previous.notna())
+
+
+# Function to regress daily stock returns on the release-day changes of each indicator
+# returns: decimal daily returns indexed by Date (one column per stock); panel: from indicator_panel
+# Returns the regress_panel table, one row per (stock, indicator)
+@instrumentation.timed
+def macro_betas(returns, panel, frequency='Monthly', lag_periods=1):
+    joined, _ = asof_join(returns, panel, frequency, lag_periods)
+    indicators = list(panel.columns)
+    frame = joined[list(returns.columns)].join(indicator_changes(joined, indicators))
+    return capm_functions.regress_panel(frame, indicators, list(returns.columns))
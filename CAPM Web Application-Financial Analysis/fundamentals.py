@@ -0,0 +1,202 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+import data_providers
+import instrumentation
+import market_data
+import price_cache
+import result_cache
+
+# Statements are kept next to the price cache, one file per (statement, ticker) with one row per fiscal period
+STATEMENT_DIR = os.environ.get('CAPM_STATEMENT_DIR', os.path.join(price_cache.CACHE_DIR, 'statements'))
+# A new annual statement is expected this many days after the last fiscal period end (one year plus filing)
+NEXT_PERIOD_DAYS = 365 + 90
+# Once a new statement is due, the provider is asked again at most this often until it shows up
+RECHECK_DAYS = 7
+# Tickers whose statements are downloaded at the same time
+FETCH_WORKERS = 8
+
+# Line items used by the ratios (canonical name -> statement and the labels Yahoo has used for it)
+# The first label with a value in a period wins, so renamed rows in older periods are still found
+ALIASES = {
+    'Net Income': ('financials', ['Net Income', 'Net Income Common Stockholders',
+                                  'Net Income From Continuing Operation Net Minority Interest']),
+    'Diluted EPS': ('financials', ['Diluted EPS', 'Basic EPS']),
+    'Total Revenue': ('financials', ['Total Revenue', 'Operating Revenue']),
+    'Total Debt': ('balance_sheet', ['Total Debt', 'Long Term Debt And Capital Lease Obligation']),
+    'Total Equity': ('balance_sheet', ['Stockholders Equity', 'Total Stockholder Equity', 'Common Stock Equity',
+                                       'Total Equity Gross Minority Interest']),
+    'Total Assets': ('balance_sheet', ['Total Assets']),
+    'Current Assets': ('balance_sheet', ['Current Assets', 'Total Current Assets']),
+    'Current Liabilities': ('balance_sheet', ['Current Liabilities', 'Total Current Liabilities']),
+}
+STATEMENTS = ('financials', 'balance_sheet')
+# Ratios computed for every period and ticker, in display order
+RATIOS = ['P/E Ratio', 'Debt-to-Equity Ratio', 'Return on Equity (ROE)', 'Return on Assets (ROA)', 'Current Ratio']
+
+
+# Function to turn a Yahoo statement (line items x period columns) into one row per fiscal period with the
+# canonical line items of ALIASES as columns; items missing from the statement are NaN
+def normalize_statement(raw, statement):
+    items = [name for name, (source, _) in ALIASES.items() if source == statement]
+    if raw is None or raw.empty:
+        return pd.DataFrame(columns=items, index=pd.DatetimeIndex([], name='Period'), dtype=float)
+    raw = raw.T
+    raw.index = pd.DatetimeIndex(pd.to_datetime(raw.index)).normalize().rename('Period')
+    columns = {}
+    for name in items:
+        labels = [label for label in ALIASES[name][1] if label in raw.columns]
+        values = pd.Series(np.nan, index=raw.index)
+        for label in labels:
+            values = values.fillna(pd.to_numeric(raw[label], errors='coerce'))
+        columns[name] = values
+    return pd.DataFrame(columns, columns=items).sort_index()
+
+
+# On-disk store of normalized statements. Rows are keyed by fiscal period, so a download only adds the
+# periods that are new and older periods Yahoo no longer returns are kept. A statement is downloaded
+# again only once its next fiscal period is due.
+class StatementCache:
+    def __init__(self, root=STATEMENT_DIR):
+        self.root = root
+        os.makedirs(self.root, exist_ok=True)
+        self.manifest = price_cache.Manifest(self.root)
+
+    def _file_path(self, key):
+        return price_cache.cache_file_path(self.root, key)
+
+    # Function to tell whether a stored statement may have a newer fiscal period by now
+    def is_due(self, statement, ticker, now=None):
+        entry = self.manifest.entries().get(f'{statement}:{ticker}')
+        if entry is None:
+            return True
+        now = now or time.time()
+        if now - entry['fetched_at'] < RECHECK_DAYS * 86400:
+            return False
+        if entry['latest_period'] is None:
+            return True
+        due = pd.Timestamp(entry['latest_period']) + pd.Timedelta(days=NEXT_PERIOD_DAYS)
+        return pd.Timestamp(now, unit='s') >= due
+
+    def read(self, statement, ticker):
+        key = f'{statement}:{ticker}'
+        if key not in self.manifest.entries():
+            return None
+        return price_cache.read_frame(self._file_path(key))
+
+    # Function to merge the periods of a normalized statement into the store (newer download wins)
+    def write(self, statement, ticker, frame):
+        key = f'{statement}:{ticker}'
+        path = self._file_path(key)
+        with self.manifest.update() as entries:
+            if key in entries and os.path.exists(path):
+                stored = price_cache.read_frame(path)
+                frame = pd.concat([stored, frame])
+                frame = frame[~frame.index.duplicated(keep='last')].sort_index()
+            price_cache.write_frame(frame, path)
+            entries[key] = {
+                'file': os.path.basename(path),
+                'periods': len(frame),
+                'latest_period': frame.index[-1].strftime('%Y-%m-%d') if len(frame) else None,
+                'fetched_at': time.time(),
+            }
+        return frame
+
+    # Function to return the statement of a ticker, downloading it only when a new period is due
+    # fetch(ticker) must return the raw Yahoo statement
+    def get(self, statement, ticker, fetch):
+        if self.is_due(statement, ticker):
+            return self.write(statement, ticker, normalize_statement(fetch(ticker), statement))
+        return self.read(statement, ticker)
+
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+
+# Function to get the process-wide statement cache shared by every page
+def default_cache():
+    global _default_cache
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = StatementCache()
+        return _default_cache
+
+
+# Function to load the normalized statements of one ticker, one row per fiscal period
+def _ticker_statements(ticker, provider, cache):
+    frames = []
+    for statement in STATEMENTS:
+        fetch = getattr(provider, statement)
+        if cache is None:
+            frames.append(normalize_statement(fetch(ticker), statement))
+        else:
+            frames.append(cache.get(statement, ticker, fetch))
+    return pd.concat(frames, axis=1).sort_index()
+
+
+# Function to load the statements of many tickers concurrently
+# Returns a frame indexed by (Ticker, Period) with the canonical line items of ALIASES as columns
+# Tickers Yahoo has no statements for are left out
+@result_cache.memoize(provider_scoped=True, ttl=market_data.FETCH_TTL)
+@instrumentation.timed
+def load_statements(tickers, provider=None, cache=None, workers=FETCH_WORKERS):
+    provider = provider or data_providers.get_provider()
+    if provider.cacheable:
+        cache = cache or default_cache()
+    tickers = list(dict.fromkeys(tickers))
+    columns = list(ALIASES)
+    frames = {}
+    if tickers:
+        with ThreadPoolExecutor(max_workers=min(workers, len(tickers))) as executor:
+            loaded = executor.map(lambda t: _ticker_statements(t, provider, cache), tickers)
+            frames = {ticker: frame for ticker, frame in zip(tickers, loaded) if len(frame)}
+    if not frames:
+        index = pd.MultiIndex.from_arrays([[], pd.DatetimeIndex([])], names=['Ticker', 'Period'])
+        return pd.DataFrame(columns=columns, index=index, dtype=float)
+    statements = pd.concat(frames, names=['Ticker', 'Period'])
+    return statements.reindex(columns=columns)
+
+
+# Function to get the closing price of every (ticker, fiscal period end): the last close at or before it
+def period_end_prices(statements, lookback_days=10):
+    tickers = statements.index.get_level_values('Ticker')
+    periods = statements.index.get_level_values('Period')
+    if len(statements) == 0:
+        return np.array([])
+    start = periods.min() - pd.Timedelta(days=lookback_days)
+    close = market_data.load_price_panel(list(dict.fromkeys(tickers)), start, periods.max(),
+                                         fields=['Close'])['Close'].ffill(limit=lookback_days)
+    rows = close.index.searchsorted(periods, side='right') - 1
+    columns = close.columns.get_indexer(tickers)
+    values = close.to_numpy()
+    prices = values[np.maximum(rows, 0), np.maximum(columns, 0)]
+    return np.where((rows >= 0) & (columns >= 0), prices, np.nan)
+
+
+# Function to compute the ratios of every ticker and fiscal period as array operations
+# statements: from load_statements; prices: closing price at each period end (period_end_prices by default)
+# A ratio is NaN when one of its line items is missing or its denominator is zero, never a default value
+@instrumentation.timed
+def ratio_table(statements, prices=None):
+    if prices is None:
+        prices = period_end_prices(statements)
+    item = {name: statements[name].to_numpy(dtype=float) for name in ALIASES}
+
+    def ratio(numerator, denominator):
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return np.where(denominator != 0, numerator / denominator, np.nan)
+
+    ratios = pd.DataFrame({
+        'P/E Ratio': ratio(np.asarray(prices, dtype=float), item['Diluted EPS']),
+        'Debt-to-Equity Ratio': ratio(item['Total Debt'], item['Total Equity']),
+        'Return on Equity (ROE)': ratio(item['Net Income'], item['Total Equity']),
+        'Return on Assets (ROA)': ratio(item['Net Income'], item['Total Assets']),
+        'Current Ratio': ratio(item['Current Assets'], item['Current Liabilities']),
+    }, index=statements.index)
+    return ratios.reset_index()
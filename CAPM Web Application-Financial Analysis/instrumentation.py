@@ -0,0 +1,235 @@
+import functools
+import json
+import os
+import threading
+import time
+import tracemalloc
+import weakref
+
+import numpy as np
+import pandas as pd
+
+# Set CAPM_INSTRUMENTATION=1 to record every page run without ticking the sidebar box
+ALWAYS_ON = os.environ.get('CAPM_INSTRUMENTATION', '0') == '1'
+
+# Each Streamlit script run (and each CLI / service worker thread) records into its own recorder
+_local = threading.local()
+
+# tracemalloc is process-wide: it runs while any recorder traces memory, counted under a lock so one
+# session stopping does not end the tracing of another
+_tracing_lock = threading.Lock()
+_tracing_users = 0
+_started_tracing = False
+
+
+# Stage statistics of one run: calls, inclusive wall time, rows processed and traced memory delta
+# memory: trace allocations with tracemalloc for the memory column (slows the run down noticeably)
+class Recorder:
+    def __init__(self, page='', memory=False):
+        self.page = page
+        self.memory = memory
+        self.stages = {}
+        self.started = time.perf_counter()
+        self._release_tracing = None
+
+    def add(self, name, seconds, rows=None, memory_bytes=None):
+        entry = self.stages.get(name)
+        if entry is None:
+            entry = self.stages[name] = {'calls': 0, 'seconds': 0.0, 'rows': 0, 'memory_bytes': 0}
+        entry['calls'] += 1
+        entry['seconds'] += seconds
+        if rows:
+            entry['rows'] += int(rows)
+        if memory_bytes is not None:
+            entry['memory_bytes'] += memory_bytes
+
+    # Function to get the stages as a table, slowest first
+    def table(self):
+        columns = ['Stage', 'Calls', 'Seconds', 'Rows', 'Memory (MB)']
+        rows = [(name, s['calls'], s['seconds'], s['rows'], s['memory_bytes'] / 2 ** 20 if self.memory else np.nan)
+                for name, s in self.stages.items()]
+        return pd.DataFrame(rows, columns=columns).sort_values('Seconds', ascending=False, ignore_index=True)
+
+    def to_dict(self):
+        # Imported here, result_cache depends on data_providers, which is instrumented itself
+        import result_cache
+
+        return {'page': self.page, 'total_seconds': time.perf_counter() - self.started,
+                'memory_tracked': self.memory, 'stages': self.stages, 'result_cache': result_cache.shared_cache.stats()}
+
+    def to_json(self):
+        return json.dumps(self.to_dict(), indent=1)
+
+    # Function to export the stages in the Prometheus text exposition format
+    def to_prometheus(self):
+        page = self.page.replace('\\', '\\\\').replace('"', '\\"')
+        metrics = [
+            ('capm_stage_calls_total', 'counter', 'Calls of each stage', 'calls'),
+            ('capm_stage_seconds_total', 'counter', 'Wall time spent in each stage, including nested stages', 'seconds'),
+            ('capm_stage_rows_total', 'counter', 'Rows processed by each stage', 'rows'),
+        ]
+        if self.memory:
+            metrics.append(('capm_stage_memory_bytes', 'gauge', 'Traced memory delta of each stage', 'memory_bytes'))
+        lines = []
+        for metric, kind, description, field in metrics:
+            lines += [f'# HELP {metric} {description}', f'# TYPE {metric} {kind}']
+            for name, s in self.stages.items():
+                stage = name.replace('\\', '\\\\').replace('"', '\\"')
+                lines.append(f'{metric}{{page="{page}",stage="{stage}"}} {s[field]}')
+        return '\n'.join(lines) + '\n'
+
+
+# Function to get the recorder of the current thread, None when recording is off
+def current():
+    return getattr(_local, 'recorder', None)
+
+
+# Function to take one reference on memory tracing, starting tracemalloc for the first one
+def _acquire_tracing():
+    global _tracing_users, _started_tracing
+    with _tracing_lock:
+        if _tracing_users == 0 and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            _started_tracing = True
+        _tracing_users += 1
+
+
+# Function to drop one reference, stopping tracemalloc after the last one (unless someone else started it)
+def _release_tracing():
+    global _tracing_users, _started_tracing
+    with _tracing_lock:
+        _tracing_users -= 1
+        if _tracing_users == 0 and _started_tracing:
+            tracemalloc.stop()
+            _started_tracing = False
+
+
+# Function to start recording in the current thread (replaces the previous recorder)
+def start(page='', memory=False):
+    stop()
+    recorder = Recorder(page, memory)
+    if memory:
+        _acquire_tracing()
+        # Released by stop(), or when the recorder of a thread that went away is collected
+        recorder._release_tracing = weakref.finalize(recorder, _release_tracing)
+    _local.recorder = recorder
+    return recorder
+
+
+# Function to stop recording in the current thread, returns the recorder that was active
+def stop():
+    recorder = current()
+    _local.recorder = None
+    if recorder is not None and recorder._release_tracing is not None:
+        recorder._release_tracing()
+    return recorder
+
+
+# Handle given by stage(), set .rows inside the block to report the rows processed
+class _Stage:
+    __slots__ = ('name', 'recorder', 'rows', '_t0', '_m0')
+
+    def __init__(self, name, recorder, rows):
+        self.name = name
+        self.recorder = recorder
+        self.rows = rows
+
+    def __enter__(self):
+        self._m0 = tracemalloc.get_traced_memory()[0] if self.recorder.memory else None
+        self._t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        seconds = time.perf_counter() - self._t0
+        memory = tracemalloc.get_traced_memory()[0] - self._m0 if self._m0 is not None else None
+        self.recorder.add(self.name, seconds, self.rows, memory)
+        return False
+
+
+# Stand-in used when recording is off, entering and leaving it does nothing
+class _NoStage:
+    __slots__ = ('rows',)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NO_STAGE = _NoStage()
+
+
+# Context manager timing a named stage of the current run:
+#     with instrumentation.stage('download') as s:
+#         df = ...
+#         s.rows = len(df)
+def stage(name, rows=None):
+    recorder = current()
+    if recorder is None:
+        return _NO_STAGE
+    return _Stage(name, recorder, rows)
+
+
+# Function to count the rows of a stage result (DataFrame, Series, array, or a tuple starting with one)
+def _rows(result):
+    if isinstance(result, tuple) and result:
+        result = result[0]
+    if isinstance(result, (pd.DataFrame, pd.Series, np.ndarray)):
+        return len(result)
+    return None
+
+
+# Decorator timing every call of a function as a stage (the function name by default)
+# The rows of a DataFrame / Series / array result are counted. When recording is off the only cost is
+# one thread-local lookup per call.
+def timed(func=None, name=None):
+    if func is None:
+        return lambda f: timed(f, name)
+    stage_name = name or func.__name__
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        recorder = current()
+        if recorder is None:
+            return func(*args, **kwargs)
+        with _Stage(stage_name, recorder, None) as handle:
+            result = func(*args, **kwargs)
+            handle.rows = _rows(result)
+        return result
+    return wrapper
+
+
+# Function called at the top of a page: adds the sidebar switches and starts recording when enabled
+def start_page(page):
+    import streamlit as st
+
+    with st.sidebar:
+        enabled = st.checkbox("Performance panel", value=ALWAYS_ON, key='instrumentation_enabled')
+        memory = enabled and st.checkbox("Track memory (slower)", value=False, key='instrumentation_memory')
+    if enabled:
+        return start(page, memory)
+    stop()
+    return None
+
+
+# Function called at the end of a page: shows the collapsible Performance panel with the export buttons
+def performance_panel():
+    import streamlit as st
+
+    recorder = current()
+    if recorder is None:
+        return
+    summary = recorder.to_dict()
+    with st.expander(f"Performance: {summary['total_seconds']:.2f} s"):
+        st.dataframe(recorder.table().round(4), use_container_width=True, hide_index=True)
+        cache = summary['result_cache']
+        st.caption(f"Result cache: {cache['hits']} hits, {cache['misses']} misses "
+                   f"({cache['hit_rate']:.0%} hit rate), {cache['entries']} entries, {cache['bytes'] / 2 ** 20:.1f} MB. "
+                   "Stage times include their nested stages.")
+        col1, col2 = st.columns(2)
+        with col1:
+            st.download_button("Export JSON", recorder.to_json(), file_name='performance.json', mime='application/json')
+        with col2:
+            st.download_button("Export Prometheus", recorder.to_prometheus(), file_name='performance.prom',
+                               mime='text/plain')
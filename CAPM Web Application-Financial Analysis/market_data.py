@@ -0,0 +1,64 @@
+import pandas as pd
+
+import data_providers
+import instrumentation
+import price_cache
+import result_cache
+
+# Fields kept in the price panel, in display order
+PANEL_FIELDS = data_providers.PRICE_FIELDS
+
+# Fetched results are shared between sessions for as long as the price cache treats today's rows as fresh
+FETCH_TTL = price_cache.STALE_MINUTES * 60
+
+
+# Function to load an aligned wide price panel for a list of tickers
+# Tickers missing the same date range from the local cache are downloaded together in one request,
+# so 8+ tickers cost about one round trip instead of one per symbol
+# Returns a DataFrame indexed by Date with (Field, Ticker) columns, e.g. panel['Close'] is one column per ticker
+@result_cache.memoize(provider_scoped=True, ttl=FETCH_TTL)
+@instrumentation.timed
+def load_price_panel(tickers, start, end, fields=PANEL_FIELDS, provider=None, cache=None):
+    provider = provider or data_providers.get_provider()
+    tickers = list(dict.fromkeys(tickers))
+    columns = pd.MultiIndex.from_product([fields, tickers], names=['Field', 'Ticker'])
+    if not tickers:
+        return pd.DataFrame(columns=columns, index=pd.DatetimeIndex([], name='Date'))
+
+    if provider.cacheable:
+        cache = cache or price_cache.default_cache()
+        # Group tickers by the range they are missing so each distinct range is one batched download
+        downloads = {}
+        for ticker in tickers:
+            for missing in cache.missing_ranges('yahoo', ticker, start, end):
+                downloads.setdefault(missing, []).append(ticker)
+        for (missing_start, missing_end), group in downloads.items():
+            fetched = provider.prices(group, missing_start, missing_end)
+            for ticker, frame in fetched.items():
+                cache.write('yahoo', ticker, frame, missing_start, missing_end)
+        frames = {ticker: cache.read('yahoo', ticker, start, end) for ticker in tickers}
+        # Tickers the provider returned nothing for are not in the cache
+        empty = pd.DataFrame(columns=fields, dtype=float, index=pd.DatetimeIndex([], name='Date'))
+        frames = {ticker: empty if frame is None else frame for ticker, frame in frames.items()}
+    else:
+        frames = provider.prices(tickers, start, end)
+
+    frames = {ticker: frames[ticker].reindex(columns=fields) for ticker in tickers}
+    panel = pd.concat(frames, axis=1, names=['Ticker', 'Field']).swaplevel(axis=1)
+    panel = panel.reindex(columns=columns)
+    if 'Dividends' in fields:
+        panel['Dividends'] = panel['Dividends'].fillna(0.0)
+    panel.index.name = 'Date'
+    return panel
+
+
+# Function to load one FRED series (e.g. 'sp500'), served from the local cache when the provider allows it
+# Returns a one column DataFrame indexed by Date
+@result_cache.memoize(provider_scoped=True, ttl=FETCH_TTL)
+@instrumentation.timed
+def load_fred(series, start, end, provider=None, cache=None):
+    provider = provider or data_providers.get_provider()
+    if not provider.cacheable:
+        return provider.fred(series, start, end)
+    cache = cache or price_cache.default_cache()
+    return cache.get('fred', series, start, end, provider.fred)
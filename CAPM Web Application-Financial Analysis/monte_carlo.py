@@ -0,0 +1,164 @@
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+# Simulation methods
+METHODS = ('gbm', 'bootstrap')
+# Upper bound on the memory one chunk of paths may use while it is simulated
+MAX_CHUNK_BYTES = 64 * 1024 * 1024
+
+
+# Function to turn a returns panel (decimal simple returns, optional Date column) into a matrix of
+# daily log returns, dropping the rows where any asset is missing
+def log_return_matrix(returns):
+    if 'Date' in returns.columns:
+        returns = returns.drop(columns='Date')
+    values = returns.to_numpy(dtype=float)
+    values = values[~np.isnan(values).any(axis=1)]
+    return np.log1p(values)
+
+
+# Function to estimate the per step drift and covariance of log returns used by the GBM paths
+def estimate_parameters(log_returns):
+    mean = log_returns.mean(axis=0)
+    cov = np.atleast_2d(np.cov(log_returns, rowvar=False))
+    return mean, cov
+
+
+# Function to pick how many paths fit in one chunk for the memory budget
+def chunk_size(n_steps, n_assets, max_chunk_bytes=MAX_CHUNK_BYTES):
+    # log returns, their running sum and the asset growth factors are alive at the same time
+    bytes_per_path = n_steps * n_assets * 8 * 3
+    return max(1, int(max_chunk_bytes // bytes_per_path))
+
+
+# Function to simulate one chunk of buy-and-hold portfolio value paths (starting at 1)
+# gbm: correlated normal log returns with the estimated drift and covariance (Cholesky factor)
+# bootstrap: whole historical days drawn with replacement, keeping the cross-asset correlation
+# Returns an (n_paths, n_steps) array
+def simulate_chunk(n_paths, n_steps, weights, method, seed, mean=None, chol=None, history=None):
+    rng = np.random.default_rng(seed)
+    n_assets = len(weights)
+    if method == 'gbm':
+        shocks = rng.standard_normal((n_paths, n_steps, n_assets))
+        log_returns = shocks @ chol.T
+        log_returns += mean
+    elif method == 'bootstrap':
+        log_returns = history[rng.integers(0, len(history), size=(n_paths, n_steps))]
+    else:
+        raise ValueError(f"Unknown simulation method '{method}', expected one of {METHODS}")
+    np.cumsum(log_returns, axis=1, out=log_returns)
+    np.exp(log_returns, out=log_returns)
+    return log_returns @ weights
+
+
+# Function run for every chunk (also inside worker processes): simulate, then reduce the paths
+# to per step percentiles and terminal values so only small arrays leave the worker
+def _chunk_summary(task):
+    n_paths, n_steps, weights, method, seed, mean, chol, history, percentiles = task
+    values = simulate_chunk(n_paths, n_steps, weights, method, seed, mean, chol, history)
+    bands = np.percentile(values, percentiles, axis=0)
+    return n_paths, bands, values[:, -1].astype(np.float32)
+
+
+# Running results of a simulation, updated after every chunk
+# Percentile bands are the path-weighted average of the chunk percentiles (exact for one chunk and
+# accurate to a fraction of a percent for chunks of thousands of paths); terminal values are kept
+# exactly as float32, which is 4 MB per million paths
+class SimulationSummary:
+    def __init__(self, n_paths, n_steps, percentiles, initial_value):
+        self.total_paths = n_paths
+        self.n_steps = n_steps
+        self.percentiles = list(percentiles)
+        self.initial_value = initial_value
+        self.completed_paths = 0
+        self._band_sums = np.zeros((len(self.percentiles), n_steps))
+        self._terminal = np.empty(n_paths, dtype=np.float32)
+
+    def add_chunk(self, n_paths, bands, terminal):
+        self._band_sums += bands * n_paths
+        self._terminal[self.completed_paths:self.completed_paths + n_paths] = terminal
+        self.completed_paths += n_paths
+
+    @property
+    def done(self):
+        return self.completed_paths >= self.total_paths
+
+    # Function to get the percentile bands of portfolio value, one column per percentile
+    def bands(self):
+        bands = self._band_sums / max(self.completed_paths, 1) * self.initial_value
+        columns = [f'P{p:g}' for p in self.percentiles]
+        return pd.DataFrame(bands.T, index=pd.RangeIndex(1, self.n_steps + 1, name='Step'), columns=columns)
+
+    # Function to get the simulated terminal portfolio values so far
+    def terminal_values(self):
+        return self._terminal[:self.completed_paths] * self.initial_value
+
+    # Function to summarize the terminal value distribution
+    def statistics(self):
+        terminal = self.terminal_values().astype(float)
+        return {
+            'Paths': self.completed_paths,
+            'Mean': terminal.mean(),
+            'Median': np.median(terminal),
+            'Std': terminal.std(),
+            'P5': np.percentile(terminal, 5),
+            'P95': np.percentile(terminal, 95),
+            'Probability of Loss': (terminal < self.initial_value).mean(),
+        }
+
+
+# Function to run a portfolio Monte Carlo simulation chunk by chunk
+# returns: panel of daily decimal simple returns, one column per asset (e.g. compute_returns output)
+# weights: portfolio weights in column order (default equal weights), normalized to sum to 1
+# seed: makes the run reproducible for a given chunk size, in one process or split across many
+# processes: number of worker processes, None or 1 runs the chunks in this process
+# Yields the updated SimulationSummary after every chunk so a page can draw progress while it runs
+def run_simulation(returns, weights=None, initial_value=1.0, n_paths=10000, n_steps=252, method='gbm',
+                   seed=None, chunk_paths=None, max_chunk_bytes=MAX_CHUNK_BYTES, processes=None,
+                   percentiles=(5, 25, 50, 75, 95)):
+    if method not in METHODS:
+        raise ValueError(f"Unknown simulation method '{method}', expected one of {METHODS}")
+    history = log_return_matrix(returns)
+    if len(history) < 2:
+        raise ValueError("At least two complete rows of returns are needed to simulate")
+    n_assets = history.shape[1]
+    weights = np.full(n_assets, 1 / n_assets) if weights is None else np.asarray(weights, dtype=float)
+    if len(weights) != n_assets:
+        raise ValueError(f"Expected {n_assets} weights, got {len(weights)}")
+    weights = weights / weights.sum()
+
+    mean = chol = None
+    if method == 'gbm':
+        mean, cov = estimate_parameters(history)
+        # Small jitter keeps the Cholesky factorization valid for (nearly) singular covariances
+        chol = np.linalg.cholesky(cov + np.eye(n_assets) * 1e-12)
+        history = None
+
+    chunk_paths = chunk_paths or chunk_size(n_steps, n_assets, max_chunk_bytes)
+    sizes = [min(chunk_paths, n_paths - start) for start in range(0, n_paths, chunk_paths)]
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    tasks = [(size, n_steps, weights, method, child, mean, chol, history, list(percentiles))
+             for size, child in zip(sizes, seeds)]
+
+    summary = SimulationSummary(n_paths, n_steps, percentiles, initial_value)
+    if processes and processes > 1:
+        # Spawned rather than forked: a fork of the multithreaded Streamlit server can inherit held locks and hang
+        with ProcessPoolExecutor(max_workers=processes, mp_context=multiprocessing.get_context('spawn')) as executor:
+            for result in executor.map(_chunk_summary, tasks):
+                summary.add_chunk(*result)
+                yield summary
+    else:
+        for task in tasks:
+            summary.add_chunk(*_chunk_summary(task))
+            yield summary
+
+
+# Function to run a simulation to the end and return the final summary
+def simulate(returns, **kwargs):
+    summary = None
+    for summary in run_simulation(returns, **kwargs):
+        pass
+    return summary
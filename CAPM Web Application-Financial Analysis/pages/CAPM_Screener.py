@@ -0,0 +1,77 @@
+import streamlit as st
+import pandas as pd
+import datetime
+import screener
+import instrumentation
+
+# Set up the page configuration
+st.set_page_config(
+    page_title="CAPM Screener",
+    page_icon="🔎",
+    layout="wide"
+)
+instrumentation.start_page("CAPM Screener")
+
+st.title("🔎 CAPM Screener")
+st.subheader("Screen a whole universe of stocks for beta, alpha, expected return, volatility and Sharpe ratio")
+
+# User input for the universe and the screening period
+col1, col2 = st.columns([1, 1])
+with col1:
+    universe_file = st.file_uploader("Universe file (CSV with a 'Symbol' column, or one ticker per line)",
+                                     type=['csv', 'txt'])
+    universe_text = st.text_area("...or type the tickers (comma-separated)",
+                                 "AAPL, MSFT, AMZN, GOOGL, META, NVDA, TSLA, NFLX, JPM, JNJ, PG, KO, PFE, XOM, MGM")
+with col2:
+    year = st.number_input("Years of history", min_value=1, max_value=10, value=5)
+    benchmark = st.text_input("Benchmark", "^GSPC")
+    rf = st.number_input("Risk-free rate (%)", min_value=0.0, max_value=20.0, value=1.0) / 100
+    batch_size = st.select_slider("Tickers per batch", options=[25, 50, 100, 200], value=screener.BATCH_SIZE)
+
+universe = screener.read_universe(universe_file if universe_file is not None else universe_text)
+st.write(f"**Universe:** {len(universe):,} tickers")
+
+if st.button("Run Screener") and universe:
+    try:
+        end = datetime.date.today()
+        start = datetime.date(end.year - year, end.month, end.day)
+        progress = st.progress(0.0)
+        tables = []
+        for done, table in screener.screen_batches(universe, start, end, benchmark.strip().upper(), rf,
+                                                   batch_size=batch_size):
+            tables.append(table)
+            progress.progress(done / len(universe), text=f"{done:,} of {len(universe):,} tickers screened")
+        # Keep the results so changing the filters below does not screen again
+        st.session_state['screener_results'] = pd.concat(tables, ignore_index=True)
+    except Exception as e:
+        st.error(f"Error screening the universe: {e}")
+
+results = st.session_state.get('screener_results')
+if results is not None:
+    st.markdown("### Results")
+    failed = results['Beta'].isna()
+    if failed.any():
+        st.warning(f"No data for {failed.sum()} tickers: {', '.join(results.loc[failed, 'Stock'][:20])}")
+    results = results[~failed]
+
+    # Filters on the screened metrics
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        beta_low, beta_high = st.slider("Beta range", -1.0, 4.0, (-1.0, 4.0), step=0.1)
+    with col2:
+        min_sharpe = st.number_input("Minimum Sharpe ratio", value=-10.0, step=0.1)
+    with col3:
+        min_r2 = st.slider("Minimum R²", 0.0, 1.0, 0.0, step=0.05)
+    filtered = results[results['Beta'].between(beta_low, beta_high) & (results['Sharpe Ratio'] >= min_sharpe)
+                       & (results['R2'] >= min_r2)]
+
+    sort_by = st.selectbox("Sort by", screener.COLUMNS[1:], index=screener.COLUMNS.index('Sharpe Ratio') - 1)
+    filtered = filtered.sort_values(sort_by, ascending=False)
+    display = filtered.copy()
+    for column in ['Alpha', 'Expected Return', 'Annual Return', 'Volatility']:
+        display[column] = (display[column] * 100).round(2)
+    st.dataframe(display.round(3), use_container_width=True, hide_index=True)
+    st.caption(f"{len(filtered):,} of {len(results):,} stocks match. Alpha, returns and volatility are annualized, in %.")
+    st.download_button("Download CSV", filtered.to_csv(index=False), file_name="capm_screener.csv", mime="text/csv")
+
+instrumentation.performance_panel()
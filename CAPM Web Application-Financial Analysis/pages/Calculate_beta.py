@@ -80,16 +80,19 @@
 import streamlit as st
 import pandas as pd
 import numpy as np
-import pandas_datareader.data as web
-import yfinance as yf
 import datetime
+import alignment
 import capm_functions  # Assuming capm_functions.py contains necessary utility functions
+import market_data
+import result_cache
 import plotly.express as px
+import instrumentation
 
 # Set up the page configuration
 st.set_page_config(page_title="Beta & Alpha Calculator",
                    page_icon="💹",
                    layout="wide")
+instrumentation.start_page("Beta & Alpha Calculator")
 
 # Title and description
 st.title("📊 Stock Beta & Alpha Calculator")
@@ -108,20 +111,18 @@ with col2:
     year = st.number_input('Number of years of historical data', min_value=1, max_value=10, value=5)
     st.write(f"Analyzing {len(stocks_list)} stocks over the last {year} years.")
 
-# Function to fetch stock data and S&P 500 data
+# Function to fetch stock data and S&P 500 data (shared across sessions through the result cache)
+@result_cache.memoize(provider_scoped=True, ttl=market_data.FETCH_TTL)
 def get_stock_data(stocks_list, years):
     # Define the date range
     end = datetime.date.today()
     start = datetime.date(end.year - years, end.month, end.day)
     
-    # Fetch stock data from Yahoo Finance
-    stock_data = pd.DataFrame()
-    for stock in stocks_list:
-        data = yf.download(stock, start=start, end=end)
-        stock_data[stock] = data['Close']
+    # Fetch stock data from Yahoo Finance (all stocks in one batched download)
+    stock_data = market_data.load_price_panel(stocks_list, start, end)['Close']
     
     # Fetch S&P 500 index data
-    SP500 = web.DataReader(['sp500'], 'fred', start, end)
+    SP500 = market_data.load_fred('sp500', start, end)
     SP500.reset_index(inplace=True)
     SP500.columns = ['Date', 'sp500']
     
@@ -132,10 +133,10 @@ if stocks_list:
     try:
         stock_data, SP500 = get_stock_data(stocks_list, year)
 
-        # Merge stock data with SP500 data on the Date column
-        stock_data.reset_index(inplace=True)
-        stock_data['Date'] = pd.to_datetime(stock_data['Date'].apply(lambda x: str(x)[:10]))
-        merged_data = pd.merge(stock_data, SP500, on='Date', how='inner')
+        # Align stock data with SP500 data on their common trading dates
+        merged_data, alignment_report = alignment.align_frames(stock_data, SP500, how='inner')
+        merged_data.reset_index(inplace=True)
+        st.caption(alignment.describe(alignment_report))
 
         # Display merged stock data
         st.markdown("### Merged Stock & S&P 500 Data")
@@ -155,13 +156,10 @@ if stocks_list:
         returns_fig = px.line(daily_returns, x='Date', y=stocks_list, title='Daily Stock Returns')
         st.plotly_chart(returns_fig, use_container_width=True)
 
-        # Calculate beta and alpha values for each selected stock
-        beta = {}
-        alpha = {}
-        for stock in stocks_list:
-            b, a = capm_functions.calculate_beta(daily_returns, stock)
-            beta[stock] = b
-            alpha[stock] = a
+        # Calculate beta and alpha values for all selected stocks in one regression
+        regression = capm_functions.regress_panel(daily_returns, 'sp500', stocks_list)
+        beta = dict(zip(regression['Stock'], regression['Beta']))
+        alpha = dict(zip(regression['Stock'], regression['Alpha']))
 
         # Create a DataFrame for displaying beta and alpha values
         beta_alpha_df = pd.DataFrame({
@@ -179,5 +177,14 @@ if stocks_list:
         beta_fig = px.bar(beta_alpha_df, x='Stock', y='Beta Value', title='Stock Beta Values', color='Beta Value')
         st.plotly_chart(beta_fig, use_container_width=True)
 
+        # Visualize how beta drifts over time with a rolling window
+        st.markdown("### Rolling Beta Over Time")
+        window = st.selectbox("Rolling window (trading days)", [21, 63, 252], index=1)
+        rolling = capm_functions.rolling_regression(daily_returns, 'sp500', window, stocks_list)
+        rolling_fig = px.line(rolling['Beta'], title=f'{window}-Day Rolling Beta vs S&P 500')
+        st.plotly_chart(rolling_fig, use_container_width=True)
+
     except Exception as e:
         st.error(f"Error fetching or processing data: {e}")
+
+instrumentation.performance_panel()
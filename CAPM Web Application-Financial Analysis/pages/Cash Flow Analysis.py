@@ -1,6 +1,8 @@
 import streamlit as st
 import pandas as pd
 import numpy as np
+import table_view
+import instrumentation
 
 # Set up the page title and layout
 st.set_page_config(
@@ -8,6 +10,7 @@ st.set_page_config(
     page_icon="💵",
     layout="wide"
 )
+instrumentation.start_page("Cash Flow Analysis")
 
 st.title("💵 Cash Flow Analysis")
 st.subheader("Analyze your company's cash flows")
@@ -57,7 +60,7 @@ forecast_df = pd.DataFrame({
 })
 
 st.markdown("### Cash Flow Forecasting Results")
-st.dataframe(forecast_df)
+table_view.paged_table(forecast_df, 'cash_flow_forecast')
 
 # Visualization
 st.markdown("### Cash Flow Visualization")
@@ -71,3 +74,5 @@ st.bar_chart(cash_flow_data.set_index('Category'))
 # Forecast Visualization
 st.markdown("### Forecast Visualization")
 st.line_chart(forecast_df.set_index('Year'))
+
+instrumentation.performance_panel()
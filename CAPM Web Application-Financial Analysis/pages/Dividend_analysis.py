@@ -1,7 +1,10 @@
 import streamlit as st
 import pandas as pd
-import yfinance as yf
 import datetime
+import dividend_metrics
+import screener
+import table_view
+import instrumentation
 
 # Set up the page configuration
 st.set_page_config(
@@ -9,62 +12,59 @@ st.set_page_config(
     page_icon="💰",  # Icon representing dividends
     layout="wide"
 )
+instrumentation.start_page("Dividend Analysis")
 
 # Title and description
 st.title("💰 Dividend Analysis")
 st.subheader("Evaluate the Dividend History and Yield of Stocks")
 
 # Getting user input
-stocks_list = st.multiselect(
-    "Choose stocks to analyze dividends:",
-    ('AAPL', 'MSFT', 'TSLA', 'AMZN', 'GOOGL', 'JNJ', 'PG', 'VZ', 'KO', 'PFE'),
-    ['AAPL', 'MSFT']
-)
-
-# Function to fetch dividend history and yield
-def fetch_dividend_data(stock):
-    try:
-        stock_data = yf.Ticker(stock)
-        dividends = stock_data.dividends
-        return dividends
-    except Exception as e:
-        st.error(f"Error fetching data for {stock}: {e}")
-        return None
+col1, col2 = st.columns([2, 1])
+with col1:
+    stocks_list = st.multiselect(
+        "Choose stocks to analyze dividends:",
+        ('AAPL', 'MSFT', 'TSLA', 'AMZN', 'GOOGL', 'JNJ', 'PG', 'VZ', 'KO', 'PFE'),
+        ['AAPL', 'MSFT']
+    )
+    more_stocks = st.text_input("...and more tickers (comma-separated, e.g. a whole dividend universe)", "")
+with col2:
+    year = st.number_input("Years of history", min_value=2, max_value=30, value=10)
 
-# Store dividend data
-dividend_data = {}
+tickers = list(dict.fromkeys(stocks_list + screener.read_universe(more_stocks)))
 
-for stock in stocks_list:
-    dividends = fetch_dividend_data(stock)
-    if dividends is not None:
-        dividend_data[stock] = dividends
+if tickers:
+    try:
+        end = datetime.date.today()
+        start = datetime.date(end.year - year, end.month, end.day)
+        # Dividends and prices of every ticker come from one batched download
+        dividends, close = dividend_metrics.load_dividends(tickers, start, end)
+        summary = dividend_metrics.dividend_table(dividends, close)
 
-# Create a DataFrame to display
-if dividend_data:
-    dividend_df = pd.DataFrame.from_dict(dividend_data, orient='index').transpose()
-    
-    # Calculate dividend yield
-    for stock in stocks_list:
-        if stock in dividend_data:
-            latest_dividend = dividend_data[stock].iloc[-1] if not dividend_data[stock].empty else 0
-            current_price = yf.Ticker(stock).info['currentPrice']
-            dividend_yield = (latest_dividend / current_price) * 100 if current_price > 0 else 0
-            dividend_df[f"{stock} Yield (%)"] = dividend_yield
-            
-    # Display dividend data
-    st.markdown("### Dividend History")
-    st.dataframe(dividend_df, use_container_width=True)
+        # Display the dividend metrics
+        st.markdown("### Summary of Dividends and Yield")
+        display = summary.copy()
+        for column in ['TTM Yield', 'Dividend CAGR']:
+            display[column] = (display[column] * 100).round(2)
+        display['Last Ex-Date'] = display['Last Ex-Date'].dt.date
+        table_view.paged_table(display.round(4), 'dividend_summary')
+        st.caption("TTM: trailing twelve months. TTM Yield and Dividend CAGR in %. CAGR and streaks use the "
+                   f"complete calendar years of the history ({summary['Years'].iloc[0]} years).")
 
-    # Plotting dividend history for visualization
-    if dividend_df.notnull().any().any():
-        st.markdown("### Dividend History Plot")
-        st.line_chart(dividend_df)
+        # Plotting the dividends paid per year for visualization
+        annual = dividend_metrics.annual_dividends(dividends, close)
+        paying = [t for t in tickers if (annual[t] > 0).any()][:10]
+        if paying:
+            st.markdown("### Dividends per Year")
+            annual.index = annual.index.year
+            st.line_chart(annual[paying])
 
-    # Displaying additional information
-    st.markdown("### Summary of Dividends and Yield")
-    for stock in stocks_list:
-        if stock in dividend_data:
-            st.markdown(f"**{stock}**: Latest Dividend: ${latest_dividend:.2f}, Yield: {dividend_yield:.2f}%")
+        # Display dividend data
+        st.markdown("### Dividend History")
+        table_view.paged_table(dividend_metrics.dividend_history(dividends), 'dividend_history')
+    except Exception as e:
+        st.error(f"Error fetching dividend data: {e}")
 
 else:
     st.warning("Please select stocks to analyze dividends.")
+
+instrumentation.performance_panel()
@@ -1,62 +1,62 @@
 import streamlit as st
 import pandas as pd
-import pandas_datareader.data as web
-import matplotlib.pyplot as plt
+import market_data
+import capm_functions
+import economic_indicators
+import table_view
+import instrumentation
 
 st.set_page_config(
     page_title="Economic Indicators Dashboard",
     page_icon="📊",  # Icon for economic indicators
     layout="wide"
 )
+instrumentation.start_page("Economic Indicators Dashboard")
 
 st.title("📊 Economic Indicators Dashboard")
 st.subheader("Track and Analyze Key Economic Indicators Affecting Financial Markets")
 
-# Define a list of economic indicators
-indicators = {
-    'GDP': 'Gross Domestic Product',
-    'CPI': 'Consumer Price Index',
-    'Unemployment Rate': 'Unemployment Rate',
-    'Interest Rates': 'Federal Funds Rate',
-    'PPI': 'Producer Price Index'
-}
-
-# User selects indicators to analyze
-selected_indicators = st.multiselect("Choose Economic Indicators to Analyze", options=list(indicators.keys()), default=['GDP', 'CPI'])
+# User selects indicators to analyze (see economic_indicators.INDICATORS for the FRED series behind them)
+selected_indicators = st.multiselect("Choose Economic Indicators to Analyze",
+                                     options=list(economic_indicators.INDICATORS.keys()), default=['GDP', 'CPI'])
 
 # Date range for data retrieval
 start_date = st.date_input("Start Date", pd.to_datetime("2020-01-01"))
 end_date = st.date_input("End Date", pd.to_datetime("today"))
-
-# Initialize an empty DataFrame for indicators
-indicator_data = pd.DataFrame()
-
-# Download and display selected indicators
-for indicator in selected_indicators:
-    if indicator == 'GDP':
-        data = web.DataReader('GDP', 'fred', start_date, end_date)
-    elif indicator == 'CPI':
-        data = web.DataReader('CPIAUCNS', 'fred', start_date, end_date)  # Consumer Price Index
-    elif indicator == 'Unemployment Rate':
-        data = web.DataReader('UNRATE', 'fred', start_date, end_date)
-    elif indicator == 'Interest Rates':
-        data = web.DataReader('FEDFUNDS', 'fred', start_date, end_date)
-    elif indicator == 'PPI':
-        data = web.DataReader('PPIACO', 'fred', start_date, end_date)  # Producer Price Index
-    
-    # Rename columns for clarity
-    data.rename(columns={data.columns[0]: indicators[indicator]}, inplace=True)
-    indicator_data = pd.concat([indicator_data, data], axis=1)
-
-# Plotting the data
-if not indicator_data.empty:
-    st.line_chart(indicator_data)
-    st.markdown("### Indicator Data")
-    st.dataframe(indicator_data)
-
-    # Optional: Show summary statistics
-    st.markdown("### Summary Statistics")
-    st.write(indicator_data.describe())
-else:
-    st.write("Please select valid economic indicators and dates.")
-
+frequency = st.selectbox("Frequency", list(economic_indicators.FREQUENCIES),
+                         help="Quarterly GDP is held until its next release in a monthly panel, monthly series are "
+                              "averaged (rates) or take the last value (price indexes) in coarser panels")
+
+try:
+    # All selected series are fetched concurrently and resampled to one compact panel
+    indicator_data = (economic_indicators.indicator_panel(selected_indicators, start_date, end_date, frequency)
+                      if selected_indicators else pd.DataFrame())
+
+    # Plotting the data
+    if not indicator_data.empty:
+        st.line_chart(indicator_data)
+        st.markdown("### Indicator Data")
+        table_view.paged_table(indicator_data, 'indicator_data')
+
+        # Optional: Show summary statistics
+        st.markdown("### Summary Statistics")
+        st.write(indicator_data.describe())
+
+        # Sensitivity of stock returns to indicator releases
+        st.markdown("### Stock Sensitivity to Indicator Releases")
+        stocks_list = st.multiselect("Choose stocks", ('AAPL', 'MSFT', 'AMZN', 'GOOGL', 'TSLA', 'JPM', 'XOM', 'KO'),
+                                     ['AAPL', 'MSFT'])
+        if stocks_list:
+            prices = market_data.load_price_panel(stocks_list, start_date, end_date, fields=['Close'])['Close']
+            returns = capm_functions.compute_returns(prices, kind='simple')
+            betas = economic_indicators.macro_betas(returns, indicator_data, frequency)
+            st.dataframe(betas[['Stock', 'Benchmark', 'Beta', 'R2', 'Observations']].rename(
+                columns={'Benchmark': 'Indicator'}).round(4), use_container_width=True, hide_index=True)
+            st.caption("Daily returns regressed on the relative change of each indicator on the days a new value "
+                       "becomes known (one period after the period it describes).")
+    else:
+        st.write("Please select valid economic indicators and dates.")
+except Exception as e:
+    st.error(f"Error loading economic indicators: {e}")
+
+instrumentation.performance_panel()
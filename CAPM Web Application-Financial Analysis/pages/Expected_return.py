@@ -128,10 +128,11 @@
 
 import streamlit as st
 import pandas as pd
-import pandas_datareader.data as web
-import yfinance as yf
 import datetime
+import alignment
 import capm_functions  # Ensure you have the necessary functions in capm_functions.py
+import market_data
+import instrumentation
 
 # Configure the Streamlit page
 st.set_page_config(
@@ -139,6 +140,7 @@ st.set_page_config(
     page_icon="💹",  # Icon related to stock market
     layout="wide"
 )
+instrumentation.start_page("Stock Expected Return Calculator")
 
 # Title and description
 st.title("📊 Stock Expected Return Calculator")
@@ -168,25 +170,17 @@ start = datetime.date(end.year - year, end.month, end.day)
 try:
     # Fetching S&P 500 data as a market benchmark for CAPM calculations
     with st.spinner('Fetching S&P 500 data...'):
-        SP500 = web.DataReader('sp500', 'fred', start, end)
+        SP500 = market_data.load_fred('sp500', start, end)
 
-    # Initialize an empty DataFrame to store stock prices
-    stocks_df = pd.DataFrame()
-
-    # Download stock data for each selected stock from Yahoo Finance
+    # Download stock data for all selected stocks from Yahoo Finance in one batch
     with st.spinner('Fetching stock data...'):
-        for stock in stocks_list:
-            stock_data = yf.download(stock, start=start, end=end)
-            stocks_df[stock] = stock_data['Close']
+        stocks_df = market_data.load_price_panel(stocks_list, start, end)['Close']
 
-    # Reset the index and prepare to merge with S&P 500 data
+    # Align stock prices with the S&P 500 on their common trading dates
+    SP500.columns = ['sp500']
+    stocks_df, alignment_report = alignment.align_frames(stocks_df, SP500, how='inner')
     stocks_df.reset_index(inplace=True)
     SP500.reset_index(inplace=True)
-    SP500.columns = ['Date', 'sp500']
-
-    # Ensure the date columns are in datetime format for merging
-    stocks_df['Date'] = pd.to_datetime(stocks_df['Date'])
-    stocks_df = pd.merge(stocks_df, SP500, on='Date', how='inner')
 
     # Display the data
     col1, col2 = st.columns([1, 1])
@@ -200,16 +194,11 @@ try:
     # Call a function to compute daily returns for stocks and S&P 500
     stocks_daily_return = capm_functions.daily_returns(stocks_df)
 
-    # Dictionary to store calculated Beta and Alpha values for each stock
-    beta = {}
-    alpha = {}
-
-    # Loop through each selected stock to calculate Beta and Alpha using CAPM functions
+    # Calculate Beta and Alpha for all selected stocks in one regression against the S&P 500
     with st.spinner('Calculating Beta and Alpha for selected stocks...'):
-        for stock in stocks_list:
-            b, a = capm_functions.calculate_beta(stocks_daily_return, stock)
-            beta[stock] = b
-            alpha[stock] = a
+        regression = capm_functions.regress_panel(stocks_daily_return, 'sp500', stocks_list)
+        beta = dict(zip(regression['Stock'], regression['Beta']))
+        alpha = dict(zip(regression['Stock'], regression['Alpha']))
 
     # Display Beta values in a DataFrame
     beta_df = pd.DataFrame(list(beta.items()), columns=['Stock', 'Beta'])
@@ -254,3 +243,5 @@ except Exception as e:
     # Handle any errors that occur during data fetching or processing
     st.error(f"An error occurred: {e}")
     st.write("Please check your inputs and try again.")
+
+instrumentation.performance_panel()
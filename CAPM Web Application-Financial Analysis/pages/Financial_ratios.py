@@ -1,6 +1,9 @@
 import streamlit as st
 import pandas as pd
-import yfinance as yf
+import fundamentals
+import screener
+import table_view
+import instrumentation
 
 # Set up the page configuration
 st.set_page_config(
@@ -8,69 +11,50 @@ st.set_page_config(
     page_icon="💰",
     layout="wide"
 )
+instrumentation.start_page("Financial Ratios Dashboard")
 # st.error("🚨 This web page is under maintenance")
 st.title("💰 Financial Ratios Analysis")
 
 # User input for stock selection
-stock_symbol = st.text_input("Enter Stock Symbol (e.g., AAPL, TSLA, GOOGL):", "AAPL").upper()
+stock_symbols = st.text_input("Enter Stock Symbols, comma-separated (e.g., AAPL, MSFT, GOOGL for a sector):",
+                              "AAPL, MSFT, GOOGL")
+tickers = screener.read_universe(stock_symbols)
 
 # Button to fetch data
-if st.button("Get Financial Ratios"):
-    # Fetch stock data from Yahoo Finance
+if st.button("Get Financial Ratios") and tickers:
+    # Fetch the statements of every ticker (from the local statement cache when no new period is due)
     try:
-        stock = yf.Ticker(stock_symbol)
-
-        # Fetch relevant financial data
-        financials = stock.financials
-        balance_sheet = stock.balance_sheet
-        info = stock.info  # Use info instead of key_metrics
-
-        # Calculate key financial ratios
-        try:
-            # P/E Ratio
-            pe_ratio = info.get('trailingPE', None)
-
-            # Debt-to-Equity Ratio
-            total_debt = balance_sheet.loc['Total Debt'][0] if 'Total Debt' in balance_sheet.index else 0
-            total_equity = balance_sheet.loc['Total Stockholder Equity'][0] if 'Total Stockholder Equity' in balance_sheet.index else 1  # Avoid division by zero
-            debt_to_equity = total_debt / total_equity
-
-            # Return on Equity (ROE)
-            net_income = financials.loc['Net Income'][0] if 'Net Income' in financials.index else 0
-            roe = net_income / total_equity
-
-            # Current Ratio
-            current_assets = balance_sheet.loc['Total Current Assets'][0] if 'Total Current Assets' in balance_sheet.index else 1  # Avoid division by zero
-            current_liabilities = balance_sheet.loc['Total Current Liabilities'][0] if 'Total Current Liabilities' in balance_sheet.index else 1
-            current_ratio = current_assets / current_liabilities
-
-            # Return on Assets (ROA)
-            total_assets = balance_sheet.loc['Total Assets'][0] if 'Total Assets' in balance_sheet.index else 1
-            roa = net_income / total_assets
+        statements = fundamentals.load_statements(tickers)
+        if statements.empty:
+            st.error(f"No financial statements found for {', '.join(tickers)}")
+        else:
+            # Keep the ratios so switching the chart below does not fetch again
+            st.session_state['financial_ratios'] = fundamentals.ratio_table(statements)
+    except Exception as e:
+        st.error(f"Error fetching data for {', '.join(tickers)}: {e}")
 
-            # Create a DataFrame for displaying results
-            ratios_data = {
-                "Ratio": ["P/E Ratio", "Debt-to-Equity Ratio", "Return on Equity (ROE)", "Current Ratio", "Return on Assets (ROA)"],
-                "Value": [
-                    pe_ratio,
-                    debt_to_equity,
-                    roe,
-                    current_ratio,
-                    roa
-                ]
-            }
-            ratios_df = pd.DataFrame(ratios_data)
+ratios_df = st.session_state.get('financial_ratios')
+if ratios_df is not None:
+    try:
+        # Display the latest fiscal period of every ticker
+        latest = ratios_df.sort_values('Period').groupby('Ticker', sort=False).tail(1).set_index('Ticker')
+        st.write("### Key Financial Ratios (latest fiscal year)")
+        st.dataframe(latest.round(dict.fromkeys(fundamentals.RATIOS, 2)), use_container_width=True)
+        missing = [t for t in tickers if t not in set(ratios_df['Ticker'])]
+        if missing:
+            st.warning(f"No financial statements for {', '.join(missing)}")
 
-            # Display financial ratios
-            st.subheader(f"Financial Ratios for {stock_symbol}")
-            st.write("### Key Financial Ratios")
-            st.dataframe(ratios_df, use_container_width=True)
+        # Ratio trend across the fiscal periods
+        st.write("### Ratio Trends")
+        ratio = st.selectbox("Ratio", fundamentals.RATIOS)
+        st.line_chart(ratios_df.pivot(index='Period', columns='Ticker', values=ratio))
 
-        except Exception as ratio_error:
-            st.error(f"Error calculating financial ratios: {ratio_error}")
-
-    except Exception as e:
-        st.error(f"Error fetching data for {stock_symbol}: {e}")
+        st.write("### All Fiscal Periods")
+        table_view.paged_table(ratios_df.round(dict.fromkeys(fundamentals.RATIOS, 4)), 'financial_ratios')
+        st.caption("Ratios are empty when a line item is missing from the statements or its denominator is zero. "
+                   "P/E uses the closing price at the fiscal period end and the diluted EPS of the period.")
+    except Exception as ratio_error:
+        st.error(f"Error calculating financial ratios: {ratio_error}")
 
 # Additional information and explanation
 st.markdown(""" 
@@ -81,3 +65,5 @@ st.markdown("""
 - **Current Ratio**: Indicates a company's ability to pay short-term obligations. A ratio above 1 means the company can cover its short-term liabilities.
 - **Return on Assets (ROA)**: Indicates how efficient management is at using its assets to generate earnings. A higher ROA indicates better asset efficiency.
 """)
+
+instrumentation.performance_panel()
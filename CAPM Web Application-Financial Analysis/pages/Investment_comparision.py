@@ -1,6 +1,10 @@
 import streamlit as st
 import pandas as pd
-import yfinance as yf
+import datetime
+import capm_functions
+import screener
+import total_return
+import instrumentation
 
 # Page Configuration
 st.set_page_config(
@@ -8,55 +12,62 @@ st.set_page_config(
     page_icon="💰",
     layout="wide"
 )
+instrumentation.start_page("Investment Comparison")
 
 st.title("Investment Comparison Dashboard")
 st.subheader("Compare Different Investment Options Side-by-Side")
 
 # Getting user input for stocks
-investment_options = st.multiselect(
-    "Select Investment Options:",
-    options=['AAPL', 'AMZN', 'GOOGL', 'TSLA', 'MSFT', 'NFLX'],
-    default=['AAPL', 'AMZN']
-)
+col1, col2 = st.columns([2, 1])
+with col1:
+    investment_options = st.multiselect(
+        "Select Investment Options:",
+        options=['AAPL', 'AMZN', 'GOOGL', 'TSLA', 'MSFT', 'NFLX', 'SPY', 'QQQ', 'VTI', 'SCHD'],
+        default=['AAPL', 'AMZN']
+    )
+    more_options = st.text_input("...and more tickers (comma-separated funds or stocks)", "")
+with col2:
+    year = st.number_input("Years of history", min_value=1, max_value=30, value=1)
+    investment = st.number_input("Initial investment ($)", min_value=1.0, value=1000.0, step=100.0)
 
-# Define a function to get stock data
-def get_stock_data(tickers):
-    stock_data = {}
-    for ticker in tickers:
-        data = yf.download(ticker, period="1y")  # Get 1 year of data
-        dividends = data['Dividends'].sum() if 'Dividends' in data.columns else 0  # Check for dividends
-        stock_data[ticker] = {
-            'Close': data['Close'],
-            'Dividend': dividends  # Total dividends over the period
-        }
-    return stock_data
+tickers = list(dict.fromkeys(investment_options + screener.read_universe(more_options)))
 
 # Display the selected investment options
-if investment_options:
-    stock_data = get_stock_data(investment_options)
-
-    # Create a DataFrame for comparison
-    comparison_df = pd.DataFrame({
-        'Investment Option': investment_options,
-        'Total Dividends': [stock_data[ticker]['Dividend'] for ticker in investment_options],
-        'Latest Price': [stock_data[ticker]['Close'].iloc[-1] for ticker in investment_options],
-    })
-
-    # Calculate ROI (Return on Investment) assuming an investment of $1000
-    comparison_df['ROI (%)'] = (comparison_df['Total Dividends'] / 1000) * 100  # as percentage
+if tickers:
+    try:
+        end = datetime.date.today()
+        start = datetime.date(end.year - year, end.month, end.day)
+        # Prices and dividends of every option come from one batched download
+        close, dividends = total_return.load_prices(tickers, start, end)
+        comparison_df = total_return.compare(close, dividends, investment)
 
-    # Display the comparison DataFrame
-    st.markdown("### Investment Comparison Table")
-    st.dataframe(comparison_df)
+        # Display the comparison DataFrame
+        st.markdown("### Investment Comparison Table")
+        display = comparison_df.copy()
+        for column in ['Total Return', 'Price Return', 'Dividend Return', 'CAGR', 'Volatility', 'Max Drawdown',
+                       'Current Drawdown']:
+            display[column] = (display[column] * 100).round(2)
+        display['Start'] = display['Start'].dt.date
+        display['End'] = display['End'].dt.date
+        st.dataframe(display.round(2), use_container_width=True, hide_index=True)
+        st.caption("Returns, CAGR, volatility (annualized) and drawdowns in %. Total return reinvests every "
+                   "dividend at the close of its ex-date; Dividend Return is the part of it coming from dividends.")
 
-    # Plotting investment performance
-    st.markdown("### Price Performance Over the Last Year")
-    
-    # Create a combined DataFrame for line chart
-    combined_df = pd.DataFrame({ticker: stock_data[ticker]['Close'] for ticker in investment_options})
-
-    # Display line chart
-    st.line_chart(combined_df, use_container_width=True)
+        # Plotting investment performance (downsampled by interactive_plot for long histories)
+        growth = total_return.total_return_index(close, dividends, base=investment)
+        col1, col2 = st.columns([1, 1])
+        with col1:
+            st.markdown(f"### Growth of ${investment:,.0f} (Dividends Reinvested)")
+            figure = capm_functions.interactive_plot(growth.reset_index())
+            figure.update_layout(title='Total Return')
+            st.plotly_chart(figure, use_container_width=True)
+        with col2:
+            st.markdown("### Drawdown")
+            figure = capm_functions.interactive_plot((total_return.drawdowns(growth) * 100).reset_index())
+            figure.update_layout(title='Drawdown (%)')
+            st.plotly_chart(figure, use_container_width=True)
+    except Exception as e:
+        st.error(f"Error comparing the investment options: {e}")
 
 else:
     st.warning("Please select at least one investment option to compare.")
@@ -65,6 +76,9 @@ else:
 st.markdown("---")
 st.markdown("### Insights:")
 st.markdown(
-    "This dashboard allows you to compare different stocks based on their dividends and price performance over the last year. "
-    "You can select multiple stocks to view their comparative performance."
+    "This dashboard allows you to compare stocks and funds by total return with dividends reinvested, "
+    "growth rate, volatility and drawdowns over the chosen period. "
+    "You can select multiple options to view their comparative performance."
 )
+
+instrumentation.performance_panel()
@@ -0,0 +1,106 @@
+import streamlit as st
+import pandas as pd
+import numpy as np
+import datetime
+import time
+import plotly.express as px
+import plotly.graph_objects as go
+import capm_functions
+import market_data
+import monte_carlo
+import instrumentation
+
+# Set up the page configuration
+st.set_page_config(
+    page_title="Monte Carlo Simulation",
+    page_icon="🎲",
+    layout="wide"
+)
+instrumentation.start_page("Monte Carlo Simulation")
+
+st.title("🎲 Monte Carlo Portfolio Simulation")
+st.subheader("Simulate thousands of possible futures of a portfolio from its historical returns")
+
+# User input for the portfolio and the simulation
+col1, col2 = st.columns([1, 1])
+with col1:
+    stocks_list = st.multiselect("Select portfolio stocks",
+                                 ['TSLA', 'AAPL', 'NFLX', 'MSFT', 'MGM', 'AMZN', 'NVDA', 'GOOGL'],
+                                 ['TSLA', 'AAPL', 'AMZN', 'GOOGL'])
+    weights_text = st.text_input("Portfolio weights (comma-separated, same order as the stocks, blank for equal weights)", "")
+    year = st.number_input("Years of history used for estimation", min_value=1, max_value=10, value=5)
+    initial_investment = st.number_input("Initial Investment ($)", value=10000, min_value=0)
+with col2:
+    method = st.selectbox("Simulation method", monte_carlo.METHODS,
+                          format_func=lambda m: {'gbm': 'Correlated GBM', 'bootstrap': 'Bootstrapped historical days'}[m])
+    n_paths = st.select_slider("Number of paths", options=[1000, 10000, 100000, 1000000], value=10000)
+    horizon = st.number_input("Horizon (trading days)", min_value=1, max_value=2520, value=252)
+    seed = st.number_input("Random seed", min_value=0, value=42)
+    processes = st.number_input("Worker processes", min_value=1, max_value=16, value=1)
+
+
+# Function to draw percentile bands of the portfolio value
+def band_figure(bands):
+    fig = go.Figure()
+    fig.add_scatter(x=bands.index, y=bands['P95'], line=dict(width=0), showlegend=False, hoverinfo='skip')
+    fig.add_scatter(x=bands.index, y=bands['P5'], fill='tonexty', line=dict(width=0), name='5th-95th percentile')
+    fig.add_scatter(x=bands.index, y=bands['P75'], line=dict(width=0), showlegend=False, hoverinfo='skip')
+    fig.add_scatter(x=bands.index, y=bands['P25'], fill='tonexty', line=dict(width=0), name='25th-75th percentile')
+    fig.add_scatter(x=bands.index, y=bands['P50'], name='Median', line=dict(color='black'))
+    fig.update_layout(title='Simulated Portfolio Value', xaxis_title='Trading day', yaxis_title='Value ($)')
+    return fig
+
+
+if not stocks_list:
+    st.warning("Please select at least one stock.")
+elif st.button("Run Simulation"):
+    try:
+        weights = [float(w) for w in weights_text.split(',')] if weights_text.strip() else None
+
+        end = datetime.date.today()
+        start = datetime.date(end.year - year, end.month, end.day)
+        with st.spinner('Fetching stock data...'):
+            prices = market_data.load_price_panel(stocks_list, start, end)['Close']
+        returns = capm_functions.compute_returns(prices, kind='simple')
+
+        progress = st.progress(0.0)
+        chart = st.empty()
+        last_draw = 0.0
+        summary = None
+        for summary in monte_carlo.run_simulation(returns, weights=weights, initial_value=initial_investment,
+                                                  n_paths=n_paths, n_steps=horizon, method=method,
+                                                  seed=seed, processes=processes):
+            progress.progress(summary.completed_paths / summary.total_paths,
+                              text=f"{summary.completed_paths:,} of {summary.total_paths:,} paths")
+            # Redraw at most twice a second while chunks stream in
+            if summary.done or time.monotonic() - last_draw > 0.5:
+                chart.plotly_chart(band_figure(summary.bands()), use_container_width=True)
+                last_draw = time.monotonic()
+
+        col1, col2 = st.columns([1, 2])
+        with col1:
+            st.markdown("### Terminal Value Statistics")
+            stats = summary.statistics()
+            stats_df = pd.DataFrame({'Statistic': stats.keys(), 'Value': [round(float(v), 4) for v in stats.values()]})
+            st.dataframe(stats_df, use_container_width=True)
+        with col2:
+            st.markdown("### Terminal Value Distribution")
+            terminal = summary.terminal_values()
+            # Plot a random sample of at most 100,000 paths to keep the chart light
+            if len(terminal) > 100000:
+                terminal = np.random.default_rng(seed).choice(terminal, 100000, replace=False)
+            hist_fig = px.histogram(x=terminal, nbins=100, labels={'x': 'Portfolio value ($)'})
+            hist_fig.add_vline(x=initial_investment, line_dash='dash')
+            st.plotly_chart(hist_fig, use_container_width=True)
+
+    except Exception as e:
+        st.error(f"Error running the simulation: {e}")
+
+st.markdown("""
+### How it works
+- **Correlated GBM** draws daily log returns from a multivariate normal distribution with the mean and covariance estimated from the stocks' history.
+- **Bootstrapped historical days** replays randomly chosen historical days, keeping fat tails and the correlation between stocks.
+- Paths are simulated in memory-bounded chunks, so even a million paths only keep their percentile bands and final values.
+""")
+
+instrumentation.performance_panel()
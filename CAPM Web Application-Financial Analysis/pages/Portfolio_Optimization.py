@@ -0,0 +1,109 @@
+import streamlit as st
+import pandas as pd
+import numpy as np
+import datetime
+import plotly.express as px
+import plotly.graph_objects as go
+import capm_functions
+import market_data
+import portfolio_optimizer
+import instrumentation
+
+# Set up the page configuration
+st.set_page_config(
+    page_title="Portfolio Optimization",
+    page_icon="🧮",
+    layout="wide"
+)
+instrumentation.start_page("Portfolio Optimization")
+
+st.title("🧮 Portfolio Optimization")
+st.subheader("Build minimum-variance and maximum-Sharpe portfolios and trace the efficient frontier")
+
+# User input for the universe and the constraints
+col1, col2 = st.columns([1, 1])
+with col1:
+    stocks_list = st.multiselect("Select stocks for the portfolio",
+                                 ['TSLA', 'AAPL', 'NFLX', 'MSFT', 'MGM', 'AMZN', 'NVDA', 'GOOGL', 'JNJ', 'PG', 'KO', 'PFE'],
+                                 ['TSLA', 'AAPL', 'AMZN', 'GOOGL', 'MSFT', 'NVDA'])
+    year = st.number_input("Years of history", min_value=1, max_value=10, value=5)
+    return_source = st.radio("Expected returns", ['CAPM', 'Historical'], horizontal=True)
+    rf = st.number_input("Risk-free rate (%)", min_value=0.0, max_value=20.0, value=1.0) / 100
+with col2:
+    max_weight = st.slider("Maximum weight per stock (%)", min_value=5, max_value=100, value=40) / 100
+    sector_text = st.text_area("Sectors (optional, one 'TICKER: Sector' per line)",
+                               "AAPL: Tech\nMSFT: Tech\nNVDA: Tech\nGOOGL: Tech")
+    sector_cap = st.slider("Maximum weight per sector (%)", min_value=5, max_value=100, value=60) / 100
+    n_points = st.slider("Frontier points", min_value=10, max_value=200, value=100)
+
+# Parse the sector assignments
+sectors = {}
+for line in sector_text.splitlines():
+    if ':' in line:
+        ticker, sector = line.split(':', 1)
+        sectors[ticker.strip().upper()] = sector.strip()
+sector_caps = {sector: sector_cap for sector in set(sectors.values())} if sector_cap < 1 else None
+
+if len(stocks_list) < 2:
+    st.warning("Please select at least two stocks.")
+else:
+    try:
+        end = datetime.date.today()
+        start = datetime.date(end.year - year, end.month, end.day)
+        with st.spinner('Fetching stock data...'):
+            prices = market_data.load_price_panel(stocks_list + ['^GSPC'], start, end)['Close']
+        returns = capm_functions.compute_returns(prices, kind='simple').iloc[1:]
+
+        # Expected returns (annualized) and covariance of the stocks
+        historical_mu, cov = portfolio_optimizer.historical_inputs(returns[stocks_list])
+        if return_source == 'CAPM':
+            regression = capm_functions.regress_panel(returns, '^GSPC', stocks_list)
+            betas = pd.Series(regression['Beta'].to_numpy(), index=regression['Stock'])
+            market_return = returns['^GSPC'].mean() * 252
+            mu = portfolio_optimizer.capm_expected_returns(betas, rf, market_return)
+        else:
+            mu = historical_mu
+
+        constraints = dict(max_weight=max_weight, sectors=sectors, sector_caps=sector_caps)
+        min_var = portfolio_optimizer.min_variance(mu, cov, rf, **constraints)
+        frontier, frontier_weights = portfolio_optimizer.efficient_frontier(mu, cov, rf, n_points, **constraints)
+        # The tangency search starts from the frontier the chart shows instead of tracing its own
+        best = portfolio_optimizer.max_sharpe(mu, cov, rf, **constraints, frontier=(frontier, frontier_weights))
+
+        # Efficient frontier chart
+        st.markdown("### Efficient Frontier")
+        fig = go.Figure()
+        fig.add_scatter(x=frontier['Volatility'], y=frontier['Return'], mode='lines+markers', name='Efficient frontier',
+                        marker=dict(size=4, color=frontier['Sharpe'], colorscale='Viridis', showscale=True,
+                                    colorbar=dict(title='Sharpe')))
+        fig.add_scatter(x=np.sqrt(np.diag(cov)), y=mu[cov.columns], mode='markers+text', text=list(cov.columns),
+                        textposition='top center', name='Stocks')
+        fig.add_scatter(x=[min_var['volatility']], y=[min_var['return']], mode='markers', name='Minimum variance',
+                        marker=dict(size=14, symbol='diamond'))
+        fig.add_scatter(x=[best['volatility']], y=[best['return']], mode='markers', name='Maximum Sharpe',
+                        marker=dict(size=14, symbol='star'))
+        fig.update_layout(xaxis_title='Annualized volatility', yaxis_title='Expected annual return')
+        st.plotly_chart(fig, use_container_width=True)
+
+        # Optimal portfolio weights
+        col1, col2 = st.columns([1, 1])
+        for column, title, portfolio in ((col1, 'Minimum Variance Portfolio', min_var),
+                                         (col2, 'Maximum Sharpe Portfolio', best)):
+            with column:
+                st.markdown(f"### {title}")
+                st.write(f"**Expected Return:** {portfolio['return'] * 100:.2f}%, "
+                         f"**Volatility:** {portfolio['volatility'] * 100:.2f}%, "
+                         f"**Sharpe Ratio:** {portfolio['sharpe']:.2f}")
+                weights_df = portfolio['weights'].rename('Weight').rename_axis('Stock').reset_index()
+                st.plotly_chart(px.bar(weights_df, x='Stock', y='Weight'), use_container_width=True)
+
+        # Weights along the frontier
+        st.markdown("### Weights Along the Frontier")
+        area_df = frontier_weights.assign(Volatility=frontier['Volatility']).melt(
+            id_vars='Volatility', var_name='Stock', value_name='Weight')
+        st.plotly_chart(px.area(area_df, x='Volatility', y='Weight', color='Stock'), use_container_width=True)
+
+    except Exception as e:
+        st.error(f"Error optimizing the portfolio: {e}")
+
+instrumentation.performance_panel()
@@ -1,14 +1,19 @@
 import streamlit as st
 import pandas as pd
 import numpy as np
-import yfinance as yf
 import datetime
 import capm_functions  # Ensure you have this module for your calculations
+import market_data
+import risk_metrics
+import covariance
+import plotly.express as px
+import instrumentation
 
 # Set page configurations
 st.set_page_config(page_title="Comprehensive Risk Analysis",
                    page_icon="⚖️",
                    layout="wide")
+instrumentation.start_page("Comprehensive Risk Analysis")
 
 # Page title and subtitle
 st.warning("⚠️ This web page is under maintenance")
@@ -35,13 +40,9 @@ stocks_df = pd.DataFrame()
 
 # Try downloading stock price data for selected stocks using yfinance
 try:
-    for stock in stocks_list:
-        stock_data = yf.download(stock, start=start_date, end=end_date)
-        stocks_df[f'{stock}'] = stock_data['Close']
-
-    # Download data for SP500 using yfinance
-    sp500_data = yf.download('^GSPC', start=start_date, end=end_date)
-    stocks_df['SP500'] = sp500_data['Close']
+    # Download the selected stocks and SP500 (^GSPC) in one batched request
+    panel = market_data.load_price_panel(stocks_list + ['^GSPC'], start_date, end_date)
+    stocks_df = panel['Close'].rename(columns={'^GSPC': 'SP500'})
 
     # Reset index to ensure 'Date' is included
     stocks_df.reset_index(inplace=True)
@@ -62,33 +63,37 @@ if not stocks_df.empty:
             # Containers for risk metrics
             beta = {}
             volatility = {}
-            VaR = {}
             sharpe_ratios = {}
             correlation_with_market = {}
             risk_free_rate = 0.01  # Assuming 1% annual risk-free rate for Sharpe Ratio
 
-            # Calculating Beta, Volatility, VaR, and Sharpe Ratio
-            for stock in stocks_list:
-                try:
-                    # 1. Beta Calculation
-                    b, _ = capm_functions.calculate_beta(stocks_daily_return, stock)
-                    beta[stock] = b
+            # 1. Beta Calculation (all stocks in one regression against SP500)
+            regression = capm_functions.regress_panel(stocks_daily_return, 'SP500', stocks_list)
+            beta.update(zip(regression['Stock'], regression['Beta']))
 
-                    # 2. Volatility (Standard Deviation)
-                    volatility[stock] = np.std(stocks_daily_return[stock]) * np.sqrt(252)  # Annualized volatility
+            # 3. Value at Risk (VaR) and Expected Shortfall (CVaR) for every stock and an equal-weight
+            # portfolio, all methods, confidence levels and horizons at once (decimal returns)
+            decimal_returns = capm_functions.compute_returns(stocks_df, kind='simple')
+            risk_table = risk_metrics.value_at_risk(decimal_returns[stocks_list], confidence=(0.95, 0.99), horizons=(1, 10),
+                                                    weights={stock: 1 for stock in stocks_list})
 
-                    # 3. Value at Risk (VaR) at 95% confidence
-                    VaR[stock] = np.percentile(stocks_daily_return[stock], 5) * np.sqrt(252)  # 5th percentile
+            # 5. Correlation with the market (SP500), from the full correlation matrix of stocks and SP500
+            corr_matrix = covariance.correlation_matrix(decimal_returns[stocks_list + ['SP500']])
+            correlation_with_market.update(corr_matrix.loc[stocks_list, 'SP500'])
 
-                    # 4. Sharpe Ratio
-                    stock_return = stocks_daily_return[stock].mean() * 252  # Annualized return
-                    sharpe_ratios[stock] = (stock_return - risk_free_rate) / volatility[stock]  # Risk-adjusted return
+            # Calculating Volatility and Sharpe Ratio
+            with instrumentation.stage('volatility and sharpe loop', rows=len(stocks_list)):
+                for stock in stocks_list:
+                    try:
+                        # 2. Volatility (Standard Deviation)
+                        volatility[stock] = np.std(stocks_daily_return[stock]) * np.sqrt(252)  # Annualized volatility
 
-                    # 5. Correlation with the market (SP500)
-                    correlation_with_market[stock] = stocks_daily_return[stock].corr(stocks_daily_return['SP500'])
+                        # 4. Sharpe Ratio
+                        stock_return = stocks_daily_return[stock].mean() * 252  # Annualized return
+                        sharpe_ratios[stock] = (stock_return - risk_free_rate) / volatility[stock]  # Risk-adjusted return
 
-                except Exception as e:
-                    st.error(f"Error calculating metrics for {stock}: {e}")
+                    except Exception as e:
+                        st.error(f"Error calculating metrics for {stock}: {e}")
 
             # Display risk metrics in Streamlit
             col1, col2, col3 = st.columns(3)
@@ -110,9 +115,12 @@ if not stocks_df.empty:
             # VaR (Value at Risk)
             with col3:
                 st.markdown("### Value at Risk (VaR) at 95% Confidence")
-                var_df = pd.DataFrame({'Stock': VaR.keys(), 'VaR': [round(v, 2) for v in VaR.values()]})
-                st.dataframe(var_df, use_container_width=True)
-                st.info("**VaR** is the maximum expected loss in a day, with 95% confidence, based on historical data.")
+                var_df = risk_table[(risk_table['Method'] == 'historical') & (risk_table['Confidence'] == 0.95)
+                                    & (risk_table['Horizon'] == 1)]
+                var_df = pd.DataFrame({'Stock': var_df['Stock'], 'VaR (%)': (var_df['VaR'] * 100).round(2),
+                                       'CVaR (%)': (var_df['CVaR'] * 100).round(2)})
+                st.dataframe(var_df, use_container_width=True, hide_index=True)
+                st.info("**VaR** is the one-day loss exceeded on only 5% of historical days; **CVaR** is the average loss on those days.")
 
             # Sharpe Ratios
             col1, col2 = st.columns(2)
@@ -128,7 +136,50 @@ if not stocks_df.empty:
                 corr_df = pd.DataFrame({'Stock': correlation_with_market.keys(), 'Correlation': [round(corr, 2) for corr in correlation_with_market.values()]})
                 st.dataframe(corr_df, use_container_width=True)
                 st.info("**Correlation** shows how closely the stock's returns follow the SP500. A value near 1 indicates strong positive correlation.")
+
+            # Correlation matrix of the stocks with a choice of covariance estimator
+            st.markdown("### Correlation Matrix")
+            col1, col2 = st.columns([1, 3])
+            with col1:
+                estimator = st.selectbox("Covariance estimator", covariance.METHODS,
+                                         format_func=lambda m: {'sample': 'Sample', 'ewma': 'EWMA (decay 0.94)',
+                                                                'ledoit-wolf': 'Ledoit-Wolf shrinkage'}[m])
+            with col2:
+                estimated = covariance.correlation_matrix(decimal_returns[stocks_list], estimator)
+                st.plotly_chart(px.imshow(estimated.round(2), text_auto=True, zmin=-1, zmax=1,
+                                          color_continuous_scale='RdBu_r'), use_container_width=True)
+            st.info("**EWMA** weighs recent days more, **Ledoit-Wolf** shrinks the sample estimate towards a "
+                    "well-conditioned target, which matters when there are many stocks for the length of history.")
+
+            # VaR and CVaR across methods, confidence levels and horizons
+            st.markdown("### Value at Risk Across Methods")
+            col1, col2 = st.columns([1, 3])
+            with col1:
+                confidence = st.selectbox("Confidence level", [0.95, 0.99], format_func=lambda c: f"{c:.0%}")
+                horizon = st.selectbox("Horizon (trading days)", [1, 10])
+                measure = st.radio("Measure", ['VaR', 'CVaR'])
+            with col2:
+                selected = risk_table[(risk_table['Confidence'] == confidence) & (risk_table['Horizon'] == horizon)]
+                method_df = selected.pivot(index='Stock', columns='Method', values=measure)
+                method_df = (method_df[list(risk_metrics.METHODS)] * 100).round(2)
+                st.dataframe(method_df.reindex(stocks_list + ['Portfolio']), use_container_width=True)
+            st.info("**Historical** uses the actual return distribution, **parametric** assumes normal returns and "
+                    "**Cornish-Fisher** adjusts the normal quantile for skewness and fat tails. Losses are in %, the "
+                    "portfolio holds equal weights.")
+
+            # Rolling Beta, Volatility and Correlation
+            st.markdown("### Rolling Risk Metrics")
+            col1, col2 = st.columns([1, 3])
+            with col1:
+                window = st.selectbox("Rolling window (trading days)", [21, 63, 252], index=1)
+                metric = st.radio("Metric", ['Beta', 'Volatility', 'Correlation'])
+            with col2:
+                rolling = capm_functions.rolling_regression(stocks_daily_return, 'SP500', window, stocks_list)
+                st.line_chart(rolling[metric].dropna(how='all'), use_container_width=True)
+            st.info("**Rolling metrics** show how a stock's market sensitivity, volatility and co-movement with the SP500 change over time.")
     except Exception as e:
         st.error(f"An error occurred during daily returns calculation: {e}")
 else:
     st.error("No stock data retrieved. Please check the selected stocks.")
+
+instrumentation.performance_panel()
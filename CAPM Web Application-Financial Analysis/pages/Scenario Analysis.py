@@ -1,6 +1,9 @@
 import streamlit as st
 import pandas as pd
 import numpy as np
+import plotly.graph_objects as go
+import scenario_grid
+import instrumentation
 
 # Set up the page title and layout
 st.set_page_config(
@@ -8,6 +11,7 @@ st.set_page_config(
     page_icon="🔍",
     layout="wide"
 )
+instrumentation.start_page("Scenario Analysis")
 
 st.title("🔍 Scenario Analysis")
 st.subheader("Simulate different financial scenarios")
@@ -15,8 +19,19 @@ st.subheader("Simulate different financial scenarios")
 # Getting user input for investment parameters
 st.markdown("### Enter Investment Parameters")
 
-initial_investment = st.number_input("Initial Investment ($)", value=10000, min_value=0)
-years = st.number_input("Number of Years", value=5, min_value=1)
+col1, col2, col3 = st.columns(3)
+with col1:
+    initial_investment = st.number_input("Initial Investment ($)", value=10000, min_value=0)
+    years = st.number_input("Number of Years", value=5, min_value=1, max_value=100)
+with col2:
+    contribution = st.number_input("Annual Contribution ($)", value=0, min_value=0)
+    contribution_growth = st.number_input("Contribution Growth (%)", value=0.0, min_value=-50.0, max_value=50.0) / 100
+with col3:
+    inflation = st.number_input("Inflation (%)", value=0.0, min_value=-10.0, max_value=50.0) / 100
+    real = st.checkbox("Show values in today's dollars (after inflation)", value=False)
+
+base = {'initial': initial_investment, 'years': years, 'contribution': contribution,
+        'contribution_growth': contribution_growth, 'inflation': inflation}
 
 # Create scenarios
 st.subheader("Create Scenarios")
@@ -30,21 +45,101 @@ for scenario in scenarios:
     rate = st.number_input(f"Rate of Return for {scenario} (%)", value=5.0, min_value=-100.0, max_value=100.0)
     rates_of_return[scenario] = rate / 100
 
-# Calculate future values for each scenario
-future_values = {}
-for name in scenarios:
-    future_value = initial_investment * (1 + rates_of_return[name]) ** years
-    future_values[name] = future_value
+try:
+    # Calculate future values for every scenario in one call
+    future_values = scenario_grid.future_value(rate=np.array([rates_of_return[name] for name in scenarios]),
+                                               real=real, **base)
+
+    # Display results
+    st.markdown("### Future Value Results")
+    result_df = pd.DataFrame({
+        'Scenario': scenarios,
+        'Future Value ($)': future_values
+    })
+
+    st.dataframe(result_df)
+
+    # Visualization
+    st.markdown("### Future Value Visualization")
+    st.bar_chart(result_df.set_index('Scenario'))
+
+    # Sensitivity heatmap: future value over a grid of two parameters, the others at the values above
+    st.markdown("### Sensitivity Heatmap")
+    sweeps = {
+        'rate': ("Rate of Return (%)", -10.0, 20.0, (0.0, 10.0), 100),
+        'years': ("Number of Years", 1.0, 60.0, (1.0, 30.0), 1),
+        'contribution': ("Annual Contribution ($)", 0.0, 50000.0, (0.0, 10000.0), 1),
+        'inflation': ("Inflation (%)", -5.0, 20.0, (0.0, 8.0), 100),
+    }
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        x_name = st.selectbox("Horizontal axis", list(sweeps), index=1, format_func=lambda n: sweeps[n][0])
+        x_range = st.slider(sweeps[x_name][0], sweeps[x_name][1], sweeps[x_name][2], sweeps[x_name][3], key='x_range')
+    with col2:
+        y_options = [n for n in sweeps if n != x_name]
+        y_name = st.selectbox("Vertical axis", y_options, format_func=lambda n: sweeps[n][0])
+        y_range = st.slider(sweeps[y_name][0], sweeps[y_name][1], sweeps[y_name][2], sweeps[y_name][3], key='y_range')
+    with col3:
+        resolution = st.select_slider("Grid points per axis", options=[25, 50, 100, 200, 400], value=100)
+    x_values = np.linspace(*x_range, resolution) / sweeps[x_name][4]
+    y_values = np.linspace(*y_range, resolution) / sweeps[y_name][4]
+    heat_base = {**base, 'rate': rates_of_return[scenarios[0]] if scenarios else 0.05}
+    grid = scenario_grid.evaluate_grid({y_name: y_values, x_name: x_values}, heat_base, real=real)
+    heatmap = go.Figure(go.Heatmap(x=x_values * sweeps[x_name][4], y=y_values * sweeps[y_name][4], z=grid,
+                                   colorscale='Viridis', colorbar=dict(title='Future Value ($)')))
+    heatmap.update_layout(xaxis_title=sweeps[x_name][0], yaxis_title=sweeps[y_name][0],
+                          margin=dict(l=20, r=20, t=30, b=20))
+    st.plotly_chart(heatmap, use_container_width=True)
 
-# Display results
-st.markdown("### Future Value Results")
-result_df = pd.DataFrame({
-    'Scenario': scenarios,
-    'Future Value ($)': [future_values[name] for name in scenarios]
-})
+    # Tornado chart: how far the future value moves when one parameter goes to the end of its range
+    st.markdown("### Tornado Chart")
+    swing = st.slider("Swing around the base values (%)", 5, 100, 25) / 100
+    base_rate = heat_base['rate']
+    ranges = {
+        'rate': (base_rate - max(abs(base_rate), 0.01) * swing, base_rate + max(abs(base_rate), 0.01) * swing),
+        'years': (max(years * (1 - swing), 1), years * (1 + swing)),
+        'initial': (initial_investment * (1 - swing), initial_investment * (1 + swing)),
+        'contribution': (contribution * (1 - swing), contribution * (1 + swing)),
+        'inflation': (inflation - max(abs(inflation), 0.01) * swing, inflation + max(abs(inflation), 0.01) * swing),
+    }
+    if not real:
+        ranges.pop('inflation')
+    tornado = scenario_grid.sensitivity(ranges, heat_base, real=real)
+    base_value = tornado.attrs['base_value']
+    ordered = tornado.iloc[::-1]
+    figure = go.Figure([
+        go.Bar(y=ordered['Parameter'], x=ordered['Value at Low'] - base_value, base=base_value, orientation='h',
+               name='Low end'),
+        go.Bar(y=ordered['Parameter'], x=ordered['Value at High'] - base_value, base=base_value, orientation='h',
+               name='High end'),
+    ])
+    figure.update_layout(barmode='overlay', xaxis_title='Future Value ($)', margin=dict(l=20, r=20, t=30, b=20))
+    st.plotly_chart(figure, use_container_width=True)
+    st.caption(f"Base future value ${base_value:,.2f} at a {base_rate:.2%} rate of return "
+               f"(first scenario); each bar moves one parameter by ±{swing:.0%}.")
 
-st.dataframe(result_df)
+    # Stochastic rates: every path draws a new rate of return each year, all paths in one array pass
+    st.markdown("### Stochastic Rate Paths")
+    col1, col2 = st.columns(2)
+    with col1:
+        volatility = st.number_input("Volatility of the annual return (%)", value=15.0, min_value=0.0,
+                                     max_value=100.0) / 100
+    with col2:
+        n_paths = st.select_slider("Number of paths", options=[1000, 5000, 10000, 50000], value=10000)
+    rates = scenario_grid.simulate_rates(base_rate, volatility, years, n_paths, seed=42)
+    values = scenario_grid.path_values(rates, initial_investment, contribution, contribution_growth)
+    invested = initial_investment + contribution * ((1 + contribution_growth) ** np.arange(years)).sum()
+    losing = (values[:, -1] < invested).mean()
+    if real:
+        values = values / (1 + inflation) ** np.arange(1, years + 1)
+    percentiles = pd.DataFrame(np.percentile(values, [5, 25, 50, 75, 95], axis=0).T,
+                               index=pd.Index(np.arange(1, years + 1), name='Year'),
+                               columns=['5th', '25th', 'Median', '75th', '95th'])
+    st.line_chart(percentiles)
+    terminal = values[:, -1]
+    st.write(f"**Median:** ${np.median(terminal):,.2f} | **Mean:** ${terminal.mean():,.2f} | "
+             f"**Chance of ending below the amount invested:** {losing:.1%}")
+except Exception as e:
+    st.error(f"Error evaluating the scenarios: {e}")
 
-# Visualization
-st.markdown("### Future Value Visualization")
-st.bar_chart(result_df.set_index('Scenario'))
+instrumentation.performance_panel()
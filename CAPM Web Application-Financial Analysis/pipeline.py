@@ -0,0 +1,248 @@
+import time
+
+import pandas as pd
+
+import alignment
+import capm_functions
+import instrumentation
+import market_data
+import result_cache
+
+
+# One step of a computation graph
+# inputs: names of the parameters and upstream stages the function reads
+# per_column: the stage is computed per ticker; func(columns, **inputs) gets the tickers to (re)compute
+#             and returns a dict of ticker -> value, so an added ticker only computes its own values
+# ranged: the value is a date-indexed frame / series for the 'start' and 'end' inputs, and the value of
+#         a narrower range is a slice of a wider one, so shrinking the range recomputes nothing and
+#         widening it recomputes once over the union of the ranges. Only the stage itself is reused this
+#         way: stages downstream of it see different content for a different range and are recomputed
+#         (the fetches are ranged, the cheap computations on the fetched panel are not)
+# ttl: for ranged fetches, seconds a value whose range reaches today is kept before it is fetched again,
+#      so today's provisional rows are refreshed like in the price cache
+# shared: for per_column stages, the columns of an upstream DataFrame every ticker depends on (e.g. the
+#         benchmark); a ticker is recomputed only when its own column or a shared one changes
+class Stage:
+    def __init__(self, name, func, inputs=(), per_column=False, ranged=False, shared=(), ttl=None):
+        self.name = name
+        self.func = func
+        self.inputs = list(inputs)
+        self.per_column = per_column
+        self.ranged = ranged
+        self.shared = list(shared)
+        self.ttl = ttl
+
+
+# Lazy computation graph: evaluating a stage computes only the stages it depends on, and only when the
+# fingerprint of their inputs differs from the one stored with the last value
+# store: dict the values are kept in between runs, e.g. a slot of st.session_state; one entry per
+#        (stage, ticker), so it does not grow with the number of interactions. Stored values are
+#        shared between runs and must not be modified in place.
+# After evaluate(), stats holds the number of values computed and reused per stage
+class Graph:
+    def __init__(self, stages, store=None, columns='tickers'):
+        self.stages = {stage.name: stage for stage in stages}
+        self.store = {} if store is None else store
+        self.columns = columns
+        self.stats = {}
+
+    # Function to get the values of one or more stages for the given parameters
+    def evaluate(self, names, **params):
+        self.stats = {name: {'computed': 0, 'reused': 0} for name in self.stages}
+        self._values = {}
+        if isinstance(names, str):
+            return self._value(names, params)
+        return {name: self._value(name, params) for name in names}
+
+    # Function to summarize the last evaluation, e.g. "computed 3 of 24 values"
+    def summary(self):
+        computed = sum(s['computed'] for s in self.stats.values())
+        total = computed + sum(s['reused'] for s in self.stats.values())
+        return f"computed {computed} of {total} values"
+
+    def _value(self, name, params):
+        key = (name, params.get('start'), params.get('end'))
+        if key not in self._values:
+            stage = self.stages[name]
+            if stage.per_column:
+                self._values[key] = self._column_values(stage, list(params[self.columns]), params)
+            else:
+                self._values[key] = self._global_value(stage, params)
+        return self._values[key]
+
+    # Function to get the values of the inputs of a stage, restricted to some tickers for per_column stages
+    def _inputs(self, stage, params, columns=None):
+        inputs = {}
+        for name in stage.inputs:
+            if name not in self.stages:
+                inputs[name] = params[name]
+                continue
+            value = self._value(name, params)
+            if columns is not None and self.stages[name].per_column:
+                value = {column: value[column] for column in columns}
+            elif columns is not None and isinstance(value, pd.DataFrame):
+                value = value[[c for c in stage.shared if c in value.columns] + list(columns)]
+            inputs[name] = value
+        return inputs
+
+    # Function to fingerprint the inputs of a stage, for one ticker of a per_column stage
+    # Parameters and upstream values are hashed by content; ranged stages leave out the range itself
+    # A stage with a ttl whose range reaches today gets a token that changes every ttl seconds
+    def _fingerprint(self, stage, params, column=None):
+        parts = {}
+        if stage.ttl and pd.Timestamp(params['end']) >= pd.Timestamp.today().normalize():
+            parts['refresh'] = int(time.time() // stage.ttl)
+        for name in stage.inputs:
+            if stage.ranged and name in ('start', 'end'):
+                continue
+            if name not in self.stages:
+                parts[name] = params[name]
+                continue
+            value = self._value(name, params)
+            if column is not None and self.stages[name].per_column:
+                value = value[column]
+            elif column is not None and isinstance(value, pd.DataFrame):
+                value = value[[c for c in stage.shared if c in value.columns] + [column]]
+            parts[name] = value
+        return result_cache.make_key(stage.name, (column,), parts)
+
+    # Function to look up a stored value; ranged values are reused when they cover the range
+    def _lookup(self, stage, params, column, fingerprint):
+        entry = self.store.get((stage.name, column))
+        if entry is None or entry['fingerprint'] != fingerprint:
+            return None, None
+        if not stage.ranged:
+            return entry, None
+        start, end = pd.Timestamp(params['start']), pd.Timestamp(params['end'])
+        if entry['start'] <= start and entry['end'] >= end:
+            return entry, None
+        # Widen to the union so the stored history keeps growing instead of flipping between ranges
+        return None, (min(start, entry['start']), max(end, entry['end']))
+
+    def _result(self, stage, entry, params):
+        if stage.ranged:
+            return entry['value'].loc[pd.Timestamp(params['start']):pd.Timestamp(params['end'])]
+        return entry['value']
+
+    def _save(self, stage, column, fingerprint, value, params):
+        entry = {'fingerprint': fingerprint, 'value': value}
+        if stage.ranged:
+            entry['start'], entry['end'] = pd.Timestamp(params['start']), pd.Timestamp(params['end'])
+        self.store[(stage.name, column)] = entry
+        return entry
+
+    def _global_value(self, stage, params):
+        fingerprint = self._fingerprint(stage, params)
+        entry, widened = self._lookup(stage, params, None, fingerprint)
+        if entry is not None:
+            self.stats[stage.name]['reused'] += 1
+            return self._result(stage, entry, params)
+        run_params = dict(params, start=widened[0], end=widened[1]) if widened else params
+        inputs = self._inputs(stage, run_params)
+        with instrumentation.stage(f'pipeline: {stage.name}'):
+            value = stage.func(**inputs)
+        self.stats[stage.name]['computed'] += 1
+        return self._result(stage, self._save(stage, None, fingerprint, value, run_params), params)
+
+    def _column_values(self, stage, columns, params):
+        values = {}
+        # Tickers to compute, grouped by the range they need so each group is one call
+        pending = {}
+        fingerprints = {}
+        for column in columns:
+            fingerprints[column] = self._fingerprint(stage, params, column)
+            entry, widened = self._lookup(stage, params, column, fingerprints[column])
+            if entry is not None:
+                self.stats[stage.name]['reused'] += 1
+                values[column] = self._result(stage, entry, params)
+            else:
+                pending.setdefault(widened, []).append(column)
+        for widened, group in pending.items():
+            run_params = dict(params, start=widened[0], end=widened[1]) if widened else params
+            inputs = self._inputs(stage, run_params, group)
+            with instrumentation.stage(f'pipeline: {stage.name}', rows=len(group)):
+                computed = stage.func(group, **inputs)
+            for column in group:
+                entry = self._save(stage, column, fingerprints[column], computed[column], run_params)
+                values[column] = self._result(stage, entry, params)
+            self.stats[stage.name]['computed'] += len(group)
+        return {column: values[column] for column in columns}
+
+
+# Stages of the CAPM Return page:
+# market, prices (fetch) -> aligned -> panel -> figures; panel -> returns -> regression -> capm
+
+
+# Function to fetch the FRED sp500 series as a Series named 'sp500'
+def _fetch_market(start, end):
+    market = market_data.load_fred('sp500', start, end)
+    return market.iloc[:, 0].rename('sp500')
+
+
+# Function to fetch the closing prices of some tickers in one batched download
+def _fetch_prices(columns, start, end):
+    close = market_data.load_price_panel(columns, start, end, fields=['Close'])['Close']
+    return {column: close[column] for column in columns}
+
+
+# Function to align the stock prices with the sp500 calendar, returns (frame indexed by Date, report)
+def _align(prices, market, policy):
+    return alignment.align_frames(pd.DataFrame(prices), market.to_frame(), how=policy)
+
+
+# Function to get the aligned panel in the page layout ('Date' column, one column per stock, sp500)
+def _panel(aligned):
+    return aligned[0].reset_index()
+
+
+# Function to build the price and normalized price figures, zoomed to chart_range ((start, end) or None)
+def _figures(panel, chart_range):
+    return (capm_functions.interactive_plot(panel, date_range=chart_range),
+            capm_functions.interactive_plot(capm_functions.normalize(panel), date_range=chart_range))
+
+
+# Function to get the daily returns (%) of some stocks from the panel
+def _returns(columns, panel):
+    returns = capm_functions.daily_returns(panel[['Date'] + list(columns)])
+    return {column: returns[column] for column in columns}
+
+
+# Function to get the daily returns (%) of the sp500 from the panel
+def _market_returns(panel):
+    return capm_functions.daily_returns(panel[['Date', 'sp500']])['sp500']
+
+
+# Function to regress some stocks on the sp500 in one regress_panel call, returns ticker -> (beta, alpha)
+def _regression(columns, returns, market_returns):
+    frame = pd.DataFrame(returns)
+    frame['sp500'] = market_returns
+    regression = capm_functions.regress_panel(frame, 'sp500', list(columns))
+    return {stock: (beta, alpha) for stock, beta, alpha in zip(regression['Stock'], regression['Beta'], regression['Alpha'])}
+
+
+# Function to get the beta and CAPM expected return table
+def _capm(regression, market_returns, rf):
+    rm = market_returns.mean() * 252
+    stocks = list(regression)
+    betas = [regression[stock][0] for stock in stocks]
+    return pd.DataFrame({
+        'Stock': stocks,
+        'Beta Value': [round(b, 2) for b in betas],
+        'Return Value': [round(rf + b * (rm - rf), 2) for b in betas],
+    })
+
+
+# Function to build the lazy graph behind the CAPM Return page
+# Parameters: tickers, start, end, policy (alignment policy), chart_range (zoom of the figures) and rf
+def capm_graph(store=None):
+    return Graph([
+        Stage('market', _fetch_market, ['start', 'end'], ranged=True, ttl=market_data.FETCH_TTL),
+        Stage('prices', _fetch_prices, ['start', 'end'], per_column=True, ranged=True, ttl=market_data.FETCH_TTL),
+        Stage('aligned', _align, ['prices', 'market', 'policy']),
+        Stage('panel', _panel, ['aligned']),
+        Stage('figures', _figures, ['panel', 'chart_range']),
+        Stage('returns', _returns, ['panel'], per_column=True, shared=['Date']),
+        Stage('market_returns', _market_returns, ['panel']),
+        Stage('regression', _regression, ['returns', 'market_returns'], per_column=True),
+        Stage('capm', _capm, ['regression', 'market_returns', 'rf']),
+    ], store)
@@ -0,0 +1,210 @@
+import numpy as np
+import pandas as pd
+
+import instrumentation
+
+
+# Function to get annualized historical expected returns and covariance from a returns panel
+# returns: decimal daily returns, one column per asset (optional Date column)
+def historical_inputs(returns, periods_per_year=252):
+    if 'Date' in returns.columns:
+        returns = returns.drop(columns='Date')
+    returns = returns.dropna()
+    mu = returns.mean() * periods_per_year
+    cov = returns.cov() * periods_per_year
+    return mu, cov
+
+
+# Function to get CAPM expected returns E(R_i) = rf + beta_i * (rm - rf) for a Series of betas
+def capm_expected_returns(betas, rf, market_return):
+    return rf + betas * (market_return - rf)
+
+
+# Function to find the shift tau with sum(clip(v - tau, 0, upper)) == target exactly
+# The sum is piecewise linear in tau with breakpoints at v - upper and v, so sorting the breakpoints
+# and accumulating slopes finds tau without iterating. Returns -inf when the caps alone keep the
+# sum at or below target.
+def _shift_for_sum(v, upper, target):
+    if upper.sum() <= target:
+        return -np.inf
+    breakpoints = np.concatenate([v - upper, v])
+    slope_change = np.concatenate([np.ones_like(v), -np.ones_like(v)])
+    order = np.argsort(breakpoints, kind='stable')
+    breakpoints = breakpoints[order]
+    # Number of assets strictly between their bounds on each interval between breakpoints
+    active = np.cumsum(slope_change[order])[:-1]
+    totals = upper.sum() - np.concatenate([[0.0], np.cumsum(active * np.diff(breakpoints))])
+    # totals decrease along the breakpoints, find the interval where they cross the target
+    k = np.searchsorted(-totals, -target, side='left')
+    if k >= len(breakpoints):
+        return breakpoints[-1]
+    return breakpoints[k - 1] + (totals[k - 1] - target) / active[k - 1]
+
+
+# Function to project a vector onto {sum(w) = 1, 0 <= w <= upper}
+def _project_capped_simplex(v, upper):
+    return np.clip(v - _shift_for_sum(v, upper, 1.0), 0.0, upper)
+
+
+# Function to project onto {sum(w) = 1, 0 <= w <= upper, sector sums <= sector caps}
+# The solution is clip(v - max(tau, theta_g), 0, upper) where theta_g is the shift at which sector g
+# reaches its cap. Since clip(v - max(tau, theta), 0, u) == clip(v - tau, 0, clip(v - theta, 0, u)),
+# it is a plain capped-simplex projection with the caps of each sector's assets tightened first.
+def _project_with_sectors(v, upper, members, caps):
+    upper = upper.copy()
+    for index, cap in zip(members, caps):
+        theta = _shift_for_sum(v[index], upper[index], cap)
+        if np.isfinite(theta):
+            upper[index] = np.clip(v[index] - theta, 0.0, upper[index])
+    return _project_capped_simplex(v, upper)
+
+
+# Function to build the projection onto the feasible set of long-only portfolios
+# max_weight: cap on every single weight (scalar or one value per asset)
+# sectors: dict of asset -> sector name; sector_caps: dict of sector -> maximum total weight
+def make_projector(assets, max_weight=1.0, sectors=None, sector_caps=None):
+    n = len(assets)
+    upper = np.broadcast_to(np.asarray(max_weight, dtype=float), (n,)).copy()
+    if upper.sum() < 1.0 - 1e-12:
+        raise ValueError(f"Weight caps add up to {upper.sum():.2f}, they must allow a fully invested portfolio")
+    if not sectors or not sector_caps:
+        return lambda v: _project_capped_simplex(v, upper)
+
+    # Asset positions of every capped sector
+    members = []
+    caps = []
+    for sector, cap in sector_caps.items():
+        index = np.array([i for i, a in enumerate(assets) if sectors.get(a) == sector], dtype=int)
+        if len(index):
+            members.append(index)
+            caps.append(cap)
+    uncapped = np.ones(n, dtype=bool)
+    capacity = 0.0
+    for index, cap in zip(members, caps):
+        uncapped[index] = False
+        capacity += min(upper[index].sum(), cap)
+    capacity += upper[uncapped].sum()
+    if capacity < 1.0 - 1e-12:
+        raise ValueError(f"Weight and sector caps allow only {capacity:.2f} of the portfolio to be invested")
+    return lambda v: _project_with_sectors(v, upper, members, caps)
+
+
+# Function to solve min 0.5 w'Cw - risk_tolerance * mu'w over the feasible set with FISTA
+# (accelerated projected gradient with adaptive restart), starting from w0
+def _solve(cov, mu, risk_tolerance, w0, step, project, tol=1e-8, max_iter=5000):
+    w = w0
+    y = w0
+    t = 1.0
+    for iteration in range(1, max_iter + 1):
+        w_next = project(y - step * (cov @ y - risk_tolerance * mu))
+        if np.max(np.abs(w_next - w)) < tol:
+            return w_next, iteration
+        t_next = (1 + np.sqrt(1 + 4 * t * t)) / 2
+        # Restart the momentum when it points uphill
+        if np.dot(y - w_next, w_next - w) > 0:
+            t_next = 1.0
+            y = w_next
+        else:
+            y = w_next + (t - 1) / t_next * (w_next - w)
+        w, t = w_next, t_next
+    return w, max_iter
+
+
+# Solver shared by the portfolio functions, holds the inputs and the projection
+class _Problem:
+    def __init__(self, mu, cov, max_weight=1.0, sectors=None, sector_caps=None):
+        self.assets = list(cov.columns)
+        self.mu = np.asarray(pd.Series(mu).reindex(self.assets), dtype=float)
+        self.cov = np.asarray(cov, dtype=float)
+        if np.isnan(self.mu).any():
+            raise ValueError("Expected returns are missing for some assets of the covariance matrix")
+        self.project = make_projector(self.assets, max_weight, sectors, sector_caps)
+        self.step = 1.0 / max(np.linalg.eigvalsh(self.cov)[-1], 1e-12)
+        self.iterations = 0
+
+    def solve(self, risk_tolerance, w0=None):
+        if w0 is None:
+            w0 = self.project(np.full(len(self.assets), 1.0 / len(self.assets)))
+        w, iterations = _solve(self.cov, self.mu, risk_tolerance, w0, self.step, self.project)
+        self.iterations += iterations
+        return w
+
+    def describe(self, w, rf):
+        ret = float(self.mu @ w)
+        vol = float(np.sqrt(max(w @ self.cov @ w, 0.0)))
+        return ret, vol, (ret - rf) / vol if vol > 0 else np.nan
+
+
+# Function to describe one portfolio as a dict of weights (Series) and its statistics
+def _portfolio(problem, w, rf):
+    ret, vol, sharpe = problem.describe(w, rf)
+    return {'weights': pd.Series(w, index=problem.assets), 'return': ret, 'volatility': vol, 'sharpe': sharpe}
+
+
+# Function to get the minimum-variance portfolio
+# mu: expected returns (Series indexed like cov), cov: covariance DataFrame, both annualized
+@instrumentation.timed
+def min_variance(mu, cov, rf=0.0, max_weight=1.0, sectors=None, sector_caps=None):
+    problem = _Problem(mu, cov, max_weight, sectors, sector_caps)
+    return _portfolio(problem, problem.solve(0.0), rf)
+
+
+# Function to trace the efficient frontier, each point warm-started from the previous solution
+# The frontier is parametrized by risk tolerance, from 0 (minimum variance) up to a value where the
+# portfolio is close to the maximum-return corner
+# Returns (frontier, weights): frontier has Return, Volatility, Sharpe and Risk Tolerance per point,
+# weights has one row per point and one column per asset
+@instrumentation.timed
+def efficient_frontier(mu, cov, rf=0.0, n_points=100, max_weight=1.0, sectors=None, sector_caps=None,
+                       _problem=None):
+    problem = _problem or _Problem(mu, cov, max_weight, sectors, sector_caps)
+    spread = max(np.ptp(problem.mu), 1e-12)
+    scale = np.trace(problem.cov) / len(problem.assets) / spread
+    tolerances = np.concatenate([[0.0], np.geomspace(scale * 1e-3, scale * 1e3, n_points - 1)])
+    rows = []
+    weights = []
+    w = None
+    for risk_tolerance in tolerances:
+        w = problem.solve(risk_tolerance, w)
+        ret, vol, sharpe = problem.describe(w, rf)
+        rows.append((ret, vol, sharpe, risk_tolerance))
+        weights.append(w)
+    frontier = pd.DataFrame(rows, columns=['Return', 'Volatility', 'Sharpe', 'Risk Tolerance'])
+    return frontier, pd.DataFrame(weights, columns=problem.assets)
+
+
+# Function to get the maximum-Sharpe portfolio
+# The best frontier point is refined by a golden-section search on the risk tolerance between its
+# neighbours, each solve warm-started from the last one
+# frontier: (frontier, weights) from efficient_frontier with the same inputs, when the caller already has
+# it; otherwise an n_points frontier is traced first
+@instrumentation.timed
+def max_sharpe(mu, cov, rf=0.0, max_weight=1.0, sectors=None, sector_caps=None, n_points=50, iterations=30,
+               frontier=None):
+    problem = _Problem(mu, cov, max_weight, sectors, sector_caps)
+    if frontier is None:
+        frontier = efficient_frontier(mu, cov, rf, n_points, _problem=problem)
+    frontier, weights = frontier
+    best = int(frontier['Sharpe'].fillna(-np.inf).idxmax())
+    tolerances = frontier['Risk Tolerance'].to_numpy()
+    low = tolerances[max(best - 1, 0)]
+    high = tolerances[min(best + 1, len(tolerances) - 1)]
+    w = weights.iloc[best].to_numpy()
+    best_w, best_sharpe = w, frontier['Sharpe'].iloc[best]
+
+    ratio = (np.sqrt(5) - 1) / 2
+    for _ in range(iterations):
+        a = high - ratio * (high - low)
+        b = low + ratio * (high - low)
+        w_a = problem.solve(a, w)
+        w_b = problem.solve(b, w_a)
+        sharpe_a = problem.describe(w_a, rf)[2]
+        sharpe_b = problem.describe(w_b, rf)[2]
+        if sharpe_a >= sharpe_b:
+            high, w = b, w_a
+        else:
+            low, w = a, w_b
+        for candidate, sharpe in ((w_a, sharpe_a), (w_b, sharpe_b)):
+            if sharpe > best_sharpe:
+                best_w, best_sharpe = candidate, sharpe
+    return _portfolio(problem, best_w, rf)
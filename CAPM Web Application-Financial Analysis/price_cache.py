@@ -0,0 +1,325 @@
+import contextlib
+import datetime
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+
+import pandas as pd
+
+# Cache settings, each one can be overridden with an environment variable
+CACHE_DIR = os.environ.get('CAPM_CACHE_DIR',
+                           os.path.join(os.path.dirname(os.path.abspath(__file__)), '.price_cache'))
+MAX_BYTES = int(os.environ.get('CAPM_CACHE_MAX_BYTES', 512 * 1024 * 1024))
+# Rows for the day of the last download may be incomplete (market still open), they are refetched
+# once the entry is older than this many minutes
+STALE_MINUTES = float(os.environ.get('CAPM_CACHE_STALE_MINUTES', 15))
+
+# Parquet needs pyarrow (or fastparquet), fall back to pickle files when neither is installed
+try:
+    import pyarrow  # noqa: F401
+    FILE_FORMAT = 'parquet'
+except ImportError:
+    try:
+        import fastparquet  # noqa: F401
+        FILE_FORMAT = 'parquet'
+    except ImportError:
+        FILE_FORMAT = 'pickle'
+
+# Manifests are shared by every process using the same cache directory (Streamlit servers, CLI workers,
+# the service), writers take an exclusive lock on a file next to the manifest
+try:
+    import fcntl
+
+    def _lock_file(f):
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+
+    def _unlock_file(f):
+        fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+except ImportError:
+    import msvcrt
+
+    def _lock_file(f):
+        f.seek(0)
+        msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+
+    def _unlock_file(f):
+        f.seek(0)
+        msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+ONE_DAY = pd.Timedelta(days=1)
+
+
+# Function to write a file atomically: write(tmp_path) fills a temporary file of this process in the same
+# directory, which then replaces `path`, so readers never see a half-written file
+def _replace_file(path, write):
+    handle, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or '.', suffix='.tmp')
+    os.close(handle)
+    try:
+        write(tmp_path)
+        os.replace(tmp_path, path)
+    except BaseException:
+        with contextlib.suppress(OSError):
+            os.remove(tmp_path)
+        raise
+
+
+# Function to write a frame to disk in the cache file format
+def write_frame(df, path):
+    _replace_file(path, df.to_parquet if FILE_FORMAT == 'parquet' else df.to_pickle)
+
+
+# Function to read a frame written by write_frame
+def read_frame(path):
+    if FILE_FORMAT == 'parquet':
+        return pd.read_parquet(path)
+    return pd.read_pickle(path)
+
+
+# Function to turn a date, datetime or string into a midnight Timestamp
+def to_day(value):
+    stamp = pd.Timestamp(value)
+    if stamp.tzinfo is not None:
+        stamp = stamp.tz_localize(None)
+    return stamp.normalize()
+
+
+# Function to turn a symbol such as '^GSPC' or 'yahoo:BRK-B' into a safe file name
+def safe_file_name(symbol):
+    return re.sub(r'[^A-Za-z0-9_.-]', '_', symbol)
+
+
+# Function to get the data file of a manifest key in a cache directory
+def cache_file_path(root, key):
+    extension = 'parquet' if FILE_FORMAT == 'parquet' else 'pkl'
+    return os.path.join(root, f'{safe_file_name(key)}.{extension}')
+
+
+# JSON manifest of a cache directory that several processes may update at the same time
+# entries() is this process's view, reloaded whenever another process has saved the file since.
+# Changes go through update(), which holds the file lock, starts from the manifest on disk and saves the
+# result, so entries written by other processes are never lost.
+class Manifest:
+    def __init__(self, root):
+        self.path = os.path.join(root, 'manifest.json')
+        self._lock_path = self.path + '.lock'
+        self._lock = threading.RLock()
+        self._entries = {}
+        self._stamp = None
+        # Reads only touch memory, their access times are saved with the next update
+        self._accessed = {}
+
+    def _file_stamp(self):
+        try:
+            stat = os.stat(self.path)
+            return stat.st_ino, stat.st_mtime_ns, stat.st_size
+        except OSError:
+            return None
+
+    def _load(self):
+        stamp = self._file_stamp()
+        if stamp is None:
+            entries = {}
+        else:
+            try:
+                with open(self.path) as f:
+                    entries = json.load(f)
+            except (OSError, ValueError):
+                entries = {}
+        self._entries, self._stamp = entries, stamp
+
+    # Function to get the current entries (key -> dict), reloaded when the file changed on disk
+    def entries(self):
+        with self._lock:
+            if self._stamp is None or self._file_stamp() != self._stamp:
+                self._load()
+            return self._entries
+
+    # Function to remember that an entry was used, for least recently used eviction
+    def touch(self, key, when=None):
+        with self._lock:
+            self._accessed[key] = when or time.time()
+            if key in self._entries:
+                self._entries[key]['last_access'] = self._accessed[key]
+
+    # Context manager to change the entries under the inter-process lock, saved when the block ends
+    @contextlib.contextmanager
+    def update(self):
+        with self._lock, open(self._lock_path, 'a+') as lock_file:
+            _lock_file(lock_file)
+            try:
+                self._load()
+                for key, when in self._accessed.items():
+                    if key in self._entries:
+                        self._entries[key]['last_access'] = max(self._entries[key].get('last_access', 0), when)
+                self._accessed = {}
+                try:
+                    yield self._entries
+                except BaseException:
+                    # Drop the half-applied change, the next read starts from the file again
+                    self._stamp = None
+                    raise
+                _replace_file(self.path, self._dump)
+                self._stamp = self._file_stamp()
+            finally:
+                _unlock_file(lock_file)
+
+    def _dump(self, tmp_path):
+        with open(tmp_path, 'w') as f:
+            json.dump(self._entries, f, indent=1)
+
+
+# On-disk store with one file per (source, symbol) and a manifest of the date range each file covers.
+# Requests only download the part of the range that is not on disk yet (older head or newer tail),
+# and the least recently used symbols are evicted when the store grows past max_bytes.
+class PriceCache:
+    def __init__(self, root=CACHE_DIR, max_bytes=MAX_BYTES, stale_minutes=STALE_MINUTES):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.stale_after = datetime.timedelta(minutes=stale_minutes)
+        os.makedirs(self.root, exist_ok=True)
+        self.manifest = Manifest(self.root)
+
+    def _file_path(self, key):
+        return cache_file_path(self.root, key)
+
+    # Function to work out which (start, end) ranges of a request must be downloaded
+    # Rows after entry['final'] were downloaded on a day that may not have closed yet, they are
+    # refetched once the last tail download is older than stale_after
+    def missing_ranges(self, source, symbol, start, end):
+        start, end = to_day(start), to_day(end)
+        entry = self.manifest.entries().get(f'{source}:{symbol}')
+        if entry is None:
+            return [(start, end)]
+        ranges = []
+        stored_start = pd.Timestamp(entry['start'])
+        stored_end = pd.Timestamp(entry['end'])
+        final = pd.Timestamp(entry['final'])
+        if start < stored_start:
+            ranges.append((start, stored_start - ONE_DAY))
+        if end > final:
+            age = time.time() - entry['fetched_at']
+            if end > stored_end or age > self.stale_after.total_seconds():
+                ranges.append((final + ONE_DAY, max(end, stored_end)))
+        return ranges
+
+    # Function to read the stored rows of a symbol between start and end (None when nothing is stored)
+    def read(self, source, symbol, start=None, end=None):
+        key = f'{source}:{symbol}'
+        if key not in self.manifest.entries():
+            return None
+        try:
+            frame = read_frame(self._file_path(key))
+        except OSError:
+            # Evicted by another process since the manifest was read
+            return None
+        self.manifest.touch(key)
+        return frame.loc[to_day(start) if start is not None else None:
+                         to_day(end) if end is not None else None]
+
+    # Function to merge newly downloaded rows of a symbol into the store
+    # An empty download of a symbol already stored still counts as covered (a weekend or holiday tail,
+    # a head from before the listing) so it is not asked for again on every call. An empty download of
+    # a symbol with nothing stored (unknown ticker, failed request) is not recorded and stays missing.
+    def write(self, source, symbol, frame, start, end):
+        key = f'{source}:{symbol}'
+        start, end = to_day(start), to_day(end)
+        path = self._file_path(key)
+        empty = frame.dropna(how='all').empty
+        with self.manifest.update() as entries:
+            entry = entries.get(key)
+            stored = entry is not None and os.path.exists(path)
+            if empty and not stored:
+                return
+            now = time.time()
+            # Only a download reaching the stored end moves the final day and the staleness clock
+            if entry is None or end >= pd.Timestamp(entry['end']):
+                final = min(end, to_day(datetime.date.today()) - ONE_DAY)
+                fetched_at = now
+            else:
+                final = pd.Timestamp(entry['final'])
+                fetched_at = entry['fetched_at']
+            if stored:
+                start = min(start, pd.Timestamp(entry['start']))
+                end = max(end, pd.Timestamp(entry['end']))
+                final = max(final, pd.Timestamp(entry['final']))
+            if not empty:
+                if stored:
+                    frame = pd.concat([read_frame(path), frame])
+                    frame = frame[~frame.index.duplicated(keep='last')]
+                write_frame(frame.sort_index(), path)
+            entries[key] = {
+                'file': os.path.basename(path),
+                'start': start.strftime('%Y-%m-%d'),
+                'end': end.strftime('%Y-%m-%d'),
+                'final': final.strftime('%Y-%m-%d'),
+                'fetched_at': fetched_at,
+                'last_access': now,
+                'bytes': os.path.getsize(path),
+            }
+            self._evict(entries, keep=key)
+
+    # Function to return the rows of a symbol for [start, end], downloading only what is missing
+    # fetch(symbol, start, end) must return a DataFrame indexed by date (end inclusive)
+    def get(self, source, symbol, start, end, fetch):
+        fetched = None
+        for missing_start, missing_end in self.missing_ranges(source, symbol, start, end):
+            fetched = fetch(symbol, missing_start, missing_end)
+            self.write(source, symbol, fetched, missing_start, missing_end)
+        stored = self.read(source, symbol, start, end)
+        # Nothing stored when the download came back empty
+        return fetched if stored is None else stored
+
+    # Function to drop least recently used symbols until the store fits in max_bytes
+    def _evict(self, entries, keep=None):
+        total = sum(entry['bytes'] for entry in entries.values())
+        for key in sorted(entries, key=lambda k: entries[k]['last_access']):
+            if total <= self.max_bytes:
+                break
+            if key == keep:
+                continue
+            total -= entries[key]['bytes']
+            try:
+                os.remove(self._file_path(key))
+            except OSError:
+                pass
+            del entries[key]
+
+    # Function to report what the store currently holds
+    def info(self):
+        return pd.DataFrame.from_dict(self.manifest.entries(), orient='index')
+
+    # Function to remove everything from the store
+    def clear(self):
+        with self.manifest.update() as entries:
+            for key in list(entries):
+                try:
+                    os.remove(self._file_path(key))
+                except OSError:
+                    pass
+            entries.clear()
+
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+
+# Function to get the process-wide cache shared by every page
+def default_cache():
+    global _default_cache
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = PriceCache()
+        return _default_cache
+
+
+# Function to make a downloaded frame tz-naive, midnight-indexed and named 'Date'
+def clean_index(df):
+    df = df.copy()
+    index = pd.DatetimeIndex(df.index)
+    if index.tz is not None:
+        index = index.tz_localize(None)
+    df.index = index.normalize().rename('Date')
+    return df
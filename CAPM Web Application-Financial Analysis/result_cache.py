@@ -0,0 +1,186 @@
+import datetime
+import functools
+import hashlib
+import inspect
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+import data_providers
+
+# Total size of all cached results, results bigger than this are never stored
+MAX_BYTES = int(os.environ.get('CAPM_RESULT_CACHE_MAX_BYTES', 256 * 1024 * 1024))
+
+
+# Function to estimate how many bytes a result holds in memory
+def estimate_bytes(value):
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(deep=True, index=True).sum())
+    if isinstance(value, pd.Series):
+        return int(value.memory_usage(deep=True, index=True))
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(estimate_bytes(k) + estimate_bytes(v) for k, v in value.items())
+    if isinstance(value, (list, tuple)):
+        return sys.getsizeof(value) + sum(estimate_bytes(v) for v in value)
+    return sys.getsizeof(value)
+
+
+# Function to copy a cached result so callers can modify it without touching the shared copy
+def _copy_value(value):
+    if isinstance(value, (pd.DataFrame, pd.Series, np.ndarray, pd.Index)):
+        return value.copy()
+    if isinstance(value, dict):
+        return {k: _copy_value(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return type(value)(_copy_value(v) for v in value)
+    return value
+
+
+# Function to feed an argument into the key hash, DataFrames are hashed by content
+def _update_key(digest, value):
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        digest.update(type(value).__name__.encode())
+        digest.update(repr(value.shape).encode())
+        if isinstance(value, pd.DataFrame):
+            digest.update(repr(list(value.columns)).encode())
+        else:
+            digest.update(repr(value.name).encode())
+        digest.update(pd.util.hash_pandas_object(value, index=True).to_numpy().tobytes())
+    elif isinstance(value, np.ndarray):
+        digest.update(repr((value.shape, value.dtype.str)).encode())
+        digest.update(np.ascontiguousarray(value).tobytes())
+    elif isinstance(value, (list, tuple)):
+        digest.update(f'{type(value).__name__}{len(value)}('.encode())
+        for item in value:
+            _update_key(digest, item)
+        digest.update(b')')
+    elif isinstance(value, dict):
+        digest.update(f'dict{len(value)}('.encode())
+        for k in sorted(value, key=repr):
+            _update_key(digest, k)
+            _update_key(digest, value[k])
+        digest.update(b')')
+    elif isinstance(value, (datetime.date, pd.Timestamp)):
+        digest.update(pd.Timestamp(value).isoformat().encode())
+    else:
+        digest.update(repr(value).encode())
+    digest.update(b'|')
+
+
+# Function to build the cache key of one call
+def make_key(name, args, kwargs, provider=None):
+    digest = hashlib.sha1()
+    _update_key(digest, provider)
+    _update_key(digest, name)
+    _update_key(digest, args)
+    _update_key(digest, kwargs)
+    return digest.hexdigest()
+
+
+# Thread-safe least recently used cache bounded by the total size of its results rather than
+# the number of entries. One instance lives in the server process, so every Streamlit session shares it.
+class ResultCache:
+    def __init__(self, max_bytes=MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # key -> (value, nbytes, expires_at)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    # Function to look up a key, returns (found, value)
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[2] is not None and entry[2] < time.monotonic():
+                self._remove(key)
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return False, None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return True, entry[0]
+
+    # Function to store a result, evicting the least recently used ones to stay within max_bytes
+    def put(self, key, value, ttl=None):
+        nbytes = estimate_bytes(value)
+        if nbytes > self.max_bytes:
+            return
+        expires_at = time.monotonic() + ttl if ttl is not None else None
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (value, nbytes, expires_at)
+            self._bytes += nbytes
+            while self._bytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def _remove(self, key):
+        _, nbytes, _ = self._entries.pop(key)
+        self._bytes -= nbytes
+
+    # Function to report hit/miss statistics
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'evictions': self.evictions,
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+            }
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+
+# Cache shared by every session of the app
+shared_cache = ResultCache()
+
+
+# Decorator to serve repeated calls of a function from the shared cache
+# provider_scoped: include the active data provider in the key (for functions that fetch data)
+# ttl: seconds after which a result is recomputed (e.g. fetches that include today's prices)
+# key: function of the call's arguments (name -> value, defaults filled in) returning the arguments to hash
+# instead, e.g. only the columns of a wide panel the function reads. Hashing costs about as much as one
+# pass over the data, so functions that are not much dearer than that are better left unmemoized.
+# Every hit returns a copy, so callers are free to modify what they get back
+def memoize(func=None, provider_scoped=False, ttl=None, cache=None, key=None):
+    if func is None:
+        return functools.partial(memoize, provider_scoped=provider_scoped, ttl=ttl, cache=cache, key=key)
+    name = f'{func.__module__}.{func.__qualname__}'
+    signature = inspect.signature(func) if key is not None else None
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        target = cache or shared_cache
+        provider = data_providers.get_provider().name if provider_scoped else None
+        if key is None:
+            cache_key = make_key(name, args, kwargs, provider)
+        else:
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            cache_key = make_key(name, (), key(dict(bound.arguments)), provider)
+        found, value = target.get(cache_key)
+        if not found:
+            value = func(*args, **kwargs)
+            target.put(cache_key, value, ttl)
+        return _copy_value(value)
+
+    return wrapper
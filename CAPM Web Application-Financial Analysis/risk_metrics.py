@@ -0,0 +1,150 @@
+from statistics import NormalDist
+
+import numpy as np
+import pandas as pd
+
+import instrumentation
+
+# VaR / CVaR methods
+METHODS = ('historical', 'parametric', 'cornish-fisher')
+# Number of tail probabilities averaged for the Cornish-Fisher CVaR
+CF_TAIL_POINTS = 200
+
+_normal = NormalDist()
+
+
+# Function to split a returns panel into (column names, float matrix), optionally adding a weighted
+# portfolio column; the portfolio is only defined on rows where all its assets have a return
+def _returns_matrix(returns, weights=None, portfolio_name='Portfolio'):
+    if 'Date' in returns.columns:
+        returns = returns.drop(columns='Date')
+    columns = list(returns.columns)
+    values = returns.to_numpy(dtype=float)
+    if weights is not None:
+        weights = pd.Series(weights, dtype=float).reindex(columns).fillna(0.0)
+        weights = weights / weights.sum()
+        used = weights.to_numpy() != 0
+        portfolio = values[:, used] @ weights.to_numpy()[used]
+        values = np.column_stack([values, portfolio])
+        columns.append(portfolio_name)
+    return columns, values
+
+
+# Function to get compounded h-day returns from daily returns for every column at once
+# Windows that contain a missing day are NaN
+def horizon_returns(values, horizon):
+    if horizon == 1:
+        return values
+    missing = np.isnan(values)
+    log_sums = np.zeros((len(values) + 1, values.shape[1]))
+    np.cumsum(np.where(missing, 0.0, np.log1p(values)), axis=0, out=log_sums[1:])
+    gaps = np.zeros((len(values) + 1, values.shape[1]))
+    np.cumsum(missing, axis=0, out=gaps[1:])
+    window_log = log_sums[horizon:] - log_sums[:-horizon]
+    window_gaps = gaps[horizon:] - gaps[:-horizon]
+    return np.where(window_gaps > 0, np.nan, np.expm1(window_log))
+
+
+# Function to get historical VaR and CVaR for every column from one sort of the returns matrix
+# VaR is the linearly interpolated alpha quantile, CVaR the mean of the worst ceil(alpha * n) returns
+def _historical(values, alphas):
+    ordered = np.sort(values, axis=0)  # NaN sort to the end of every column
+    counts = (~np.isnan(values)).sum(axis=0)
+    tail_sums = np.cumsum(np.nan_to_num(ordered), axis=0)
+    columns = np.arange(values.shape[1])
+    var = np.full((len(alphas), values.shape[1]), np.nan)
+    cvar = np.full((len(alphas), values.shape[1]), np.nan)
+    has_data = counts > 0
+    for row, alpha in enumerate(alphas):
+        position = alpha * (counts - 1)
+        below = np.floor(position).astype(int)
+        above = np.minimum(below + 1, np.maximum(counts - 1, 0))
+        fraction = position - below
+        quantile = ordered[below, columns] * (1 - fraction) + ordered[above, columns] * fraction
+        tail = np.maximum(np.ceil(np.round(alpha * counts, 9)).astype(int), 1)
+        var[row] = np.where(has_data, -quantile, np.nan)
+        cvar[row] = np.where(has_data, -tail_sums[np.minimum(tail, len(ordered)) - 1, columns] / tail, np.nan)
+    return var, cvar
+
+
+# Function to get the mean, standard deviation, skewness and excess kurtosis of every column
+def moments(values):
+    missing = np.isnan(values)
+    counts = (~missing).sum(axis=0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        mean = np.where(missing, 0.0, values).sum(axis=0) / counts
+        # Missing days are zero after centering, so plain sums only see the observed days
+        centered = np.where(missing, 0.0, values - mean)
+        squared = centered * centered
+        m2 = squared.sum(axis=0) / counts
+        skew = (squared * centered).sum(axis=0) / counts / m2 ** 1.5
+        kurt = (squared * squared).sum(axis=0) / counts / (m2 * m2) - 3
+        std = np.sqrt(m2 * counts / (counts - 1))
+    return mean, std, skew, kurt
+
+
+# Function to apply the Cornish-Fisher expansion to normal quantiles z given skewness and excess kurtosis
+def cornish_fisher(z, skew, kurt):
+    return (z + (z ** 2 - 1) * skew / 6 + (z ** 3 - 3 * z) * kurt / 24
+            - (2 * z ** 3 - 5 * z) * skew ** 2 / 36)
+
+
+# Function to get parametric (normal) and Cornish-Fisher VaR and CVaR for h-day horizons
+# Daily moments are scaled to the horizon (mean * h, std * sqrt(h), skew / sqrt(h), kurtosis / h),
+# which assumes independent days; this is where square-root-of-time scaling belongs
+def _parametric(daily_moments, alphas, horizon, cornish=False):
+    mean, std, skew, kurt = daily_moments
+    mean_h = mean * horizon
+    std_h = std * np.sqrt(horizon)
+    var = np.empty((len(alphas), len(mean)))
+    cvar = np.empty((len(alphas), len(mean)))
+    for row, alpha in enumerate(alphas):
+        z = _normal.inv_cdf(alpha)
+        if not cornish:
+            var[row] = -(mean_h + z * std_h)
+            cvar[row] = -(mean_h - std_h * _normal.pdf(z) / alpha)
+        else:
+            skew_h = skew / np.sqrt(horizon)
+            kurt_h = kurt / horizon
+            var[row] = -(mean_h + cornish_fisher(z, skew_h, kurt_h) * std_h)
+            # CVaR is the average quantile over the tail, sampled at evenly spaced tail probabilities
+            tail = alpha * (np.arange(CF_TAIL_POINTS) + 0.5) / CF_TAIL_POINTS
+            tail_z = np.array([_normal.inv_cdf(p) for p in tail]).reshape(-1, 1)
+            tail_quantiles = mean_h + cornish_fisher(tail_z, skew_h, kurt_h) * std_h
+            cvar[row] = -tail_quantiles.mean(axis=0)
+    return var, cvar
+
+
+# Function to compute VaR and CVaR for every ticker (and optionally a weighted portfolio)
+# returns: decimal daily returns, one column per ticker (optional Date column)
+# confidence: confidence levels, e.g. (0.95, 0.99); horizons: holding periods in days, e.g. (1, 10)
+# methods: any of 'historical', 'parametric', 'cornish-fisher'
+# weights: dict / Series of ticker -> weight to add a 'Portfolio' row
+# Returns a tidy table with VaR and CVaR as positive losses (decimal), one row per
+# Stock / Method / Confidence / Horizon
+@instrumentation.timed
+def value_at_risk(returns, confidence=(0.95, 0.99), horizons=(1, 10), methods=METHODS, weights=None,
+                  portfolio_name='Portfolio'):
+    unknown = [m for m in methods if m not in METHODS]
+    if unknown:
+        raise ValueError(f"Unknown VaR method(s) {unknown}, expected any of {METHODS}")
+    columns, values = _returns_matrix(returns, weights, portfolio_name)
+    alphas = [1 - c for c in confidence]
+    daily_moments = moments(values)
+
+    frames = []
+    for horizon in horizons:
+        for method in methods:
+            if method == 'historical':
+                var, cvar = _historical(horizon_returns(values, horizon), alphas)
+            else:
+                var, cvar = _parametric(daily_moments, alphas, horizon, cornish=method == 'cornish-fisher')
+            frames.append(pd.DataFrame({
+                'Stock': np.tile(columns, len(alphas)),
+                'Method': method,
+                'Confidence': np.repeat(confidence, len(columns)),
+                'Horizon': horizon,
+                'VaR': var.ravel(),
+                'CVaR': cvar.ravel(),
+            }))
+    return pd.concat(frames, ignore_index=True)
@@ -0,0 +1,112 @@
+import numpy as np
+import pandas as pd
+
+import instrumentation
+
+# Parameters a scenario is made of, with the defaults of the Scenario Analysis page
+# rate: annual rate of return, inflation: annual inflation (decimals); years: horizon;
+# contribution: amount added at the end of every year, growing by contribution_growth per year
+PARAMETERS = {
+    'initial': 10000.0,
+    'rate': 0.05,
+    'years': 5,
+    'contribution': 0.0,
+    'contribution_growth': 0.0,
+    'inflation': 0.0,
+}
+# Display names of the parameters
+LABELS = {
+    'initial': 'Initial Investment ($)',
+    'rate': 'Rate of Return',
+    'years': 'Number of Years',
+    'contribution': 'Annual Contribution ($)',
+    'contribution_growth': 'Contribution Growth',
+    'inflation': 'Inflation',
+}
+
+
+# Function to get the future value of every scenario in one broadcast expression
+# Every argument may be a scalar or an array; arrays broadcast against each other like NumPy operands,
+# so a (1000, 1) rate column and a (1, 1000) horizon row give a 1000 x 1000 grid
+# real: divide by the inflation over the horizon (today's dollars)
+def future_value(initial=PARAMETERS['initial'], rate=PARAMETERS['rate'], years=PARAMETERS['years'],
+                 contribution=PARAMETERS['contribution'], contribution_growth=PARAMETERS['contribution_growth'],
+                 inflation=PARAMETERS['inflation'], real=False):
+    rate, years = np.asarray(rate, dtype=float), np.asarray(years, dtype=float)
+    growth = (1 + rate) ** years
+    contribution_factor = (1 + contribution_growth) ** years
+    spread = rate - contribution_growth
+    # Growing annuity (r != g), or n * (1 + r)^(n - 1) in the limit r == g
+    same = np.abs(spread) < 1e-12
+    with np.errstate(divide='ignore', invalid='ignore'):
+        annuity = np.where(same, years * (1 + rate) ** (years - 1),
+                           (growth - contribution_factor) / np.where(same, 1.0, spread))
+    value = initial * growth + contribution * annuity
+    if real:
+        value = value / (1 + np.asarray(inflation, dtype=float)) ** years
+    return value
+
+
+# Function to evaluate a grid of scenarios: the parameters in `axes` sweep their values, the rest stay at `base`
+# axes: parameter -> 1-D values, e.g. {'rate': np.linspace(0, 0.1, 1000), 'years': np.arange(1, 41)}
+# Returns an array with one dimension per axis, in the order given
+@instrumentation.timed
+def evaluate_grid(axes, base=None, real=False):
+    params = {**PARAMETERS, **(base or {})}
+    for position, (name, values) in enumerate(axes.items()):
+        shape = [1] * len(axes)
+        shape[position] = -1
+        params[name] = np.asarray(values, dtype=float).reshape(shape)
+    grid = future_value(real=real, **params)
+    return np.broadcast_to(grid, tuple(len(v) for v in axes.values()))
+
+
+# Function to get the tornado chart table: the future value with each parameter moved to the low and high
+# end of its range while the others stay at `base`, biggest swing first
+# ranges: parameter -> (low, high)
+def sensitivity(ranges, base=None, real=False):
+    params = {**PARAMETERS, **(base or {})}
+    names = list(ranges)
+    # One row per parameter, columns low / high: every case is evaluated in one call
+    cases = {name: np.full((len(names), 2), float(params[name])) for name in PARAMETERS}
+    for row, name in enumerate(names):
+        cases[name][row] = ranges[name]
+    values = future_value(real=real, **cases)
+    table = pd.DataFrame({
+        'Parameter': [LABELS.get(n, n) for n in names],
+        'Low': [ranges[n][0] for n in names],
+        'High': [ranges[n][1] for n in names],
+        'Value at Low': values[:, 0],
+        'Value at High': values[:, 1],
+    })
+    table['Swing'] = (table['Value at High'] - table['Value at Low']).abs()
+    table.attrs['base_value'] = float(future_value(real=real, **params))
+    return table.sort_values('Swing', ascending=False, ignore_index=True)
+
+
+# Function to draw stochastic annual rate paths: independent log-normal returns with the given mean and
+# volatility, so a year never loses more than everything (-100%) and wealth never turns negative
+# The log-return parameters are chosen so the simple returns keep exactly the requested mean and volatility
+# Returns an (n_paths, years) array
+def simulate_rates(mean, volatility, years, n_paths=1000, seed=None):
+    rng = np.random.default_rng(seed)
+    sigma2 = np.log1p((volatility / (1 + mean)) ** 2)
+    mu = np.log1p(mean) - sigma2 / 2
+    return np.expm1(mu + np.sqrt(sigma2) * rng.standard_normal((n_paths, int(years))))
+
+
+# Function to get the value at the end of every year along rate paths, for all paths at once
+# rates: (..., years) annual returns; contributions are added at the end of every year like future_value
+# Value after year t = initial * G_t + sum_s c_s * G_t / G_s, with G the cumulative growth
+@instrumentation.timed
+def path_values(rates, initial=PARAMETERS['initial'], contribution=PARAMETERS['contribution'],
+                contribution_growth=PARAMETERS['contribution_growth'], inflation=PARAMETERS['inflation'], real=False):
+    rates = np.asarray(rates, dtype=float)
+    years = np.arange(1, rates.shape[-1] + 1)
+    growth = np.cumprod(1 + rates, axis=-1)
+    contributions = contribution * (1 + contribution_growth) ** (years - 1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        values = growth * (initial + np.cumsum(contributions / growth, axis=-1))
+    if real:
+        values = values / (1 + inflation) ** years
+    return values
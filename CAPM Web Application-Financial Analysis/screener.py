@@ -0,0 +1,121 @@
+import csv
+import io
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+import capm_functions
+import market_data
+
+# Columns of the screener table, in display order
+COLUMNS = ['Stock', 'Beta', 'Alpha', 'Expected Return', 'Annual Return', 'Volatility', 'Sharpe Ratio', 'R2',
+           'Observations']
+# Tickers fetched and regressed together; every batch is one download and one matrix product
+BATCH_SIZE = 100
+# Batches in flight at the same time, which also bounds the prices held in memory
+WORKERS = 4
+
+
+# Function to read a universe of tickers from a file path, an uploaded file or a text
+# Accepts a CSV with a 'Symbol' / 'Ticker' column (e.g. an S&P 500 constituents export) or one ticker per
+# line / comma-separated. Returns unique upper-case tickers in file order.
+def read_universe(source):
+    if hasattr(source, 'read'):
+        text = source.read()
+        text = text.decode('utf-8') if isinstance(text, bytes) else text
+    elif isinstance(source, str) and os.path.exists(source):
+        with open(source, encoding='utf-8') as f:
+            text = f.read()
+    else:
+        text = source
+
+    rows = list(csv.reader(io.StringIO(text)))
+    header = [cell.strip().lower() for cell in rows[0]] if rows else []
+    column = next((header.index(name) for name in ('symbol', 'ticker') if name in header), None)
+    if column is not None:
+        cells = [row[column] for row in rows[1:] if len(row) > column]
+    else:
+        cells = [cell for row in rows for cell in row]
+    # Yahoo writes share classes with a dash (BRK-B), constituent lists often use a dot (BRK.B)
+    tickers = [cell.strip().upper().replace('.', '-') for cell in cells if cell.strip()]
+    return list(dict.fromkeys(tickers))
+
+
+# Function to compute the CAPM metrics of one batch of tickers against the benchmark returns
+# market: decimal daily benchmark returns (Series indexed by Date)
+# prices: closing prices of the batch when the caller already loaded them (one column per ticker)
+def screen_batch(tickers, market, start, end, rf=0.0, periods_per_year=252, provider=None, prices=None):
+    if prices is None:
+        prices = market_data.load_price_panel(tickers, start, end, fields=['Close'], provider=provider)['Close']
+    returns = capm_functions.compute_returns(prices, kind='simple')
+    benchmark = market.name
+    returns[benchmark] = market.reindex(returns.index)
+    regression = capm_functions.regress_panel(returns, benchmark, tickers)
+
+    # Statistics on the days where both the stock and the benchmark have a return, like the regression
+    stock_returns = returns[tickers].where(returns[benchmark].notna(), axis=0)
+    annual_return = stock_returns.mean().to_numpy() * periods_per_year
+    volatility = stock_returns.std().to_numpy() * np.sqrt(periods_per_year)
+    market_return = market.mean() * periods_per_year
+    beta = regression['Beta'].to_numpy()
+    with np.errstate(divide='ignore', invalid='ignore'):
+        sharpe = (annual_return - rf) / volatility
+    return pd.DataFrame({
+        'Stock': tickers,
+        'Beta': beta,
+        'Alpha': regression['Alpha'].to_numpy() * periods_per_year,
+        'Expected Return': rf + beta * (market_return - rf),
+        'Annual Return': annual_return,
+        'Volatility': volatility,
+        'Sharpe Ratio': sharpe,
+        'R2': regression['R2'].to_numpy(),
+        'Observations': regression['Observations'].to_numpy(),
+    }, columns=COLUMNS)
+
+
+# Function to screen a universe in parallel batches, yielding (tickers done, batch table) as batches finish
+# At most `workers` batches are fetched at once and only their metrics are kept, so memory stays bounded
+# by the batch size however many names are screened. A batch that fails yields NaN rows for its tickers.
+def screen_batches(tickers, start, end, benchmark='^GSPC', rf=0.0, batch_size=BATCH_SIZE, workers=WORKERS,
+                   periods_per_year=252, provider=None):
+    tickers = [t for t in dict.fromkeys(tickers) if t != benchmark]
+    market_prices = market_data.load_price_panel([benchmark], start, end, fields=['Close'], provider=provider)
+    market = capm_functions.compute_returns(market_prices['Close'], kind='simple')[benchmark]
+
+    batches = [tickers[i:i + batch_size] for i in range(0, len(tickers), batch_size)]
+    done = 0
+
+    def run(batch):
+        try:
+            return screen_batch(batch, market, start, end, rf, periods_per_year, provider)
+        except Exception:
+            return pd.DataFrame({'Stock': batch}, columns=COLUMNS)
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        pending = []
+        for batch in batches:
+            pending.append(executor.submit(run, batch))
+            # Keep the pipeline `workers` batches deep instead of queueing the whole universe
+            if len(pending) >= workers:
+                result = pending.pop(0).result()
+                done += len(result)
+                yield done, result
+        for future in pending:
+            result = future.result()
+            done += len(result)
+            yield done, result
+
+
+# Function to screen a universe and return one table with the CAPM metrics of every name
+# tickers: list of symbols (see read_universe); rf: annual risk-free rate as a decimal
+# Beta and alpha come from the regression of daily returns on the benchmark, alpha is annualized;
+# Expected Return is the CAPM return rf + beta * (benchmark return - rf)
+def screen(tickers, start, end, benchmark='^GSPC', rf=0.0, batch_size=BATCH_SIZE, workers=WORKERS,
+           periods_per_year=252, provider=None):
+    tables = [table for _, table in screen_batches(tickers, start, end, benchmark, rf, batch_size, workers,
+                                                   periods_per_year, provider)]
+    if not tables:
+        return pd.DataFrame(columns=COLUMNS)
+    return pd.concat(tables, ignore_index=True)
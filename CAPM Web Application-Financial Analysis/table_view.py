@@ -0,0 +1,139 @@
+import math
+
+import numpy as np
+import pandas as pd
+
+import instrumentation
+import result_cache
+
+# Rows sent to the browser per page
+PAGE_SIZE = 50
+# Periods offered by aggregate-by-period (label -> pandas resample rule)
+PERIODS = {'None': None, 'Week': 'W', 'Month': 'ME', 'Quarter': 'QE', 'Year': 'YE'}
+# Aggregations offered for the numeric columns of each period
+AGGREGATIONS = ('sum', 'mean', 'last', 'min', 'max')
+
+
+# Function to get a frame with its index as a regular column, so sorting and filtering treat it like any other
+# A DatetimeIndex without a name becomes the 'Date' column
+def _flat(df):
+    if isinstance(df.index, pd.RangeIndex):
+        return df
+    name = df.index.name or ('Date' if isinstance(df.index, pd.DatetimeIndex) else 'index')
+    return df.rename_axis(name).reset_index()
+
+
+# Function to get the first datetime column of a frame, None when there is none
+def date_column(df):
+    for column in df.columns:
+        if pd.api.types.is_datetime64_any_dtype(df[column]):
+            return column
+    return None
+
+
+# Function to keep the rows where `column` matches `value`
+# value: text (case-insensitive substring match) or a (low, high) range, both ends included
+def filter_rows(df, column, value):
+    if column is None or value is None or value == '':
+        return df
+    if isinstance(value, str):
+        mask = df[column].astype(str).str.contains(value, case=False, regex=False, na=False)
+    else:
+        low, high = value
+        if pd.api.types.is_datetime64_any_dtype(df[column]):
+            low, high = pd.Timestamp(low), pd.Timestamp(high) + pd.Timedelta(days=1) - pd.Timedelta(1)
+        mask = df[column].between(low, high)
+    return df[mask.to_numpy()]
+
+
+# Function to aggregate the numeric columns by calendar period of the date column
+# period: label of PERIODS; how: one of AGGREGATIONS. Periods without any row are dropped
+def aggregate_by_period(df, period, how='sum'):
+    rule = PERIODS[period]
+    dates = date_column(df)
+    if rule is None or dates is None:
+        return df
+    if how not in AGGREGATIONS:
+        raise ValueError(f"Unknown aggregation '{how}', expected one of {AGGREGATIONS}")
+    numeric = df.select_dtypes('number').columns
+    grouped = df.set_index(dates)[numeric].resample(rule)
+    result = getattr(grouped, how)()
+    if how == 'sum':
+        # sum() turns empty periods into 0, keep them missing like the other aggregations
+        result = result.where(grouped.count() > 0)
+    result = result[result.notna().any(axis=1)]
+    return result.rename_axis(dates).reset_index()
+
+
+# Function to filter, aggregate and sort a frame the way a table view shows it
+# Cached in the shared result cache, so paging through a large result does not repeat the work
+@result_cache.memoize
+@instrumentation.timed
+def prepare_view(df, sort_by=None, ascending=True, filter_column=None, filter_value=None, period='None', how='sum'):
+    frame = filter_rows(_flat(df), filter_column, filter_value)
+    frame = aggregate_by_period(frame, period, how)
+    if sort_by is not None and sort_by in frame.columns:
+        frame = frame.sort_values(sort_by, ascending=ascending, kind='stable', na_position='last')
+    return frame.reset_index(drop=True)
+
+
+# Function to get one page of a prepared frame, returns (rows of the page, page, number of pages)
+# page: 1-based, clipped to the pages that exist
+def page_rows(frame, page=1, page_size=PAGE_SIZE):
+    pages = max(math.ceil(len(frame) / page_size), 1)
+    page = min(max(int(page), 1), pages)
+    return frame.iloc[(page - 1) * page_size:page * page_size], page, pages
+
+
+# Function to show a large frame as a paged table: the frame stays on the server and only the visible
+# page is sent to the browser; sort, filter and aggregate-by-period run server-side on the whole frame
+# key: unique prefix of the widget keys on the page
+def paged_table(df, key, page_size=PAGE_SIZE):
+    import streamlit as st
+
+    flat = _flat(df)
+    columns = list(flat.columns)
+    col1, col2, col3, col4 = st.columns([2, 2, 2, 1])
+    with col1:
+        filter_column = st.selectbox("Filter column", ['(none)'] + columns, key=f'{key}_filter_column')
+        filter_column = None if filter_column == '(none)' else filter_column
+    with col2:
+        filter_value = None
+        if filter_column is not None:
+            values = flat[filter_column]
+            if pd.api.types.is_datetime64_any_dtype(values) and values.notna().any():
+                selected = st.date_input("Between", (values.min().date(), values.max().date()),
+                                         key=f'{key}_filter_dates_{filter_column}')
+                filter_value = tuple(selected) if len(selected) == 2 else None
+            elif pd.api.types.is_numeric_dtype(values) and values.notna().any():
+                low, high = float(np.nanmin(values)), float(np.nanmax(values))
+                filter_value = (st.number_input("Min", value=low, key=f'{key}_filter_low_{filter_column}'),
+                                st.number_input("Max", value=high, key=f'{key}_filter_high_{filter_column}'))
+            else:
+                filter_value = st.text_input("Contains", key=f'{key}_filter_text')
+    with col3:
+        period = 'None'
+        how = 'sum'
+        if date_column(flat) is not None:
+            period = st.selectbox("Aggregate by", list(PERIODS), key=f'{key}_period')
+            if period != 'None':
+                how = st.selectbox("Aggregation", AGGREGATIONS, key=f'{key}_how')
+    with col4:
+        sort_by = st.selectbox("Sort by", ['(none)'] + columns, key=f'{key}_sort')
+        ascending = st.checkbox("Ascending", value=True, key=f'{key}_ascending')
+
+    frame = prepare_view(df, None if sort_by == '(none)' else sort_by, ascending, filter_column, filter_value,
+                         period, how)
+    pages = max(math.ceil(len(frame) / page_size), 1)
+    page = 1
+    if pages > 1:
+        # The page lives in session state only (no widget default), a narrower filter can leave it past the end
+        if st.session_state.setdefault(f'{key}_page', 1) > pages:
+            st.session_state[f'{key}_page'] = pages
+        page = st.number_input("Page", min_value=1, max_value=pages, key=f'{key}_page')
+    rows, page, pages = page_rows(frame, page, page_size)
+    st.dataframe(rows, use_container_width=True, hide_index=True)
+    first = (page - 1) * page_size + 1 if len(frame) else 0
+    st.caption(f"Rows {first:,}-{first + len(rows) - 1 if len(rows) else 0:,} of {len(frame):,} "
+               f"(page {page} of {pages}), {len(flat):,} rows in total")
+    return frame
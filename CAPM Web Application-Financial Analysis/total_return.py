@@ -0,0 +1,92 @@
+import numpy as np
+import pandas as pd
+
+import instrumentation
+import market_data
+
+# Columns of the comparison table, in display order
+COLUMNS = ['Investment Option', 'Start', 'End', 'Final Value', 'Total Return', 'Price Return',
+           'Dividend Return', 'CAGR', 'Volatility', 'Max Drawdown', 'Current Drawdown']
+
+
+# Function to load the closing prices and dividends of every option in one batched price download
+# Returns (close, dividends), both indexed by Date with one column per ticker
+def load_prices(tickers, start, end):
+    panel = market_data.load_price_panel(tickers, start, end, fields=['Close', 'Dividends'])
+    return panel['Close'], panel['Dividends']
+
+
+# Function to get the daily total returns of every column: (close + dividend paid on the day) / previous close
+# Dividends are reinvested at the close of their ex-date. Days without a price have no return (NaN), and a
+# return after a gap is measured from the last close before it
+def total_returns(close, dividends=None):
+    prices = close.to_numpy(dtype=float)
+    cash = (np.zeros_like(prices) if dividends is None
+            else dividends.reindex(index=close.index, columns=close.columns).fillna(0.0).to_numpy(dtype=float))
+    previous = pd.DataFrame(prices).ffill().shift().to_numpy()
+    with np.errstate(divide='ignore', invalid='ignore'):
+        returns = (prices + cash) / previous - 1
+    return pd.DataFrame(returns, index=close.index, columns=close.columns)
+
+
+# Function to build total-return indexes: the value of `base` invested at each column's first close,
+# dividends reinvested on the ex-date. Rows before the first close are NaN, gaps carry the last value
+# returns: daily total returns when already computed
+@instrumentation.timed
+def total_return_index(close, dividends=None, base=1.0, returns=None):
+    if returns is None:
+        returns = total_returns(close, dividends)
+    started = close.notna().cummax().to_numpy()
+    growth = np.cumprod(1 + np.nan_to_num(returns.to_numpy(), nan=0.0), axis=0)
+    return pd.DataFrame(np.where(started, base * growth, np.nan), index=close.index, columns=close.columns)
+
+
+# Function to get the drawdown of every column: distance below the running peak, as a (negative) decimal
+def drawdowns(index):
+    values = index.to_numpy(dtype=float)
+    peaks = np.fmax.accumulate(values, axis=0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return pd.DataFrame(values / peaks - 1, index=index.index, columns=index.columns)
+
+
+# Function to compare the options: total, price and dividend return, CAGR, annualized volatility and drawdowns
+# Each metric is one pass over the (dates x options) matrix. CAGR uses the calendar time between each
+# option's first and last close; volatility the daily total returns
+@instrumentation.timed
+def compare(close, dividends=None, investment=1000.0, periods_per_year=252):
+    returns = total_returns(close, dividends)
+    index = total_return_index(close, returns=returns)
+    values = index.to_numpy(dtype=float)
+    prices = close.to_numpy(dtype=float)
+    dates = close.index.to_numpy()
+    valid = ~np.isnan(prices)
+    has_data = valid.any(axis=0)
+    columns = np.arange(prices.shape[1])
+    first_row = np.argmax(valid, axis=0)
+    last_row = len(prices) - 1 - np.argmax(valid[::-1], axis=0)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        total = values[last_row, columns] - 1
+        price = prices[last_row, columns] / prices[first_row, columns] - 1
+        years = (dates[last_row] - dates[first_row]) / np.timedelta64(1, 'D') / 365.25
+        cagr = np.where(years > 0, (1 + total) ** (1 / years) - 1, np.nan)
+    volatility = returns.std().to_numpy() * np.sqrt(periods_per_year)
+    drawdown = drawdowns(index).to_numpy()
+    max_drawdown = np.where(np.isnan(drawdown), np.inf, drawdown).min(axis=0)
+
+    table = pd.DataFrame({
+        'Investment Option': list(close.columns),
+        'Start': dates[first_row],
+        'End': dates[last_row],
+        'Final Value': investment * (1 + total),
+        'Total Return': total,
+        'Price Return': price,
+        'Dividend Return': total - price,
+        'CAGR': cagr,
+        'Volatility': volatility,
+        'Max Drawdown': max_drawdown,
+        'Current Drawdown': drawdown[last_row, columns],
+    }, columns=COLUMNS)
+    metrics = COLUMNS[1:]
+    table.loc[~has_data, metrics] = np.nan
+    return table